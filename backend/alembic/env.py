@@ -20,6 +20,15 @@ import app.models
 
 target_metadata = Base.metadata
 
+# Indices que autogenerate no puede comparar: la reflexion pierde el COLLATE
+# de las expresiones y el de trigramas solo existe si la base tiene pg_trgm.
+# Los crea y los borra la migracion a7d3c9f1b486.
+SKIP_INDEXES = {"ix_products_owner_id_sku_prefix", "ix_products_owner_id_name_prefix", "ix_products_name_trgm"}
+
+
+def include_object(object, name, type_, reflected, compare_to) -> bool:
+    return not (type_ == "index" and name in SKIP_INDEXES)
+
 
 def run_migrations_offline() -> None:
     url = config.get_main_option("sqlalchemy.url")
@@ -29,6 +38,7 @@ def run_migrations_offline() -> None:
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
         compare_type=True,
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -47,6 +57,7 @@ def run_migrations_online() -> None:
             connection=connection,
             target_metadata=target_metadata,
             compare_type=True,
+            include_object=include_object,
         )
 
         with context.begin_transaction():
@@ -0,0 +1,50 @@
+"""sales daily rollup
+
+Revision ID: 3c1f7a9d2b40
+Revises: e8af5e64b3e4
+Create Date: 2026-10-18 10:12:41.503117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.config import get_settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1f7a9d2b40'
+down_revision: Union[str, Sequence[str], None] = 'e8af5e64b3e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('sales_daily_rollup',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('payment_method', sa.String(length=32), nullable=False),
+    sa.Column('count_sales', sa.Integer(), nullable=False),
+    sa.Column('total', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'day', 'payment_method')
+    )
+
+    # backfill con las ventas existentes
+    op.execute(
+        sa.text(
+            """
+            INSERT INTO sales_daily_rollup (user_id, day, payment_method, count_sales, total)
+            SELECT user_id, date(timezone(:tz, created_at)), payment_method, count(*), sum(total)
+            FROM sales
+            GROUP BY 1, 2, 3
+            """
+        ).bindparams(tz=get_settings().REPORTS_TZ)
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('sales_daily_rollup')
@@ -0,0 +1,30 @@
+"""keyset pagination indexes
+
+Revision ID: 5a2e8c61f3d7
+Revises: 3c1f7a9d2b40
+Create Date: 2026-10-18 11:02:17.228391
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a2e8c61f3d7'
+down_revision: Union[str, Sequence[str], None] = '3c1f7a9d2b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_sales_user_id_id', 'sales', ['user_id', 'id'], unique=False)
+    op.create_index('ix_products_owner_id_id', 'products', ['owner_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_products_owner_id_id', table_name='products')
+    op.drop_index('ix_sales_user_id_id', table_name='sales')
@@ -0,0 +1,30 @@
+"""sales client_id
+
+Revision ID: 7d4b1e0a9c52
+Revises: 5a2e8c61f3d7
+Create Date: 2026-10-18 11:48:03.611270
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d4b1e0a9c52'
+down_revision: Union[str, Sequence[str], None] = '5a2e8c61f3d7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('sales', sa.Column('client_id', sa.String(length=64), nullable=True))
+    op.create_unique_constraint('uq_sales_user_id_client_id', 'sales', ['user_id', 'client_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_sales_user_id_client_id', 'sales', type_='unique')
+    op.drop_column('sales', 'client_id')
@@ -0,0 +1,32 @@
+"""products sku unique
+
+Revision ID: 9b6c3f2e1a84
+Revises: 7d4b1e0a9c52
+Create Date: 2026-10-18 12:20:55.094412
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b6c3f2e1a84'
+down_revision: Union[str, Sequence[str], None] = '7d4b1e0a9c52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # SKU vacio pasa a NULL para que no choque en el indice unico.
+    # Si ya hay SKU repetidos por usuario (el chequeo previo no era atomico)
+    # hay que resolverlos antes de correr esta migracion.
+    op.execute("UPDATE products SET sku = NULL WHERE sku = ''")
+    op.create_unique_constraint('uq_products_owner_id_sku', 'products', ['owner_id', 'sku'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_products_owner_id_sku', 'products', type_='unique')
@@ -0,0 +1,52 @@
+"""product search indexes
+
+Revision ID: a7d3c9f1b486
+Revises: f1c6a9e4b257
+Create Date: 2026-10-18 21:02:13.504118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3c9f1b486'
+down_revision: Union[str, Sequence[str], None] = 'f1c6a9e4b257'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    trgm = bind.execute(sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")).first() is not None
+    if trgm:
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    with op.get_context().autocommit_block():
+        # prefijo de SKU y de nombre: COLLATE "C" para que LIKE 'abc%' use el btree
+        op.create_index(
+            'ix_products_owner_id_sku_prefix', 'products', ['owner_id', sa.text('lower(sku) COLLATE "C"')],
+            unique=False, postgresql_where=sa.text('is_active'), postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_products_owner_id_name_prefix', 'products', ['owner_id', sa.text('lower(name) COLLATE "C"')],
+            unique=False, postgresql_where=sa.text('is_active'), postgresql_concurrently=True,
+        )
+        # sin pg_trgm la busqueda aproximada cae a LIKE '%texto%' (ver crud.search_products)
+        if trgm:
+            op.create_index(
+                'ix_products_name_trgm', 'products', [sa.text('lower(name) gin_trgm_ops')],
+                unique=False, postgresql_using='gin', postgresql_where=sa.text('is_active'),
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # la extension queda instalada: otra cosa de la base puede usarla
+    op.drop_index('ix_products_name_trgm', table_name='products', if_exists=True)
+    op.drop_index('ix_products_owner_id_name_prefix', table_name='products')
+    op.drop_index('ix_products_owner_id_sku_prefix', table_name='products')
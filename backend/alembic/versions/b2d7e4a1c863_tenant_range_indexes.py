@@ -0,0 +1,65 @@
+"""tenant range indexes
+
+Revision ID: b2d7e4a1c863
+Revises: 9b6c3f2e1a84
+Create Date: 2026-10-18 14:05:32.614820
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2d7e4a1c863'
+down_revision: Union[str, Sequence[str], None] = '9b6c3f2e1a84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY no bloquea escrituras en tablas grandes, pero no puede
+    # correr dentro de una transaccion
+    with op.get_context().autocommit_block():
+        # reportes: user_id + rango de created_at
+        op.create_index(
+            'ix_sales_user_id_created_at', 'sales', ['user_id', 'created_at'],
+            unique=False, postgresql_concurrently=True,
+        )
+        # list_stock_movements: user_id + product_id, orden por id
+        op.create_index(
+            'ix_stock_movements_user_id_product_id_id', 'stock_movements', ['user_id', 'product_id', 'id'],
+            unique=False, postgresql_concurrently=True,
+        )
+        # list_products sin include_inactive
+        op.create_index(
+            'ix_products_owner_id_id_active', 'products', ['owner_id', 'id'],
+            unique=False, postgresql_where=sa.text('is_active'), postgresql_concurrently=True,
+        )
+        # tablas de solo insercion: created_at crece con el orden fisico, un
+        # BRIN ocupa unas paginas en lugar de un btree del tamaño de la tabla
+        op.create_index(
+            'ix_sales_created_at_brin', 'sales', ['created_at'],
+            unique=False, postgresql_using='brin', postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_stock_movements_created_at_brin', 'stock_movements', ['created_at'],
+            unique=False, postgresql_using='brin', postgresql_concurrently=True,
+        )
+
+        # quedan cubiertos por el prefijo de los compuestos
+        op.drop_index('ix_sales_user_id', table_name='sales', postgresql_concurrently=True)
+        op.drop_index('ix_stock_movements_user_id', table_name='stock_movements', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_stock_movements_user_id', 'stock_movements', ['user_id'], unique=False)
+    op.create_index('ix_sales_user_id', 'sales', ['user_id'], unique=False)
+    op.drop_index('ix_stock_movements_created_at_brin', table_name='stock_movements')
+    op.drop_index('ix_sales_created_at_brin', table_name='sales')
+    op.drop_index('ix_products_owner_id_id_active', table_name='products')
+    op.drop_index('ix_stock_movements_user_id_product_id_id', table_name='stock_movements')
+    op.drop_index('ix_sales_user_id_created_at', table_name='sales')
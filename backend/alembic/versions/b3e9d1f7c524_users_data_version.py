@@ -0,0 +1,29 @@
+"""users data version
+
+Revision ID: b3e9d1f7c524
+Revises: a7d3c9f1b486
+Create Date: 2026-10-18 22:14:37.901266
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e9d1f7c524'
+down_revision: Union[str, Sequence[str], None] = 'a7d3c9f1b486'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # default constante: no reescribe la tabla
+    op.add_column('users', sa.Column('data_version', sa.BigInteger(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'data_version')
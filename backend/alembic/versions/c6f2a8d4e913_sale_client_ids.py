@@ -0,0 +1,40 @@
+"""sale client ids
+
+Revision ID: c6f2a8d4e913
+Revises: b3e9d1f7c524
+Create Date: 2026-10-19 10:12:44.318502
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c6f2a8d4e913'
+down_revision: Union[str, Sequence[str], None] = 'b3e9d1f7c524'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'sale_client_ids',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('client_id', sa.String(length=64), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'client_id'),
+    )
+    # los client_id ya usados: un reintento de una venta vieja sigue siendo
+    # un duplicado
+    op.execute(
+        "INSERT INTO sale_client_ids (user_id, client_id) "
+        "SELECT DISTINCT user_id, client_id FROM sales WHERE client_id IS NOT NULL"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('sale_client_ids')
@@ -0,0 +1,33 @@
+"""sale_items created_at
+
+Revision ID: c8e1f5b3d920
+Revises: b2d7e4a1c863
+Create Date: 2026-10-18 15:21:08.730115
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8e1f5b3d920'
+down_revision: Union[str, Sequence[str], None] = 'b2d7e4a1c863'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('sale_items', sa.Column('created_at', sa.DateTime(timezone=True), nullable=True))
+    # los items existentes toman la fecha de su venta
+    op.execute(
+        "UPDATE sale_items SET created_at = sales.created_at FROM sales WHERE sales.id = sale_items.sale_id"
+    )
+    op.alter_column('sale_items', 'created_at', nullable=False, server_default=sa.text('now()'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('sale_items', 'created_at')
@@ -0,0 +1,47 @@
+"""data version shards
+
+Revision ID: d4a7e2c9b615
+Revises: c6f2a8d4e913
+Create Date: 2026-10-19 12:40:08.527193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a7e2c9b615'
+down_revision: Union[str, Sequence[str], None] = 'c6f2a8d4e913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'data_versions',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('shard', sa.SmallInteger(), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'shard'),
+    )
+    # la version actual queda en el shard 0: los ETag ya emitidos siguen valiendo
+    op.execute(
+        "INSERT INTO data_versions (user_id, shard, version) "
+        "SELECT id, 0, data_version FROM users WHERE data_version > 0"
+    )
+    op.drop_column('users', 'data_version')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('users', sa.Column('data_version', sa.BigInteger(), server_default='0', nullable=False))
+    op.execute(
+        "UPDATE users SET data_version = v.version "
+        "FROM (SELECT user_id, sum(version) AS version FROM data_versions GROUP BY user_id) v "
+        "WHERE v.user_id = users.id"
+    )
+    op.drop_table('data_versions')
@@ -0,0 +1,37 @@
+"""partition append-only tables (opt-in)
+
+Revision ID: d4a9b7c2e615
+Revises: c8e1f5b3d920
+Create Date: 2026-10-18 15:48:51.207743
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+from app import partitions
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a9b7c2e615'
+down_revision: Union[str, Sequence[str], None] = 'c8e1f5b3d920'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Opt-in: alembic -x partitioning=true upgrade head
+    # Sin el flag no hace nada; se puede activar despues con
+    # `python -m app.cli partitions-enable`.
+    if context.get_x_argument(as_dictionary=True).get('partitioning', '').lower() not in ('1', 'true', 'yes'):
+        return
+    partitions.enable_partitioning(op.get_bind())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    if partitions.is_partitioned(bind, 'sales'):
+        partitions.disable_partitioning(bind)
@@ -0,0 +1,61 @@
+"""stock snapshots
+
+Revision ID: e5b8c3a7d412
+Revises: d4a9b7c2e615
+Create Date: 2026-10-18 17:42:11.508337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app import partitions
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b8c3a7d412'
+down_revision: Union[str, Sequence[str], None] = 'd4a9b7c2e615'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'stock_snapshots',
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('taken_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('stock', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+        sa.PrimaryKeyConstraint('product_id', 'taken_at'),
+    )
+
+    # replay por producto y rango de created_at; reemplaza al indice por
+    # product_id (queda cubierto por el prefijo). IF [NOT] EXISTS: volver de
+    # tablas particionadas ya crea el esquema de los modelos actuales
+    if partitions.is_partitioned(op.get_bind(), 'stock_movements'):
+        # CONCURRENTLY no existe para tablas particionadas
+        op.create_index(
+            'ix_stock_movements_product_id_created_at', 'stock_movements', ['product_id', 'created_at'],
+            unique=False, if_not_exists=True,
+        )
+        op.drop_index('ix_stock_movements_product_id', table_name='stock_movements', if_exists=True)
+        return
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_stock_movements_product_id_created_at', 'stock_movements', ['product_id', 'created_at'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.drop_index(
+            'ix_stock_movements_product_id', table_name='stock_movements',
+            postgresql_concurrently=True, if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_stock_movements_product_id', 'stock_movements', ['product_id'], unique=False, if_not_exists=True)
+    op.drop_index('ix_stock_movements_product_id_created_at', table_name='stock_movements', if_exists=True)
+    op.drop_table('stock_snapshots')
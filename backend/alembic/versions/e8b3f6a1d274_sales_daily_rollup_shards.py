@@ -0,0 +1,48 @@
+"""sales daily rollup shards
+
+Revision ID: e8b3f6a1d274
+Revises: d4a7e2c9b615
+Create Date: 2026-10-19 16:05:31.904127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b3f6a1d274'
+down_revision: Union[str, Sequence[str], None] = 'd4a7e2c9b615'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # las filas existentes quedan en el shard 0
+    op.add_column('sales_daily_rollup', sa.Column('shard', sa.SmallInteger(), server_default='0', nullable=False))
+    op.drop_constraint('sales_daily_rollup_pkey', 'sales_daily_rollup', type_='primary')
+    op.create_primary_key(
+        'sales_daily_rollup_pkey', 'sales_daily_rollup', ['user_id', 'day', 'payment_method', 'shard']
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # junta los shards de cada dia en el 0 antes de volver a la clave sin shard
+    op.execute(
+        """
+        WITH merged AS (
+            DELETE FROM sales_daily_rollup
+            RETURNING user_id, day, payment_method, count_sales, total
+        )
+        INSERT INTO sales_daily_rollup (user_id, day, payment_method, shard, count_sales, total)
+        SELECT user_id, day, payment_method, 0, sum(count_sales), sum(total)
+        FROM merged
+        GROUP BY 1, 2, 3
+        """
+    )
+    op.drop_constraint('sales_daily_rollup_pkey', 'sales_daily_rollup', type_='primary')
+    op.create_primary_key('sales_daily_rollup_pkey', 'sales_daily_rollup', ['user_id', 'day', 'payment_method'])
+    op.drop_column('sales_daily_rollup', 'shard')
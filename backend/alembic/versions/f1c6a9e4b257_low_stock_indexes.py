@@ -0,0 +1,41 @@
+"""low stock indexes
+
+Revision ID: f1c6a9e4b257
+Revises: e5b8c3a7d412
+Create Date: 2026-10-18 19:08:45.220961
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c6a9e4b257'
+down_revision: Union[str, Sequence[str], None] = 'e5b8c3a7d412'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        # parcial: solo entran los productos bajo el minimo, ordenados por
+        # faltante; el indice queda chico aunque el catalogo sea grande
+        op.create_index(
+            'ix_products_owner_id_low_stock', 'products', ['owner_id', sa.text('(stock - stock_min)'), 'id'],
+            unique=False, postgresql_where=sa.text('is_active AND stock < stock_min'),
+            postgresql_concurrently=True,
+        )
+        # feed de cambios: productos de un usuario modificados desde un instante
+        op.create_index(
+            'ix_products_owner_id_updated_at', 'products', ['owner_id', 'updated_at'],
+            unique=False, postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_products_owner_id_updated_at', table_name='products')
+    op.drop_index('ix_products_owner_id_low_stock', table_name='products')
@@ -0,0 +1,39 @@
+"""products change xid
+
+Revision ID: f3c9a2d6e187
+Revises: e8b3f6a1d274
+Create Date: 2026-10-20 09:27:51.640318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c9a2d6e187'
+down_revision: Union[str, Sequence[str], None] = 'e8b3f6a1d274'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # sin default al agregarla (no reescribe la tabla): las filas existentes
+    # quedan en NULL, el default vale para las nuevas
+    op.add_column('products', sa.Column('change_xid', sa.BigInteger(), nullable=True))
+    op.alter_column('products', 'change_xid', server_default=sa.text('(pg_current_xact_id()::text::bigint)'))
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_products_owner_id_change_xid', 'products', ['owner_id', 'change_xid'],
+            unique=False, postgresql_concurrently=True,
+        )
+        op.drop_index('ix_products_owner_id_updated_at', table_name='products', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_products_owner_id_updated_at', 'products', ['owner_id', 'updated_at'], unique=False)
+    op.drop_index('ix_products_owner_id_change_xid', table_name='products')
+    op.drop_column('products', 'change_xid')
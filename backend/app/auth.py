@@ -1,10 +1,12 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from jose import jwt
 from passlib.context import CryptContext
 from app.config import get_settings
 
-print("AUTH LOADED FROM:", __file__)
-
 settings = get_settings()
 
 SECRET_KEY = settings.SECRET_KEY
@@ -15,10 +17,17 @@ if not SECRET_KEY:
 ALGORITHM = settings.ALGORITHM
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 
-pwd_context = CryptContext(
-    schemes=["bcrypt_sha256"],
-    deprecated="auto"
-)
+def make_pwd_context(rounds: int) -> CryptContext:
+    # min = max = default: un hash con otro costo queda marcado para rehash
+    return CryptContext(
+        schemes=["bcrypt_sha256"],
+        deprecated="auto",
+        bcrypt_sha256__default_rounds=rounds,
+        bcrypt_sha256__min_rounds=rounds,
+        bcrypt_sha256__max_rounds=rounds,
+    )
+
+pwd_context = make_pwd_context(settings.PASSWORD_HASH_ROUNDS)
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -26,6 +35,83 @@ def hash_password(password: str) -> str:
 def verify_password(password: str, password_hash: str) -> bool:
     return pwd_context.verify(password, password_hash)
 
+def verify_and_update_password(password: str, password_hash: str) -> tuple[bool, str | None]:
+    # (valido, hash nuevo si cambio el costo configurado)
+    return pwd_context.verify_and_update(password, password_hash)
+
+
+class PasswordPoolBusy(Exception):
+    pass
+
+
+class PasswordHasherPool:
+    # Pool dedicado para bcrypt, separado del threadpool de Starlette, asi una
+    # rafaga de logins no deja sin workers a ventas y productos. bcrypt suelta
+    # el GIL durante el hash, por eso alcanzan threads. Si hay mas de
+    # workers + max_queue pedidos pendientes se rechaza en lugar de encolar.
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pwhash")
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self.running = 0
+        self.queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.run_seconds_total = 0.0
+
+    def _task(self, submitted: float, fn, args):
+        started = time.monotonic()
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self.wait_seconds_total += started - submitted
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self.run_seconds_total += time.monotonic() - started
+
+    async def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordPoolBusy()
+        with self._lock:
+            self.queued += 1
+        future = self._executor.submit(self._task, time.monotonic(), fn, args)
+        future.add_done_callback(lambda _: self._slots.release())
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "running": self.running,
+                "queued": self.queued,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "run_seconds_total": round(self.run_seconds_total, 6),
+            }
+
+
+password_pool = PasswordHasherPool(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
+
+async def hash_password_async(password: str) -> str:
+    return await password_pool.run(hash_password, password)
+
+async def verify_and_update_password_async(password: str, password_hash: str) -> tuple[bool, str | None]:
+    return await password_pool.run(verify_and_update_password, password, password_hash)
+
 def create_access_token(subject: str) -> str:
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode = {"sub": subject, "exp": expire}
@@ -0,0 +1,127 @@
+import argparse
+import sys
+
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+from .config import get_settings
+from .db import SessionLocal
+from . import crud, partitions
+
+
+def rollup_rebuild(args) -> int:
+    with SessionLocal() as db:
+        n = crud.rebuild_sales_rollup(db, user_id=args.user_id)
+    print(f"sales_daily_rollup reconstruido: {n} filas")
+    return 0
+
+def rollup_check(args) -> int:
+    with SessionLocal() as db:
+        diffs = crud.check_sales_rollup(db, user_id=args.user_id)
+    for d in diffs:
+        print(
+            f"user={d['user_id']} day={d['day']} pm={d['payment_method']} "
+            f"raw=({d['raw_count']}, {d['raw_total']}) rollup=({d['rollup_count']}, {d['rollup_total']})"
+        )
+    if diffs:
+        print(f"{len(diffs)} diferencias entre sales y sales_daily_rollup")
+        return 1
+    print("sales_daily_rollup consistente")
+    return 0
+
+def user_set_active(args) -> int:
+    with SessionLocal() as db:
+        u = crud.set_user_active(db, args.email, args.active)
+        if not u:
+            print(f"usuario {args.email} no existe")
+            return 1
+        print(f"usuario {u.email}: is_active={u.is_active}")
+    return 0
+
+def partitions_enable(args) -> int:
+    with SessionLocal() as db:
+        if partitions.is_partitioned(db):
+            print("las tablas ya estan particionadas")
+            return 0
+        partitions.enable_partitioning(db, months_ahead=args.months_ahead)
+        db.commit()
+    print(f"tablas particionadas: {', '.join(partitions.TABLES)}")
+    return 0
+
+def partitions_ensure(args) -> int:
+    with SessionLocal() as db:
+        created = partitions.ensure_partitions(db, months_ahead=args.months_ahead)
+        db.commit()
+    print(f"particiones creadas: {', '.join(created) or 'ninguna'}")
+    return 0
+
+def partitions_archive(args) -> int:
+    with SessionLocal() as db:
+        moved = partitions.archive_partitions(db, before=args.before, schema=args.schema)
+        db.commit()
+    for name in moved:
+        print(f"archivada {name}")
+    print(f"{len(moved)} particiones movidas al esquema {args.schema}")
+    return 0
+
+def stock_snapshot(args) -> int:
+    # sin --days: la foto del inicio de hoy (correr por cron despues de medianoche)
+    tz = ZoneInfo(get_settings().REPORTS_TZ)
+    today = datetime.now(tz).date()
+    total = 0
+    with SessionLocal() as db:
+        for n in range(args.days - 1, -1, -1):
+            day = today - timedelta(days=n)
+            at = datetime.combine(day, time.min, tzinfo=tz)
+            written = crud.take_stock_snapshots(db, at=at, min_movements=args.min_movements)
+            print(f"{day}: {written} productos")
+            total += written
+    print(f"stock_snapshots: {total} filas nuevas")
+    return 0
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("rollup-rebuild", help="recalcula sales_daily_rollup desde sales")
+    p.add_argument("--user-id", type=int, default=None)
+    p.set_defaults(func=rollup_rebuild)
+
+    p = sub.add_parser("rollup-check", help="compara sales_daily_rollup contra sales")
+    p.add_argument("--user-id", type=int, default=None)
+    p.set_defaults(func=rollup_check)
+
+    p = sub.add_parser("user-deactivate", help="desactiva un usuario")
+    p.add_argument("email")
+    p.set_defaults(func=user_set_active, active=False)
+
+    p = sub.add_parser("user-activate", help="reactiva un usuario")
+    p.add_argument("email")
+    p.set_defaults(func=user_set_active, active=True)
+
+    months_ahead = get_settings().PARTITIONS_MONTHS_AHEAD
+
+    p = sub.add_parser("partitions-enable", help="particiona sales, sale_items y stock_movements por mes")
+    p.add_argument("--months-ahead", type=int, default=months_ahead)
+    p.set_defaults(func=partitions_enable)
+
+    p = sub.add_parser("partitions-ensure", help="crea las particiones de los proximos meses y muda las filas que cayeron en la default (cron mensual)")
+    p.add_argument("--months-ahead", type=int, default=months_ahead)
+    p.set_defaults(func=partitions_ensure)
+
+    p = sub.add_parser("partitions-archive", help="desengancha los meses anteriores a --before")
+    p.add_argument("--before", type=date.fromisoformat, required=True)
+    p.add_argument("--schema", default="archive")
+    p.set_defaults(func=partitions_archive)
+
+    p = sub.add_parser("stock-snapshot", help="guarda el stock de los productos al inicio del dia")
+    p.add_argument("--days", type=int, default=1, help="tambien los N-1 dias anteriores (backfill)")
+    p.add_argument("--min-movements", type=int, default=1, help="solo productos con al menos N movimientos nuevos")
+    p.set_defaults(func=stock_snapshot)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
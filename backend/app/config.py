@@ -7,13 +7,53 @@ class Settings(BaseSettings):
     ENV: str = "development"
 
     DATABASE_URL: str
+    # Endpoints sobre AsyncSession (psycopg async) en lugar de Session + threadpool
+    DB_ASYNC: bool = False
 
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
+    # Costo de bcrypt_sha256; al cambiarlo los hashes se regeneran en el login
+    PASSWORD_HASH_ROUNDS: int = 12
+    # Pool dedicado para hashear/verificar contraseñas
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 32
+
     CORS_ORIGINS: list[str] = ["http://localhost:5173"]
 
+    # Middleware de metricas por ruta y endpoint /metrics (formato Prometheus)
+    METRICS_ENABLED: bool = True
+
+    # Profiler de SQL por request: Server-Timing, sentencias repetidas (N+1)
+    # y log de sentencias lentas. En produccion, con un sample rate bajo.
+    SQL_PROFILER_ENABLED: bool = False
+    SQL_PROFILER_SAMPLE_RATE: float = 1.0
+    SQL_PROFILER_SLOW_MS: float = 200
+    SQL_PROFILER_EXPLAIN: bool = False
+    SQL_PROFILER_REPEAT_THRESHOLD: int = 5
+    # Valores de los parametros en el log de sentencias lentas (pueden traer
+    # emails, hashes de contraseñas, etc.); por defecto solo los nombres
+    SQL_PROFILER_LOG_PARAMS: bool = False
+
+    # Zona horaria por defecto de los reportes y de sales_daily_rollup
+    REPORTS_TZ: str = "UTC"
+    # Reportes de rangos terminados hace mas de estos dias: el navegador los
+    # guarda REPORTS_CACHE_MAX_AGE segundos sin volver a pedirlos. Un rango
+    # mas reciente todavia puede cambiar por ventas offline que sincronizan tarde.
+    REPORTS_CLOSED_AFTER_DAYS: int = 2
+    REPORTS_CACHE_MAX_AGE: int = 86400
+
+    # Con las tablas particionadas (app/partitions.py): meses por delante que
+    # se crean al arrancar la app y con `python -m app.cli partitions-ensure`,
+    # que hay que programar (cron mensual) si la app queda arriba mas tiempo
+    PARTITIONS_MONTHS_AHEAD: int = 3
+
+    # Cache en memoria de usuarios autenticados (evita un SELECT por request)
+    USER_CACHE_ENABLED: bool = False
+    USER_CACHE_TTL_SECONDS: float = 30
+    USER_CACHE_MAXSIZE: int = 10_000
+
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -1,31 +1,264 @@
-from sqlalchemy.orm import Session
-from .models import Product, Sale, SaleItem, StockMovement, User
-from .schemas import ProductCreate, ProductUpdate, SaleCreate
-from datetime import datetime, date, time, timedelta
-from .auth import hash_password, verify_password
+from sqlalchemy import DateTime, Float, Interval, and_, case, cast, delete, event, func, inspect, literal, literal_column, null, or_, select, text, true, tuple_, union_all, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy.orm import Session, object_session, selectinload
+from .cache import user_cache
+from .config import get_settings
+from .metrics import timed
+from .models import current_xid, DataVersion, Product, Sale, SaleClientId, SaleItem, SalesDailyRollup, StockMovement, StockSnapshot, User, has_pg_trgm
+from .schemas import ProductCreate, ProductUpdate, SaleBatchItem, SaleCreate, SaleItemOut, SaleOut
+from datetime import datetime, date, time, timedelta, timezone
+from functools import wraps
+from typing import Iterable, Iterator
+from pydantic import ValidationError
+from .auth import hash_password, verify_and_update_password
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+settings = get_settings()
+
+GRANULARITIES = ("hour", "day", "week", "month")
+
+def get_data_version(db: Session, user_id: int) -> int:
+    return db.scalar(
+        select(func.coalesce(func.sum(DataVersion.version), 0)).where(DataVersion.user_id == user_id)
+    )
+
+# Filas por usuario que toda escritura actualiza (version de los datos,
+# rollup del dia) partidas en shards: cada conexion escribe el suyo, asi las
+# escrituras concurrentes de un usuario no se encolan detras de una fila.
+WRITE_SHARDS = 16
+
+def _write_shard():
+    return func.pg_backend_pid() % WRITE_SHARDS
+
+def _bump_data_version(db: Session, user_id: int | None) -> None:
+    # Toda escritura sobre los datos de un usuario la llama justo antes del
+    # commit: sube en 1 la version en el mismo commit que los datos, asi
+    # quien lee la version antes que los datos nunca guarda datos viejos con
+    # una version nueva. Sube solo el shard de la conexion.
+    # Sin user_id (reconstrucciones globales) sube la de todos.
+    # El flush previo hace que toda transaccion bloquee sus otras filas antes
+    # que el shard: mismo orden en todas, sin deadlocks. Casi siempre el
+    # shard ya existe y alcanza con el UPDATE, mas barato que el upsert.
+    db.flush()
+    shard = _write_shard()
+    if user_id is not None:
+        bumped = db.execute(
+            update(DataVersion)
+            .where(DataVersion.user_id == user_id, DataVersion.shard == shard)
+            .values(version=DataVersion.version + 1),
+            execution_options={"synchronize_session": False},
+        ).rowcount
+        if bumped:
+            return
+    users = select(User.id) if user_id is None else select(literal(user_id))
+    stmt = insert(DataVersion).from_select(["user_id", "shard", "version"], users.add_columns(shard, literal(1)))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "shard"], set_={"version": DataVersion.version + 1},
+    )
+    db.execute(stmt)
+
+# serialization_failure, deadlock_detected
+RETRY_SQLSTATES = ("40001", "40P01")
+WRITE_ATTEMPTS = 5
+
+class TransactionConflict(Exception):
+    pass
+
+class _StockChanged(Exception):
+    # El stock cambio entre la lectura y el UPDATE condicional
+    pass
+
+def _retry_on_conflict(fn):
+    # Reintenta la transaccion entera (desde la lectura, con datos frescos)
+    # si el stock cambio en el medio o la base la aborto por serializacion o
+    # deadlock. Sin espera: la otra transaccion ya termino, o tiene los locks
+    # y el reintento espera en ellos.
+    @wraps(fn)
+    def wrapper(db: Session, *args, **kwargs):
+        for _ in range(WRITE_ATTEMPTS):
+            try:
+                return fn(db, *args, **kwargs)
+            except _StockChanged:
+                db.rollback()
+            except DBAPIError as e:
+                sqlstate = getattr(e.orig, "sqlstate", None) or getattr(e.orig, "pgcode", None)
+                if sqlstate not in RETRY_SQLSTATES:
+                    raise
+                db.rollback()
+        raise TransactionConflict("Demasiadas operaciones simultáneas sobre el mismo stock, reintentar")
+
+    return wrapper
+
+def _apply_stock_changes(db: Session, user_id: int, changes: dict[int, int]) -> None:
+    # product_id -> cambio (negativo vende), en un solo UPDATE condicional:
+    # bloquea las filas en orden de id (el mismo en toda transaccion: dos
+    # carritos con productos en comun no se bloquean en cruz) y solo escribe
+    # si alcanza el stock de todas; si no, no toca ninguna. Tanto el FOR NO
+    # KEY UPDATE como el UPDATE ven la ultima version de cada fila, asi dos
+    # cajas no pueden vender la misma ultima unidad.
+    locked = (
+        select(Product.id, Product.stock, case(changes, value=Product.id).label("change"))
+        .where(Product.id.in_(sorted(changes)), Product.owner_id == user_id, Product.is_active == True)
+        .order_by(Product.id)
+        .with_for_update(key_share=True)
+        .cte("locked")
+        .prefix_with("MATERIALIZED")
+    )
+    enough = (
+        select(func.count())
+        .select_from(locked)
+        .where(locked.c.stock + locked.c.change >= 0)
+        .scalar_subquery()
+    )
+    updated = db.execute(
+        update(Product)
+        .where(Product.id == locked.c.id, Product.stock + locked.c.change >= 0, enough == len(changes))
+        # change_xid explicito: el feed de stock bajo se apoya en el
+        .values(stock=Product.stock + locked.c.change, updated_at=func.current_timestamp(), change_xid=current_xid())
+        .returning(Product.id),
+        execution_options={"synchronize_session": False},
+    ).all()
+    if len(updated) != len(changes):
+        raise _StockChanged()
 
 def create_product(db: Session, user_id: int, data: ProductCreate) -> Product:
-    # SKU unico por usuario
-    if data.sku:
-        exists = (
-            db.query(Product)
-            .filter(Product.owner_id == user_id, Product.sku == data.sku)
-            .first()
-        )
-        if exists:
-            raise ValueError("SKU ya existe")
+    # SKU unico por usuario: lo garantiza uq_products_owner_id_sku
+    values = data.model_dump()
+    values["sku"] = values["sku"] or None
 
-    p = Product(owner_id=user_id, **data.model_dump())
-    db.add(p)
+    p = db.scalars(
+        insert(Product)
+        .values(owner_id=user_id, **values)
+        .on_conflict_do_nothing(index_elements=["owner_id", "sku"])
+        .returning(Product)
+    ).first()
+    if not p:
+        raise ValueError("SKU ya existe")
+
+    _bump_data_version(db, user_id)
     db.commit()
-    db.refresh(p)
     return p
 
-def list_products(db: Session, user_id: int, include_inactive: bool = False) -> list[Product]:
+def _is_sku_conflict(e: IntegrityError) -> bool:
+    diag = getattr(e.orig, "diag", None)
+    return getattr(diag, "constraint_name", None) == "uq_products_owner_id_sku"
+
+def import_products(db: Session, user_id: int, rows: Iterable[tuple[int, dict]], batch_size: int = 1000) -> dict:
+    # Upsert por lotes con INSERT ... ON CONFLICT (owner_id, sku). El stock
+    # solo se toma para productos nuevos; los existentes lo cambian via
+    # movimientos de stock.
+    result = {"inserted": 0, "updated": 0, "errors": []}
+    batch: dict = {}
+
+    def flush() -> None:
+        if not batch:
+            return
+        stmt = insert(Product)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["owner_id", "sku"],
+            set_={
+                "name": stmt.excluded.name,
+                "price": stmt.excluded.price,
+                "cost": stmt.excluded.cost,
+                "stock_min": stmt.excluded.stock_min,
+                "is_active": True,
+                "updated_at": func.current_timestamp(),
+                "change_xid": current_xid(),
+            },
+        ).returning(literal_column("xmax = 0"))
+        for (created,) in db.execute(stmt, list(batch.values())).all():
+            result["inserted" if created else "updated"] += 1
+        _bump_data_version(db, user_id)
+        db.commit()
+        batch.clear()
+
+    for n, raw in rows:
+        try:
+            data = ProductCreate.model_validate(raw)
+        except ValidationError as e:
+            err = e.errors()[0]
+            field = ".".join(str(x) for x in err["loc"])
+            result["errors"].append({"row": n, "error": f"{field}: {err['msg']}" if field else err["msg"]})
+            continue
+
+        values = data.model_dump()
+        values["sku"] = values["sku"] or None
+        # un SKU repetido dentro del lote queda con la ultima fila
+        batch[values["sku"] or ("row", n)] = {"owner_id": user_id, "is_active": True, **values}
+
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+
+    return result
+
+def _keyset(q, model, limit: int | None, cursor: int | None, created_from: datetime | None, created_to: datetime | None):
+    return _keyset_filter(q, model, limit, cursor, created_from, created_to).all()
+
+def _keyset_filter(q, model, limit: int | None, cursor: int | None, created_from: datetime | None, created_to: datetime | None):
+    # Paginacion por id descendente: el cursor es el ultimo id de la pagina
+    # anterior, asi una pagina profunda cuesta lo mismo que la primera.
+    # Sirve igual para un Query del ORM que para un select() de Core.
+    if cursor is not None:
+        q = q.filter(model.id < cursor)
+    if created_from is not None:
+        q = q.filter(model.created_at >= created_from)
+    if created_to is not None:
+        q = q.filter(model.created_at < created_to)
+    q = q.order_by(model.id.desc())
+    if limit is not None:
+        q = q.limit(limit)
+    return q
+
+def _dict_rows(result) -> list[dict]:
+    keys = tuple(result.keys())
+    return [dict(zip(keys, row)) for row in result]
+
+# Columnas de los listados de solo lectura (list_*_rows): select() de Core,
+# sin instancias del ORM. Los Numeric salen como float desde la base, asi las
+# filas ya tienen los tipos de la respuesta JSON y no hace falta validarlas.
+PRODUCT_ROW_COLUMNS = (
+    Product.id,
+    Product.name,
+    Product.sku,
+    cast(Product.price, Float).label("price"),
+    cast(Product.cost, Float).label("cost"),
+    Product.stock,
+    Product.stock_min,
+    Product.is_active,
+    Product.created_at,
+    Product.updated_at,
+)
+
+def list_products(
+    db: Session,
+    user_id: int,
+    include_inactive: bool = False,
+    limit: int | None = None,
+    cursor: int | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+) -> list[Product]:
     q = db.query(Product).filter(Product.owner_id == user_id)
     if not include_inactive:
         q = q.filter(Product.is_active == True)
-    return q.order_by(Product.id.desc()).all()
+    return _keyset(q, Product, limit, cursor, created_from, created_to)
+
+def list_products_rows(
+    db: Session,
+    user_id: int,
+    include_inactive: bool = False,
+    limit: int | None = None,
+    cursor: int | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+) -> list[dict]:
+    # Igual que list_products, como dicts con los campos de ProductOut
+    q = select(*PRODUCT_ROW_COLUMNS).where(Product.owner_id == user_id)
+    if not include_inactive:
+        q = q.where(Product.is_active == True)
+    return _dict_rows(db.execute(_keyset_filter(q, Product, limit, cursor, created_from, created_to)))
 
 def get_product(db: Session, user_id: int, product_id: int) -> Product | None:
     return (
@@ -40,20 +273,39 @@ def update_product(db: Session, user_id: int, product_id: int, data: ProductUpda
         return None
 
     updates = {k: v for k, v in data.model_dump().items() if v is not None}
+    old_stock = int(p.stock)
 
-    new_sku = updates.get("sku", None)
-    if new_sku:
-        exists = (
-            db.query(Product)
-            .filter(Product.owner_id == user_id, Product.sku == new_sku, Product.id != product_id)
-            .first()
-        )
-        if exists:
-            raise ValueError("SKU ya existe")
+    if "sku" in updates:
+        updates["sku"] = updates["sku"] or None
+
+    if "sku" in updates:
+        # el conflicto de SKU lo detecta el indice unico; el SAVEPOINT deja la
+        # sesion usable si falla
+        try:
+            with db.begin_nested():
+                for k, v in updates.items():
+                    setattr(p, k, v)
+        except IntegrityError as e:
+            if _is_sku_conflict(e):
+                raise ValueError("SKU ya existe")
+            raise
+    else:
+        for k, v in updates.items():
+            setattr(p, k, v)
 
-    for k, v in updates.items():
-        setattr(p, k, v)
+    # un cambio de stock por edicion queda como movimiento, igual que un
+    # ajuste: el stock historico se reconstruye desde los movimientos
+    change = int(p.stock) - old_stock
+    if change:
+        db.add(StockMovement(
+            user_id=user_id,
+            product_id=p.id,
+            change=change,
+            reason="ADJUSTMENT",
+            reference="edit",
+        ))
 
+    _bump_data_version(db, user_id)
     db.commit()
     db.refresh(p)
     return p
@@ -63,186 +315,945 @@ def delete_product(db: Session, user_id: int, product_id: int) -> bool:
     if not p:
         return False
     p.is_active = False
+    _bump_data_version(db, user_id)
     db.commit()
     return True
 
-def create_sale(db: Session, user_id: int, data: SaleCreate) -> Sale:
-    products_map: dict[int, Product] = {}
+def _low_stock_row(p: Product) -> dict:
+    return {
+        "id": p.id,
+        "name": p.name,
+        "sku": p.sku,
+        "stock": p.stock,
+        "stock_min": p.stock_min,
+        "deficit": p.stock_min - p.stock,
+        "low": p.is_active and p.stock < p.stock_min,
+    }
+
+def _low_stock_cursor(cursor: str) -> tuple[int, int]:
+    # "stock - stock_min:id" del ultimo producto de la pagina anterior
+    try:
+        gap, product_id = cursor.split(":")
+        return int(gap), int(product_id)
+    except ValueError:
+        raise ValueError("Cursor inválido")
+
+def _change_watermark(db: Session) -> int:
+    # Menor xid que todavia puede escribir: el del activo mas viejo
+    # (pg_snapshot_xmin) o el de esta misma transaccion si ya tiene uno. Los
+    # cambios de xid anteriores ya son visibles; uno que todavia no hizo
+    # commit queda con change_xid >= este valor y sale en el proximo poll.
+    # Solo lo frenan las transacciones que escriben: las de solo lectura (un
+    # export CSV largo) no tienen xid. Una que escribe y queda abierta si lo
+    # frena, y mientras tanto cada poll vuelve a traer lo cambiado desde ella.
+    return db.execute(text(
+        "SELECT least(pg_snapshot_xmin(pg_current_snapshot()), pg_current_xact_id_if_assigned())::text::bigint"
+    )).scalar()
+
+def list_low_stock(
+    db: Session,
+    user_id: int,
+    limit: int = 50,
+    cursor: str | None = None,
+    since: int | None = None,
+) -> dict:
+    # Productos activos bajo stock_min, los de mayor faltante primero
+    # (ix_products_owner_id_low_stock). Con `since` devuelve en cambio los
+    # productos modificados desde entonces, con `low` indicando si siguen
+    # bajo el minimo.
+    watermark = _change_watermark(db)
+    low = and_(Product.owner_id == user_id, Product.is_active == True, Product.stock < Product.stock_min)
+    total = db.scalar(select(func.count()).select_from(Product).where(low))
+    page = {"items": [], "next_cursor": None, "total": total, "since": watermark, "resync": False}
+
+    if since is not None:
+        rows = db.scalars(
+            select(Product)
+            .where(Product.owner_id == user_id, Product.change_xid >= since)
+            .order_by(Product.change_xid, Product.id)
+            .limit(limit + 1)
+        ).all()
+        if len(rows) > limit:
+            page["resync"] = True
+        else:
+            page["items"] = [_low_stock_row(p) for p in rows]
+        return page
+
+    gap = Product.stock - Product.stock_min
+    q = select(Product).where(low)
+    if cursor is not None:
+        q = q.where(tuple_(gap, Product.id) > tuple_(*_low_stock_cursor(cursor)))
+    rows = db.scalars(q.order_by(gap, Product.id).limit(limit + 1)).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        page["next_cursor"] = f"{rows[-1].stock - rows[-1].stock_min}:{rows[-1].id}"
+    page["items"] = [_low_stock_row(p) for p in rows]
+    return page
+
+SEARCH_LIMIT = 20
+
+# engine url -> pg_trgm instalado
+_pg_trgm: dict[str, bool] = {}
+
+def _has_pg_trgm(db: Session) -> bool:
+    key = str(db.get_bind().engine.url)
+    if key not in _pg_trgm:
+        _pg_trgm[key] = has_pg_trgm(db)
+    return _pg_trgm[key]
+
+def _like_escape(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _search_hit(p: Product, match: str) -> dict:
+    return {
+        "id": p.id,
+        "name": p.name,
+        "sku": p.sku,
+        "price": p.price,
+        "stock": p.stock,
+        "stock_min": p.stock_min,
+        "match": match,
+    }
+
+def search_products(db: Session, user_id: int, q: str, limit: int = SEARCH_LIMIT) -> list[dict]:
+    # Busqueda de la caja, de mas a menos exacta: SKU exacto, prefijo de SKU,
+    # prefijo de nombre y nombre aproximado (pg_trgm; sin la extension, nombre
+    # que contiene el texto). Cada paso es una consulta por indice con LIMIT
+    # y se corta al juntar `limit` productos: el costo no depende del tamaño
+    # del catalogo.
+    term = q.strip().lower()
+    if not term:
+        raise ValueError("Búsqueda vacía")
+
+    sku = func.lower(Product.sku).collate("C")
+    name = func.lower(Product.name).collate("C")
+    prefix = _like_escape(term) + "%"
+    if _has_pg_trgm(db):
+        # <%: alguna palabra del nombre se parece al texto (ix_products_name_trgm)
+        lower_name = func.lower(Product.name)
+        fuzzy = (literal(term).op("<%")(lower_name), func.word_similarity(term, lower_name).desc())
+    else:
+        fuzzy = (name.like("%" + prefix, escape="\\"), name)
+    steps = [
+        ("sku", sku == term, sku),
+        ("sku_prefix", sku.like(prefix, escape="\\"), sku),
+        ("name_prefix", name.like(prefix, escape="\\"), name),
+        ("name", *fuzzy),
+    ]
+
+    hits: dict[int, dict] = {}
+    for match, condition, order in steps:
+        rows = db.scalars(
+            select(Product)
+            .where(Product.owner_id == user_id, Product.is_active == True, condition)
+            .order_by(order, Product.id)
+            .limit(limit)
+        ).all()
+        for p in rows:
+            hits.setdefault(p.id, _search_hit(p, match))
+        if len(hits) >= limit:
+            break
+    return list(hits.values())[:limit]
 
+def _merge_sale_items(data: SaleCreate) -> dict[int, int]:
+    # product_id -> qty total, respetando el orden de la primera aparicion
+    lines: dict[int, int] = {}
     for it in data.items:
-        p = (
-            db.query(Product)
-            .filter(
-                Product.id == it.product_id,
-                Product.owner_id == user_id,
-                Product.is_active == True,
-            )
-            .first()
+        lines[it.product_id] = lines.get(it.product_id, 0) + int(it.qty)
+    return lines
+
+def _load_sale_products(db: Session, user_id: int, product_ids) -> dict[int, Product]:
+    return {
+        p.id: p
+        for p in db.query(Product).filter(
+            Product.id.in_(list(product_ids)),
+            Product.owner_id == user_id,
+            Product.is_active == True,
         )
+    }
+
+def _check_sale_lines(lines: dict[int, int], products_map: dict[int, Product], available: dict[int, int]) -> None:
+    for product_id, qty in lines.items():
+        p = products_map.get(product_id)
         if not p:
-            raise ValueError(f"Producto {it.product_id} no existe (o no te pertenece / está archivado)")
-        if p.stock < it.qty:
+            raise ValueError(f"Producto {product_id} no existe (o no te pertenece / está archivado)")
+        if available[product_id] < qty:
             raise ValueError(
-                f"Stock insuficiente para '{p.name}'. Disponible: {p.stock}, pedido: {it.qty}"
+                f"Stock insuficiente para '{p.name}'. Disponible: {available[product_id]}, pedido: {qty}"
             )
-        products_map[it.product_id] = p
 
-    sale = Sale(
-        user_id=user_id,
-        total=0,
+def _sale_items(lines: dict[int, int], products_map: dict[int, Product]) -> tuple[float, list[dict]]:
+    total = 0.0
+    items = []
+    for product_id, qty in lines.items():
+        unit_price = float(products_map[product_id].price)
+        total += float(qty) * unit_price
+        items.append({"product_id": product_id, "qty": qty, "unit_price": unit_price})
+    return round(total, 2), items
+
+def _write_sale_lines(
+    db: Session,
+    user_id: int,
+    sales: list[tuple[int, datetime, dict[int, int], list[dict]]],
+) -> None:
+    # rollup, items, movimientos y stock de varias ventas ya insertadas, en
+    # bloque. Los items llevan el created_at de su venta (clave de particion).
+    # El rollup va primero: tambien cuenta las ventas sin items.
+    if not sales:
+        return
+    _rollup_sales(db, [sale_id for sale_id, _, _, _ in sales])
+
+    items = [
+        {"sale_id": sale_id, "created_at": created_at, **it}
+        for sale_id, created_at, _, sale_items in sales
+        for it in sale_items
+    ]
+    if not items:
+        return
+
+    db.execute(insert(SaleItem), items)
+
+    db.execute(
+        insert(StockMovement),
+        [
+            {
+                "user_id": user_id,
+                "product_id": product_id,
+                "change": -qty,
+                "reason": "SALE",
+                "reference": f"sale:{sale_id}",
+                "note": None,
+            }
+            for sale_id, _, lines, _ in sales
+            for product_id, qty in lines.items()
+        ],
+    )
+
+    # el stock al final: las filas de los productos (las mas disputadas)
+    # quedan bloqueadas el menor tiempo posible antes del commit, y no
+    # esperan por el rollup mientras tanto
+    sold: dict[int, int] = {}
+    for _, _, lines, _ in sales:
+        for product_id, qty in lines.items():
+            sold[product_id] = sold.get(product_id, 0) - qty
+    _apply_stock_changes(db, user_id, sold)
+
+@timed
+@_retry_on_conflict
+def create_sale(db: Session, user_id: int, data: SaleCreate) -> SaleOut:
+    # Cantidad fija de sentencias sin importar el tamaño del carrito: un SELECT
+    # de productos, un INSERT ... RETURNING de la venta, inserts en bloque y
+    # un UPDATE condicional del stock. El chequeo previo da el error con el
+    # stock disponible; el que vale es el del UPDATE (_apply_stock_changes).
+    lines = _merge_sale_items(data)
+    products_map = _load_sale_products(db, user_id, lines)
+    _check_sale_lines(lines, products_map, {pid: p.stock for pid, p in products_map.items()})
+
+    total, items = _sale_items(lines, products_map)
+
+    sale_id, created_at = db.execute(
+        insert(Sale)
+        .values(user_id=user_id, total=total, payment_method=data.payment_method)
+        .returning(Sale.id, Sale.created_at)
+    ).one()
+
+    _write_sale_lines(db, user_id, [(sale_id, created_at, lines, items)])
+    _bump_data_version(db, user_id)
+    db.commit()
+    return SaleOut(
+        id=sale_id,
+        total=total,
         payment_method=data.payment_method,
+        items=[SaleItemOut(**it) for it in items],
     )
-    db.add(sale)
-    db.flush()
 
-    total = 0.0
+def _existing_client_ids(db: Session, user_id: int, client_ids: set[str]) -> dict[str, int]:
+    # client_id -> id de las ventas ya registradas
+    return dict(
+        db.execute(
+            select(Sale.client_id, Sale.id).where(Sale.user_id == user_id, Sale.client_id.in_(client_ids))
+        ).all()
+    )
 
-    for it in data.items:
-        p = products_map[it.product_id]
-
-        unit_price = float(p.price)
-        line_total = float(it.qty) * unit_price
-        total += line_total
-
-        db.add(
-            SaleItem(
-                sale_id=sale.id,
-                product_id=p.id,
-                qty=int(it.qty),
-                unit_price=unit_price,
-            )
+@_retry_on_conflict
+def create_sales_batch(db: Session, user_id: int, sales: list[SaleBatchItem]) -> list[dict]:
+    # Ingesta de ventas encoladas offline. Idempotente por client_id: una venta
+    # ya registrada (antes o en este mismo lote) se informa como "duplicate".
+    # Un resultado por posicion del lote: las repeticiones de un client_id
+    # dentro del lote salen como "duplicate" de la primera aparicion.
+    results: list[dict] = []
+    first: dict[str, int] = {}
+    repeated: list[tuple[int, int]] = []
+
+    existing = _existing_client_ids(db, user_id, {s.client_id for s in sales})
+
+    all_lines = [_merge_sale_items(s) for s in sales]
+    products_map = _load_sale_products(db, user_id, {pid for lines in all_lines for pid in lines})
+    available = {pid: p.stock for pid, p in products_map.items()}
+
+    pending: list[tuple[int, SaleBatchItem, dict[int, int], float, list[dict]]] = []
+    for i, (s, lines) in enumerate(zip(sales, all_lines)):
+        if s.client_id in existing:
+            results.append({"client_id": s.client_id, "status": "duplicate", "sale_id": existing[s.client_id]})
+            continue
+        if s.client_id in first:
+            # el sale_id se completa despues del insert de la primera
+            results.append({"client_id": s.client_id, "status": "duplicate"})
+            repeated.append((i, first[s.client_id]))
+            continue
+        try:
+            _check_sale_lines(lines, products_map, available)
+        except ValueError as e:
+            results.append({"client_id": s.client_id, "status": "error", "error": str(e)})
+            continue
+        # solo una venta aceptada hace duplicadas a sus repeticiones
+        first[s.client_id] = i
+        for product_id, qty in lines.items():
+            available[product_id] -= qty
+        total, items = _sale_items(lines, products_map)
+        pending.append((i, s, lines, total, items))
+        results.append({"client_id": s.client_id, "status": "created"})
+
+    if pending:
+        # Se reclaman los client_id antes de insertar las ventas: dos
+        # reintentos simultaneos pasan los dos el chequeo de `existing`, pero
+        # el segundo INSERT espera al commit del primero y no reclama nada.
+        # En orden de client_id, el mismo en todo lote.
+        claimed = set(db.execute(
+            insert(SaleClientId).on_conflict_do_nothing().returning(SaleClientId.client_id),
+            [{"user_id": user_id, "client_id": c} for c in sorted(s.client_id for _, s, _, _, _ in pending)],
+        ).scalars())
+        now = datetime.now(timezone.utc)
+        rows = [
+            {
+                "user_id": user_id,
+                "client_id": s.client_id,
+                "total": total,
+                "payment_method": s.payment_method,
+                "created_at": s.created_at or now,
+            }
+            for _, s, _, total, _ in pending
+            if s.client_id in claimed
+        ]
+        inserted = {}
+        if rows:
+            inserted = {
+                client_id: (sale_id, created_at)
+                for client_id, sale_id, created_at in db.execute(
+                    insert(Sale).returning(Sale.client_id, Sale.id, Sale.created_at), rows,
+                )
+            }
+
+        # otro reintento concurrente la inserto primero (ya esta commiteada)
+        lost = {s.client_id for _, s, _, _, _ in pending if s.client_id not in inserted}
+        winners = _existing_client_ids(db, user_id, lost) if lost else {}
+
+        written = []
+        for i, s, lines, total, items in pending:
+            if s.client_id not in inserted:
+                results[i] = {"client_id": s.client_id, "status": "duplicate", "sale_id": winners.get(s.client_id)}
+                continue
+            sale_id, created_at = inserted[s.client_id]
+            results[i]["sale_id"] = sale_id
+            written.append((sale_id, created_at, lines, items))
+
+        _write_sale_lines(db, user_id, written)
+        if written:
+            _bump_data_version(db, user_id)
+
+    db.commit()
+    for i, j in repeated:
+        if results[j].get("sale_id") is not None:
+            results[i]["sale_id"] = results[j]["sale_id"]
+    return results
+
+def _rollup_day():
+    return func.date(func.timezone(settings.REPORTS_TZ, Sale.created_at))
+
+def _rollup_sales(db: Session, sale_ids: list[int]) -> None:
+    # Suma las ventas dadas a sales_daily_rollup en la misma transaccion, en
+    # el shard de la conexion.
+    day = _rollup_day()
+    agg = (
+        select(
+            Sale.user_id,
+            day,
+            Sale.payment_method,
+            _write_shard(),
+            func.count(),
+            func.sum(Sale.total),
+        )
+        .where(Sale.id.in_(sale_ids))
+        .group_by(Sale.user_id, day, Sale.payment_method)
+    )
+    stmt = insert(SalesDailyRollup).from_select(
+        ["user_id", "day", "payment_method", "shard", "count_sales", "total"], agg
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "day", "payment_method", "shard"],
+        set_={
+            "count_sales": SalesDailyRollup.count_sales + stmt.excluded.count_sales,
+            "total": SalesDailyRollup.total + stmt.excluded.total,
+        },
+    )
+    db.execute(stmt)
+
+def rebuild_sales_rollup(db: Session, user_id: int | None = None) -> int:
+    # Recalcula sales_daily_rollup desde sales (backfill o reparacion).
+    clear = delete(SalesDailyRollup)
+    if user_id is not None:
+        clear = clear.where(SalesDailyRollup.user_id == user_id)
+    db.execute(clear)
+
+    day = _rollup_day()
+    agg = select(
+        Sale.user_id,
+        day,
+        Sale.payment_method,
+        func.count(),
+        func.sum(Sale.total),
+    )
+    if user_id is not None:
+        agg = agg.where(Sale.user_id == user_id)
+    agg = agg.group_by(Sale.user_id, day, Sale.payment_method)
+
+    db.execute(
+        insert(SalesDailyRollup).from_select(
+            ["user_id", "day", "payment_method", "count_sales", "total"], agg
         )
+    )
+    count = select(func.count()).select_from(SalesDailyRollup)
+    if user_id is not None:
+        count = count.where(SalesDailyRollup.user_id == user_id)
+    n = db.scalar(count)
+    _bump_data_version(db, user_id)
+    db.commit()
+    return n
+
+def check_sales_rollup(db: Session, user_id: int | None = None) -> list[dict]:
+    # Devuelve las filas (user, dia, medio de pago) donde el rollup no coincide con sales.
+    day = _rollup_day()
+    raw = select(
+        Sale.user_id.label("user_id"),
+        day.label("day"),
+        Sale.payment_method.label("payment_method"),
+        func.count().label("count_sales"),
+        func.sum(Sale.total).label("total"),
+    )
+    if user_id is not None:
+        raw = raw.where(Sale.user_id == user_id)
+    raw = raw.group_by(Sale.user_id, day, Sale.payment_method).subquery("raw")
 
-        p.stock -= int(it.qty)
+    r = SalesDailyRollup
+    rollup = select(
+        r.user_id,
+        r.day,
+        r.payment_method,
+        func.sum(r.count_sales).label("count_sales"),
+        func.sum(r.total).label("total"),
+    )
+    if user_id is not None:
+        rollup = rollup.where(r.user_id == user_id)
+    rollup = rollup.group_by(r.user_id, r.day, r.payment_method).subquery("rollup")
 
-        db.add(
-            StockMovement(
-                user_id=user_id,
-                product_id=p.id,
-                change=-int(it.qty),
-                reason="SALE",
-                reference=f"sale:{sale.id}",
-                note=None,
+    rows = db.execute(
+        select(
+            func.coalesce(raw.c.user_id, rollup.c.user_id).label("user_id"),
+            func.coalesce(raw.c.day, rollup.c.day).label("day"),
+            func.coalesce(raw.c.payment_method, rollup.c.payment_method).label("payment_method"),
+            raw.c.count_sales.label("raw_count"),
+            raw.c.total.label("raw_total"),
+            rollup.c.count_sales.label("rollup_count"),
+            rollup.c.total.label("rollup_total"),
+        )
+        .select_from(
+            raw.join(
+                rollup,
+                and_(
+                    raw.c.user_id == rollup.c.user_id,
+                    raw.c.day == rollup.c.day,
+                    raw.c.payment_method == rollup.c.payment_method,
+                ),
+                full=True,
+            )
+        )
+        .where(
+            or_(
+                raw.c.count_sales.is_distinct_from(rollup.c.count_sales),
+                raw.c.total.is_distinct_from(rollup.c.total),
             )
         )
+        .order_by("user_id", "day", "payment_method")
+    ).mappings().all()
+    return [dict(r) for r in rows]
 
-    sale.total = total
+def list_sales(
+    db: Session,
+    user_id: int,
+    limit: int | None = None,
+    cursor: int | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+) -> list[Sale]:
+    # items en un solo SELECT ... IN para toda la pagina (evita N+1 al serializar)
+    q = db.query(Sale).options(selectinload(Sale.items)).filter(Sale.user_id == user_id)
+    return _keyset(q, Sale, limit, cursor, created_from, created_to)
 
-    db.commit()
-    db.refresh(sale)
-    return sale
+def list_sales_rows(
+    db: Session,
+    user_id: int,
+    limit: int | None = None,
+    cursor: int | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+) -> list[dict]:
+    # Igual que list_sales, como dicts con los campos de SaleOut: la pagina y
+    # despues los items de toda la pagina en un solo SELECT
+    q = select(
+        Sale.id, cast(Sale.total, Float).label("total"), Sale.payment_method, Sale.created_at,
+    ).where(Sale.user_id == user_id)
+    sales = db.execute(_keyset_filter(q, Sale, limit, cursor, created_from, created_to)).all()
+    if not sales:
+        return []
 
-def list_sales(db: Session, user_id: int) -> list[Sale]:
-    return (
-        db.query(Sale)
-        .filter(Sale.user_id == user_id)
-        .order_by(Sale.id.desc())
-        .all()
+    out = {}
+    for sale_id, total, payment_method, _ in sales:
+        out[sale_id] = {"id": sale_id, "total": total, "payment_method": payment_method, "items": []}
+
+    # los items llevan el created_at de su venta: el rango de la pagina
+    # poda particiones de sale_items
+    created = [s.created_at for s in sales]
+    items = db.execute(
+        select(SaleItem.sale_id, SaleItem.product_id, SaleItem.qty, cast(SaleItem.unit_price, Float))
+        .where(
+            SaleItem.sale_id.in_(list(out)),
+            SaleItem.created_at >= min(created),
+            SaleItem.created_at <= max(created),
+        )
+        .order_by(SaleItem.sale_id, SaleItem.id)
     )
+    for sale_id, product_id, qty, unit_price in items:
+        out[sale_id]["items"].append({"product_id": product_id, "qty": qty, "unit_price": unit_price})
+    return list(out.values())
 
 def _range_to_datetimes(from_date: date, to_date: date) -> tuple[datetime, datetime]:
     start = datetime.combine(from_date, time.min)
     end = datetime.combine(to_date + timedelta(days=1), time.min)
     return start, end
 
-def sales_summary(db: Session, user_id: int, from_date: date, to_date: date) -> dict:
+def _check_tz(tz: str | None) -> None:
+    if tz is None:
+        return
+    try:
+        ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Zona horaria inválida: {tz}")
+
+def range_is_closed(to_date: date, tz: str | None = None) -> bool:
+    # El rango termino hace mas de REPORTS_CLOSED_AFTER_DAYS dias (en tz):
+    # sus reportes ya no deberian cambiar
+    _check_tz(tz)
+    today = datetime.now(ZoneInfo(tz or settings.REPORTS_TZ)).date()
+    return to_date < today - timedelta(days=settings.REPORTS_CLOSED_AFTER_DAYS)
+
+def _sales_aggregate(
+    db: Session,
+    user_id: int,
+    from_date: date,
+    to_date: date,
+    with_summary: bool = True,
+    with_daily: bool = True,
+    granularity: str = "day",
+    tz: str | None = None,
+    fill_gaps: bool = False,
+) -> tuple[dict | None, list[dict] | None]:
+    # Una sola pasada con GROUPING SETS: el resumen agrupa por payment_method
+    # tal cual y el diario por (bucket, upper(payment_method)).
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Granularidad inválida: {granularity}")
+    _check_tz(tz)
+
     start, end = _range_to_datetimes(from_date, to_date)
 
-    sales = (
-        db.query(Sale)
-        .filter(
+    tz = tz or settings.REPORTS_TZ
+    zone = literal(tz)
+
+    parts = []
+    raw_from = start
+
+    # Los dias cerrados salen de sales_daily_rollup (indexado en REPORTS_TZ);
+    # solo el dia en curso se lee de sales. Por hora siempre se usa sales.
+    if granularity != "hour" and tz == settings.REPORTS_TZ:
+        today = datetime.now(ZoneInfo(tz)).date()
+        closed_to = min(to_date + timedelta(days=1), today)
+        if from_date < closed_to:
+            parts.append(
+                select(
+                    func.date_trunc(granularity, cast(SalesDailyRollup.day, DateTime())).label("bucket"),
+                    SalesDailyRollup.payment_method.label("pm"),
+                    SalesDailyRollup.count_sales.label("cnt"),
+                    SalesDailyRollup.total.label("total"),
+                )
+                .where(
+                    SalesDailyRollup.user_id == user_id,
+                    SalesDailyRollup.day >= from_date,
+                    SalesDailyRollup.day < closed_to,
+                )
+            )
+        raw_from = max(start, datetime.combine(today, time.min))
+
+    parts.append(
+        select(
+            func.date_trunc(granularity, func.timezone(zone, Sale.created_at)).label("bucket"),
+            Sale.payment_method.label("pm"),
+            literal(1).label("cnt"),
+            Sale.total.label("total"),
+        )
+        .where(
             Sale.user_id == user_id,
-            Sale.created_at >= start,
-            Sale.created_at < end
+            Sale.created_at >= func.timezone(zone, literal(raw_from, DateTime())),
+            Sale.created_at < func.timezone(zone, literal(end, DateTime())),
         )
-        .all()
     )
 
-    total = float(sum([float(s.total) for s in sales]))
+    base = (union_all(*parts) if len(parts) > 1 else parts[0]).subquery("base")
+
+    bucket = base.c.bucket
+    pm = base.c.pm
+    pm_upper = func.upper(base.c.pm)
+
+    # GROUPING() solo acepta expresiones presentes en algun grouping set, asi
+    # que las columnas de la parte no pedida se reemplazan por constantes.
+    grouping_sets = []
+    cols = []
+    if with_daily:
+        grouping_sets += [tuple_(bucket, pm_upper), tuple_(bucket)]
+        cols += [
+            bucket.label("bucket"),
+            pm_upper.label("pm_upper"),
+            func.grouping(bucket).label("g_bucket"),
+            func.grouping(pm_upper).label("g_pm_upper"),
+        ]
+    else:
+        cols += [
+            null().label("bucket"),
+            null().label("pm_upper"),
+            literal(1).label("g_bucket"),
+            literal(1).label("g_pm_upper"),
+        ]
+    if with_summary:
+        grouping_sets += [tuple_(pm), tuple_()]
+        cols += [pm.label("pm"), func.grouping(pm).label("g_pm")]
+    else:
+        cols += [null().label("pm"), literal(1).label("g_pm")]
+
+    agg = select(
+        *cols,
+        func.coalesce(func.sum(base.c.cnt), 0).label("count_sales"),
+        func.coalesce(func.sum(base.c.total), 0).label("total"),
+    ).group_by(func.grouping_sets(*grouping_sets))
+
+    if with_daily and fill_gaps:
+        # Buckets vacios generados en la base: FULL JOIN contra los totales
+        # por bucket; las demas filas de agg quedan con empty_bucket NULL.
+        agg = agg.cte("agg")
+        series = select(
+            func.generate_series(
+                func.date_trunc(granularity, literal(start, DateTime())),
+                literal(end, DateTime()) - literal(timedelta(microseconds=1)),
+                cast(literal(f"1 {granularity}"), Interval),
+            ).label("bucket")
+        ).cte("series")
+        stmt = select(agg, series.c.bucket.label("empty_bucket")).select_from(
+            series.join(
+                agg,
+                and_(agg.c.bucket == series.c.bucket, agg.c.g_pm_upper == 1),
+                full=True,
+            )
+        )
+    else:
+        stmt = agg
+
+    rows = db.execute(stmt).mappings().all()
+
+    def bucket_key(value: datetime) -> str:
+        if granularity == "hour":
+            return value.isoformat()
+        return value.date().isoformat()
+
+    count = 0
+    total = 0.0
     by_payment: dict[str, float] = {}
-    count = len(sales)
+    by_day: dict[str, dict] = {}
 
-    for s in sales:
-        pm = s.payment_method or "UNSPECIFIED"
-        by_payment[pm] = by_payment.get(pm, 0.0) + float(s.total)
+    for r in rows:
+        if r["g_bucket"] is None:
+            d = bucket_key(r["empty_bucket"])
+            by_day[d] = {
+                "date": d,
+                "count_sales": 0,
+                "total": 0.0,
+                "by_payment_method": {},
+            }
+            continue
+
+        amount = float(r["total"])
+        if r["g_bucket"] == 0:
+            d = bucket_key(r["bucket"])
+            row = by_day.setdefault(d, {
+                "date": d,
+                "count_sales": 0,
+                "total": 0.0,
+                "by_payment_method": {},
+            })
+            if r["g_pm_upper"] == 0:
+                m = r["pm_upper"] or "UNSPECIFIED"
+                row["by_payment_method"][m] = row["by_payment_method"].get(m, 0.0) + amount
+            else:
+                row["count_sales"] = int(r["count_sales"])
+                row["total"] = amount
+        elif r["g_pm"] == 0:
+            m = r["pm"] or "UNSPECIFIED"
+            by_payment[m] = by_payment.get(m, 0.0) + amount
+        else:
+            count = int(r["count_sales"])
+            total = amount
+
+    summary = None
+    if with_summary:
+        summary = {
+            "from": str(from_date),
+            "to": str(to_date),
+            "count_sales": count,
+            "total": round(total, 2),
+            "by_payment_method": {k: round(v, 2) for k, v in by_payment.items()},
+        }
+
+    days = None
+    if with_daily:
+        days = []
+        for d in sorted(by_day.keys()):
+            row = by_day[d]
+            row["total"] = round(row["total"], 2)
+            row["by_payment_method"] = {k: round(v, 2) for k, v in row["by_payment_method"].items()}
+            days.append(row)
 
-    by_payment = {k: round(v, 2) for k, v in by_payment.items()}
+    return summary, days
 
+@timed
+def sales_summary(db: Session, user_id: int, from_date: date, to_date: date, tz: str | None = None) -> dict:
+    summary, _ = _sales_aggregate(db, user_id, from_date, to_date, with_daily=False, tz=tz)
+    return summary
+
+@timed
+def sales_report(
+    db: Session,
+    user_id: int,
+    from_date: date,
+    to_date: date,
+    granularity: str = "day",
+    tz: str | None = None,
+    fill_gaps: bool = False,
+) -> dict:
+    summary, days = _sales_aggregate(
+        db, user_id, from_date, to_date,
+        granularity=granularity, tz=tz, fill_gaps=fill_gaps,
+    )
     return {
+        "summary": summary,
+        "daily": {
+            "from": str(from_date),
+            "to": str(to_date),
+            "days": days,
+        },
+    }
+
+PRODUCT_RANKINGS = ("revenue", "units")
+
+@timed
+def products_report(
+    db: Session,
+    user_id: int,
+    from_date: date,
+    to_date: date,
+    tz: str | None = None,
+    rank_by: str = "revenue",
+    limit: int = 20,
+    offset: int = 0,
+) -> dict:
+    # Ventas por producto en el rango, en una sola consulta: la agregacion por
+    # producto y encima funciones de ventana para participacion, ranking y
+    # totales del rango (iguales en cada fila, asi no hace falta otra consulta).
+    if rank_by not in PRODUCT_RANKINGS:
+        raise ValueError(f"Ranking inválido: {rank_by}")
+    _check_tz(tz)
+
+    start, end = _range_to_datetimes(from_date, to_date)
+    zone = literal(tz or settings.REPORTS_TZ)
+    range_from = func.timezone(zone, literal(start, DateTime()))
+    range_to = func.timezone(zone, literal(end, DateTime()))
+
+    per_product = (
+        select(
+            SaleItem.product_id,
+            func.sum(SaleItem.qty).label("units"),
+            func.sum(SaleItem.qty * SaleItem.unit_price).label("revenue"),
+            # una linea por producto y venta (_merge_sale_items): count(*) es
+            # la cantidad de ventas y permite agregar con hash, sin ordenar
+            func.count().label("sales"),
+        )
+        .join(Sale, and_(Sale.id == SaleItem.sale_id, Sale.created_at == SaleItem.created_at))
+        .where(
+            Sale.user_id == user_id,
+            Sale.created_at >= range_from,
+            Sale.created_at < range_to,
+            # mismo rango sobre los items: poda de particiones en sale_items
+            SaleItem.created_at >= range_from,
+            SaleItem.created_at < range_to,
+        )
+        .group_by(SaleItem.product_id)
+        .subquery("per_product")
+    )
+
+    metric = per_product.c[rank_by]
+    total_revenue = func.sum(per_product.c.revenue).over()
+    ranked = (
+        select(
+            per_product,
+            func.rank().over(order_by=metric.desc()).label("rank"),
+            (per_product.c.revenue / func.nullif(total_revenue, 0)).label("share"),
+            total_revenue.label("total_revenue"),
+            func.sum(per_product.c.units).over().label("total_units"),
+            func.count().over().label("products"),
+        )
+        .subquery("ranked")
+    )
+
+    rows = db.execute(
+        select(ranked, Product.name, Product.sku)
+        .join(Product, Product.id == ranked.c.product_id)
+        .order_by(ranked.c.rank, ranked.c.product_id)
+        .limit(limit + 1)
+        .offset(offset)
+    ).all()
+    if not rows and offset:
+        # pagina fuera de rango: los totales salen de la primera
+        first = products_report(db, user_id, from_date, to_date, tz=tz, rank_by=rank_by, limit=1)
+        return {**first, "items": [], "next_offset": None}
+
+    report = {
         "from": str(from_date),
         "to": str(to_date),
-        "count_sales": count,
-        "total": round(total, 2),
-        "by_payment_method": by_payment,
+        "rank_by": rank_by,
+        "products": 0,
+        "total_units": 0,
+        "total_revenue": 0.0,
+        "items": [],
+        "next_offset": None,
     }
+    if rows:
+        # los totales vienen repetidos en cada fila
+        report["products"] = rows[0].products
+        report["total_units"] = int(rows[0].total_units)
+        report["total_revenue"] = float(rows[0].total_revenue)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        report["next_offset"] = offset + limit
+
+    report["items"] = [
+        {
+            "rank": r.rank,
+            "product_id": r.product_id,
+            "name": r.name,
+            "sku": r.sku,
+            "units": int(r.units),
+            "revenue": float(r.revenue),
+            "sales": r.sales,
+            "share": round(float(r.share), 4) if r.share is not None else 0.0,
+        }
+        for r in rows
+    ]
+    return report
+
+CSV_CHUNK_SIZE = 1000
 
-def sales_rows_for_csv(db: Session, user_id: int, from_date: date, to_date: date) -> list[dict]:
+def sales_csv_stmt(user_id: int, from_date: date, to_date: date):
     start, end = _range_to_datetimes(from_date, to_date)
+    zone = literal(settings.REPORTS_TZ)
 
-    rows = (
-        db.query(Sale, SaleItem, Product)
-        .join(SaleItem, SaleItem.sale_id == Sale.id)
+    return (
+        select(
+            Sale.id,
+            Sale.created_at,
+            Sale.payment_method,
+            Sale.total,
+            Product.id.label("product_id"),
+            Product.name,
+            SaleItem.qty,
+            SaleItem.unit_price,
+        )
+        .join(SaleItem, and_(SaleItem.sale_id == Sale.id, SaleItem.created_at == Sale.created_at))
         .join(Product, Product.id == SaleItem.product_id)
-        .filter(
+        .where(
             Sale.user_id == user_id,
-            Sale.created_at >= start,
-            Sale.created_at < end)
+            Sale.created_at >= func.timezone(zone, literal(start, DateTime())),
+            Sale.created_at < func.timezone(zone, literal(end, DateTime())),
+            # mismo rango sobre los items: poda de particiones en sale_items
+            SaleItem.created_at >= func.timezone(zone, literal(start, DateTime())),
+            SaleItem.created_at < func.timezone(zone, literal(end, DateTime())),
+        )
         .order_by(Sale.id.asc(), SaleItem.id.asc())
-        .all()
-    )
-
-    out = []
-    for sale, item, product in rows:
-        line_total = float(item.qty) * float(item.unit_price)
-        out.append({
-            "sale_id": sale.id,
-            "sale_datetime": str(sale.created_at),
-            "payment_method": sale.payment_method,
-            "product_id": product.id,
-            "product_name": product.name,
-            "qty": int(item.qty),
-            "unit_price": float(item.unit_price),
-            "line_total": round(line_total, 2),
-            "sale_total": float(sale.total),
-        })
-    return out
-
-def sales_daily(db: Session, user_id: int, from_date: date, to_date: date) -> list[dict]:
-    start, end = _range_to_datetimes(from_date, to_date)
-
-    sales = (
-        db.query(Sale)
-        .filter(Sale.user_id == user_id, Sale.created_at >= start, Sale.created_at < end)
-        .all()
     )
 
-    by_day: dict[str, dict] = {}
-    for s in sales:
-        day = s.created_at.date().isoformat()
-        pm = (s.payment_method or "UNSPECIFIED").upper()
-        amount = float(s.total)
-
-        if day not in by_day:
-            by_day[day] = {
-                "date": day,
-                "count_sales": 0,
-                "total": 0.0,
-                "by_payment_method": {},
-            }
-
-        by_day[day]["count_sales"] += 1
-        by_day[day]["total"] += amount
-        by_day[day]["by_payment_method"][pm] = by_day[day]["by_payment_method"].get(pm, 0.0) + amount
+def sales_csv_row(row) -> dict:
+    sale_id, created_at, payment_method, sale_total, product_id, product_name, qty, unit_price = row
+    line_total = float(qty) * float(unit_price)
+    return {
+        "sale_id": sale_id,
+        "sale_datetime": str(created_at),
+        "payment_method": payment_method,
+        "product_id": product_id,
+        "product_name": product_name,
+        "qty": int(qty),
+        "unit_price": float(unit_price),
+        "line_total": round(line_total, 2),
+        "sale_total": float(sale_total),
+    }
 
-    out = []
-    for day in sorted(by_day.keys()):
-        row = by_day[day]
-        row["total"] = round(row["total"], 2)
-        row["by_payment_method"] = {k: round(v, 2) for k, v in row["by_payment_method"].items()}
-        out.append(row)
+def sales_rows_for_csv(
+    db: Session,
+    user_id: int,
+    from_date: date,
+    to_date: date,
+    chunk_size: int = CSV_CHUNK_SIZE,
+) -> Iterator[dict]:
+    # Generador sobre un cursor del lado del servidor (yield_per): la memoria
+    # queda acotada a chunk_size filas sin importar el rango.
+    stmt = sales_csv_stmt(user_id, from_date, to_date).execution_options(yield_per=chunk_size)
+    result = db.execute(stmt)
+    try:
+        for row in result:
+            yield sales_csv_row(row)
+    finally:
+        result.close()
 
-    return out
+@timed
+def sales_daily(
+    db: Session,
+    user_id: int,
+    from_date: date,
+    to_date: date,
+    granularity: str = "day",
+    tz: str | None = None,
+    fill_gaps: bool = False,
+) -> list[dict]:
+    _, days = _sales_aggregate(
+        db, user_id, from_date, to_date,
+        with_summary=False, granularity=granularity, tz=tz, fill_gaps=fill_gaps,
+    )
+    return days
 
+@_retry_on_conflict
 def adjust_stock(db: Session, user_id: int, product_id: int, change: int, reason: str = "ADJUSTMENT", note: str | None = None) -> Product:
     if change == 0:
         raise ValueError("El cambio no puede ser 0")
@@ -259,7 +1270,6 @@ def adjust_stock(db: Session, user_id: int, product_id: int, change: int, reason
     if new_stock < 0:
         raise ValueError(f"Stock insuficiente. Stock actual: {p.stock}, cambio: {change}")
 
-    p.stock = new_stock
     db.add(StockMovement(
         user_id=user_id,
         product_id=p.id,
@@ -268,45 +1278,228 @@ def adjust_stock(db: Session, user_id: int, product_id: int, change: int, reason
         reference="manual",
         note=note,
     ))
+    db.flush()
+    _apply_stock_changes(db, user_id, {p.id: int(change)})
+    _bump_data_version(db, user_id)
     db.commit()
     db.refresh(p)
     return p
 
 
-def list_stock_movements(db: Session, user_id: int, product_id: int) -> list[StockMovement]:
-    return (
-        db.query(StockMovement)
-        .filter(StockMovement.user_id == user_id, StockMovement.product_id == product_id)
-        .order_by(StockMovement.id.desc())
-        .all()
+def list_stock_movements(
+    db: Session,
+    user_id: int,
+    product_id: int,
+    limit: int | None = None,
+    cursor: int | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+) -> list[StockMovement]:
+    q = db.query(StockMovement).filter(
+        StockMovement.user_id == user_id, StockMovement.product_id == product_id
+    )
+    return _keyset(q, StockMovement, limit, cursor, created_from, created_to)
+
+def list_stock_movements_rows(
+    db: Session,
+    user_id: int,
+    product_id: int,
+    limit: int | None = None,
+    cursor: int | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+) -> list[dict]:
+    # Igual que list_stock_movements, como dicts con los campos de StockMovementOut
+    q = select(
+        StockMovement.id,
+        StockMovement.product_id,
+        StockMovement.change,
+        StockMovement.reason,
+        StockMovement.reference,
+        StockMovement.note,
+        StockMovement.created_at,
+    ).where(StockMovement.user_id == user_id, StockMovement.product_id == product_id)
+    return _dict_rows(db.execute(_keyset_filter(q, StockMovement, limit, cursor, created_from, created_to)))
+
+def _day_start(day: date, tz: str | None = None) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=ZoneInfo(tz or settings.REPORTS_TZ))
+
+def take_stock_snapshots(db: Session, at: datetime | None = None, min_movements: int = 1) -> int:
+    # Escribe el stock de cada producto en `at` (por defecto el inicio de hoy
+    # en REPORTS_TZ) para los productos sin foto o con al menos
+    # min_movements movimientos desde la ultima. Se calcula hacia atras desde
+    # el stock actual: stock - movimientos desde `at`. Una transaccion en
+    # curso no cuenta en ninguno de los dos terminos, asi que la foto es
+    # exacta si corre despues de `at`. Idempotente.
+    at = at or _day_start(datetime.now(ZoneInfo(settings.REPORTS_TZ)).date())
+
+    last = (
+        select(func.max(StockSnapshot.taken_at))
+        .where(StockSnapshot.product_id == Product.id)
+        .correlate(Product)
+        .scalar_subquery()
+    )
+    since = (
+        select(func.coalesce(func.sum(StockMovement.change), 0))
+        .where(StockMovement.product_id == Product.id, StockMovement.created_at >= at)
+        .scalar_subquery()
+    )
+    pending = (
+        select(func.count())
+        .where(
+            StockMovement.product_id == Product.id,
+            StockMovement.created_at >= last,
+            StockMovement.created_at < at,
+        )
+        .scalar_subquery()
+    )
+    rows = select(Product.id, literal(at, DateTime(timezone=True)), Product.stock - since).where(
+        Product.created_at < at,
+        or_(last.is_(None), and_(last < at, pending >= min_movements)),
+    )
+    stmt = (
+        insert(StockSnapshot)
+        .from_select(["product_id", "taken_at", "stock"], rows)
+        .on_conflict_do_nothing(index_elements=["product_id", "taken_at"])
+        .returning(StockSnapshot.product_id)
     )
+    n = len(db.execute(stmt).all())
+    db.commit()
+    return n
+
+def stock_as_of(db: Session, user_id: int, as_of: date, tz: str | None = None) -> dict:
+    # Stock de todo el catalogo al cierre del dia as_of. Parte de la foto mas
+    # cercana anterior y suma los movimientos hasta el cierre; sin foto previa
+    # (fechas anteriores a la primera) resta desde la siguiente foto o desde
+    # el stock actual. Con fotos diarias el replay es de a lo sumo un dia por
+    # producto.
+    _check_tz(tz)
+    at = _day_start(as_of + timedelta(days=1), tz)
+
+    before = (
+        select(StockSnapshot.taken_at, StockSnapshot.stock)
+        .where(StockSnapshot.product_id == Product.id, StockSnapshot.taken_at <= at)
+        .order_by(StockSnapshot.taken_at.desc())
+        .limit(1)
+        .lateral("before")
+    )
+    after = (
+        select(StockSnapshot.taken_at, StockSnapshot.stock)
+        .where(StockSnapshot.product_id == Product.id, StockSnapshot.taken_at > at)
+        .order_by(StockSnapshot.taken_at)
+        .limit(1)
+        .lateral("after")
+    )
+    forward = before.c.taken_at.is_not(None)
+    at_literal = literal(at, DateTime(timezone=True))
+    infinity = cast(literal("infinity"), DateTime(timezone=True))
+
+    replay = (
+        select(func.coalesce(func.sum(StockMovement.change), 0))
+        .where(
+            StockMovement.product_id == Product.id,
+            StockMovement.created_at >= func.coalesce(before.c.taken_at, at_literal),
+            StockMovement.created_at < case(
+                (forward, at_literal),
+                else_=func.coalesce(after.c.taken_at, infinity),
+            ),
+        )
+        .scalar_subquery()
+    )
+    stock = case(
+        (forward, before.c.stock + replay),
+        else_=func.coalesce(after.c.stock, Product.stock) - replay,
+    )
+
+    rows = db.execute(
+        select(Product.id, Product.sku, Product.name, stock.label("stock"))
+        .select_from(Product)
+        .outerjoin(before, true())
+        .outerjoin(after, true())
+        .where(Product.owner_id == user_id, Product.created_at < at)
+        .order_by(Product.id)
+    ).all()
+    return {
+        "as_of": str(as_of),
+        "at": at.isoformat(),
+        "items": [
+            {"product_id": pid, "sku": sku, "name": name, "stock": int(qty)}
+            for pid, sku, name, qty in rows
+        ],
+    }
 
     
 def get_user_by_email(db: Session, email: str) -> User | None:
     return db.query(User).filter(User.email == email).first()
 
-def create_user(db: Session, email: str, password: str) -> User:
-    print("HASH FN MODULE:", hash_password.__module__)
-    print("PASSWORD TYPE:", type(password))
-    print("PASSWORD REPR:", repr(password))
-    print("PASSWORD BYTES LEN:", len(password.encode("utf-8")))
+def get_user_snapshot(db: Session, email: str) -> User | None:
+    # Copia desacoplada de la sesion (transient): se puede leer despues de un
+    # commit, fuera de la sesion y desde el cache de auth.
+    u = get_user_by_email(db, email)
+    if not u:
+        return None
+    return User(
+        id=u.id,
+        email=u.email,
+        password_hash=u.password_hash,
+        is_active=u.is_active,
+        created_at=u.created_at,
+    )
 
+def create_user(db: Session, email: str, password: str | None = None, password_hash: str | None = None) -> User:
+    # password_hash permite hashear fuera (pool de auth) y pasar el resultado
     email = email.strip().lower()
     if get_user_by_email(db, email):
         raise ValueError("Email ya registrado")
 
-    u = User(email=email, password_hash=hash_password(password))
+    u = User(email=email, password_hash=password_hash or hash_password(password))
     db.add(u)
     db.commit()
     db.refresh(u)
     return u
 
+def set_user_active(db: Session, email: str, is_active: bool) -> User | None:
+    u = get_user_by_email(db, email.strip().lower())
+    if not u:
+        return None
+    u.is_active = is_active
+    db.commit()
+    return u
+
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _collect_cached_user(mapper, connection, target: User) -> None:
+    # Cualquier cambio de un usuario via ORM lo saca del cache de auth,
+    # incluido el email anterior si cambio. En el flush solo se anota: hasta
+    # el commit otro request todavia lee la fila vieja y la volveria a cachear.
+    pending = object_session(target).info.setdefault("cached_users_to_invalidate", set())
+    pending.add(target.email)
+    pending.update(inspect(target).attrs.email.history.deleted)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_cached_users(session: Session) -> None:
+    for email in session.info.pop("cached_users_to_invalidate", ()):
+        user_cache.invalidate(email)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_cached_users(session: Session) -> None:
+    session.info.pop("cached_users_to_invalidate", None)
+
+def update_password_hash(db: Session, user_id: int, password_hash: str) -> None:
+    u = db.get(User, user_id)
+    u.password_hash = password_hash
+    db.commit()
+
 def authenticate_user(db: Session, email: str, password: str) -> User | None:
     u = get_user_by_email(db, email.strip().lower())
     if not u:
         return None
-    if not verify_password(password, u.password_hash):
+    valid, new_hash = verify_and_update_password(password, u.password_hash)
+    if not valid:
         return None
     if not u.is_active:
         return None
+    if new_hash:
+        update_password_hash(db, u.id, new_hash)
     return u
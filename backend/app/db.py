@@ -1,12 +1,35 @@
+import time
+
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
 from app.config import get_settings
+from app import metrics
 
 settings = get_settings()
 
+
+def _timed_pool(base, label: str):
+    # Mide cuanto tarda cada checkout (espera por una conexion libre, mas el
+    # pre-ping o la conexion nueva) en db_pool_checkout_seconds{pool=label}
+    class TimedPool(base):
+        def connect(self):
+            t0 = time.perf_counter()
+            try:
+                return super().connect()
+            finally:
+                metrics.db_pool_checkout.observe(time.perf_counter() - t0, label)
+
+    TimedPool.__name__ = f"Timed{base.__name__}"
+    return TimedPool
+
+
 engine = create_engine(
     settings.DATABASE_URL,
     pool_pre_ping=True,
+    poolclass=_timed_pool(QueuePool, "sync"),
 )
 
 SessionLocal = sessionmaker(
@@ -15,6 +38,31 @@ SessionLocal = sessionmaker(
     bind=engine
 )
 
+# postgresql+psycopg usa la variante async del mismo driver con create_async_engine.
+# No abre conexiones hasta el primer uso, asi que no cuesta nada en modo sync.
+async_engine = create_async_engine(
+    settings.DATABASE_URL,
+    pool_pre_ping=True,
+    poolclass=_timed_pool(AsyncAdaptedQueuePool, "async"),
+)
+
+
+def _pool_stats():
+    for label, pool in (("sync", engine.pool), ("async", async_engine.pool)):
+        # overflow() arranca en -pool_size; solo interesa lo que pasa del tamaño fijo
+        yield (label, "size"), pool.size()
+        yield (label, "checked_out"), pool.checkedout()
+        yield (label, "overflow"), max(pool.overflow(), 0)
+
+metrics.registry.register(metrics.CallbackGauge(
+    "db_pool_connections", "Estado del pool de conexiones de SQLAlchemy", ("pool", "state"), _pool_stats,
+))
+
+AsyncSessionLocal = async_sessionmaker(
+    autoflush=False,
+    bind=async_engine,
+)
+
 class Base(DeclarativeBase):
     pass
 
@@ -23,4 +71,73 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def _to_out(out, value):
+    if out is None or value is None:
+        return value
+    if isinstance(value, list):
+        return [_to_out(out, v) for v in value]
+    if isinstance(value, out):
+        return value
+    return out.model_validate(value)
+
+
+class Database:
+    # Adaptador que usan los endpoints para llamar a las funciones de crud
+    # (sincronicas, reciben una Session) en cualquiera de los dos modos:
+    #   - sync: Session en el threadpool de Starlette
+    #   - async (DB_ASYNC): AsyncSession sobre psycopg async; crud corre via
+    #     run_sync, sin ocupar threads mientras espera a la base.
+    # Con out=Schema el resultado se valida dentro de la misma llamada, asi los
+    # atributos expirados se cargan alli y no al serializar la respuesta.
+    def __init__(self, session: Session | AsyncSession):
+        self.session = session
+        self.is_async = isinstance(session, AsyncSession)
+
+    async def run(self, fn, *args, out=None, **kwargs):
+        def call(session: Session):
+            return _to_out(out, fn(session, *args, **kwargs))
+
+        if self.is_async:
+            return await self.session.run_sync(call)
+        return await run_in_threadpool(call, self.session)
+
+    async def stream(self, stmt, chunk_size: int):
+        # Filas desde un cursor del lado del servidor, de a chunk_size por
+        # viaje (en modo sync, un salto al threadpool por bloque, no por fila)
+        stmt = stmt.execution_options(yield_per=chunk_size)
+        if self.is_async:
+            result = await self.session.stream(stmt)
+            try:
+                async for rows in result.partitions():
+                    for row in rows:
+                        yield row
+            finally:
+                await result.close()
+        else:
+            result = await run_in_threadpool(self.session.execute, stmt)
+            try:
+                async for rows in iterate_in_threadpool(result.partitions()):
+                    for row in rows:
+                        yield row
+            finally:
+                result.close()
+
+    async def close(self) -> None:
+        if self.is_async:
+            await self.session.close()
+        else:
+            await run_in_threadpool(self.session.close)
+
+
+async def get_database():
+    if settings.DB_ASYNC:
+        db = Database(AsyncSessionLocal())
+    else:
+        db = Database(SessionLocal())
+    try:
+        yield db
+    finally:
+        await db.close()
@@ -1,28 +1,58 @@
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import FastAPI, Depends, HTTPException, File, Request, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import get_settings
-from .db import Base, engine, get_db
-from . import crud, schemas, models
-from datetime import date
+from .db import Database, SessionLocal, get_database
+from . import crud, schemas, models, partitions
+from datetime import date, datetime
 from fastapi import Query
-from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from .auth import create_access_token, decode_token
+from .auth import (
+    PasswordPoolBusy,
+    create_access_token,
+    decode_token,
+    hash_password_async,
+    password_pool,
+    verify_and_update_password_async,
+)
+from .cache import user_cache
+from . import metrics
+from .sql_profiler import SqlProfilerMiddleware
 import csv
+import hashlib
 import io
+import json
+import orjson
+from contextlib import asynccontextmanager
+
+def _ensure_partitions() -> None:
+    with SessionLocal() as db:
+        if partitions.is_partitioned(db):
+            partitions.ensure_partitions(db, months_ahead=get_settings().PARTITIONS_MONTHS_AHEAD)
+            db.commit()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # con las tablas particionadas, cada arranque crea los meses que faltan
+    await run_in_threadpool(_ensure_partitions)
+    yield
 
-app = FastAPI(title="Stock App API")
+app = FastAPI(title="Stock App API", lifespan=lifespan)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)) -> models.User:
+async def get_current_user(db: Database = Depends(get_database), token: str = Depends(oauth2_scheme)) -> models.User:
     try:
         email = decode_token(token)
     except Exception:
         raise HTTPException(status_code=401, detail="Token inválido")
 
-    u = crud.get_user_by_email(db, email)
+    u = user_cache.get(email)
+    if u is None:
+        u = await db.run(crud.get_user_snapshot, email)
+        if u:
+            user_cache.set(email, u)
     if not u:
         raise HTTPException(status_code=401, detail="Usuario no encontrado")
     if not u.is_active:
@@ -39,52 +69,277 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# siempre instalado: SQL_PROFILER_ENABLED se lee en cada request
+app.add_middleware(SqlProfilerMiddleware)
+
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+@app.exception_handler(crud.TransactionConflict)
+async def transaction_conflict_handler(request: Request, exc: crud.TransactionConflict):
+    # se agotaron los reintentos de crud: el cliente puede volver a mandarla
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+SALES_CSV_FIELDS = [
+    "sale_id",
+    "sale_datetime",
+    "payment_method",
+    "product_id",
+    "product_name",
+    "qty",
+    "unit_price",
+    "line_total",
+    "sale_total",
+]
+
+async def _iter_csv(rows, fieldnames: list[str], chunk_size: int = crud.CSV_CHUNK_SIZE):
+    # Escribe el CSV por bloques: el encabezado sale antes de la primera consulta
+    # y cada bloque de chunk_size filas se envia apenas se completa.
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=fieldnames)
+    writer.writeheader()
+    yield output.getvalue()
+    output.seek(0)
+    output.truncate(0)
+
+    n = 0
+    async for row in rows:
+        writer.writerow(row)
+        n += 1
+        if n % chunk_size == 0:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate(0)
+
+    if output.tell():
+        yield output.getvalue()
+
+class PageParams:
+    # Paginacion keyset comun a los listados; ?all=true devuelve la lista
+    # completa sin paginar, como antes.
+    def __init__(
+        self,
+        limit: int = Query(50, ge=1, le=500),
+        cursor: int | None = None,
+        created_from: datetime | None = None,
+        created_to: datetime | None = None,
+        unpaginated: bool = Query(False, alias="all"),
+    ):
+        self.limit = limit
+        self.cursor = cursor
+        self.created_from = created_from
+        self.created_to = created_to
+        self.unpaginated = unpaginated
+
+    def crud_kwargs(self) -> dict:
+        return {
+            # una fila extra para saber si hay pagina siguiente
+            "limit": None if self.unpaginated else self.limit + 1,
+            "cursor": self.cursor,
+            "created_from": self.created_from,
+            "created_to": self.created_to,
+        }
+
+    def wrap(self, rows: list):
+        if self.unpaginated:
+            return rows
+        if len(rows) > self.limit:
+            rows = rows[:self.limit]
+            last = rows[-1]
+            return {"items": rows, "next_cursor": last["id"] if isinstance(last, dict) else last.id}
+        return {"items": rows, "next_cursor": None}
+
+class RowsJSONResponse(Response):
+    # Listados de solo lectura: las filas de crud.list_*_rows ya tienen los
+    # tipos de la respuesta y van directo a orjson, sin pasar por el ORM ni
+    # por Pydantic. "Z" para UTC, igual que lo que serializa Pydantic.
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+
+def _if_none_match(request: Request) -> set[str]:
+    header = request.headers.get("if-none-match", "")
+    return {tag.strip().removeprefix("W/") for tag in header.split(",") if tag.strip()}
+
+async def _conditional(request: Request, response: Response, db: Database, user_id: int, cache_control: str) -> dict:
+    # ETag fuerte: usuario + version de sus datos + URL. La version se lee
+    # antes que los datos: si una escritura entra en el medio, la respuesta
+    # es mas nueva que su ETag y el proximo pedido la vuelve a traer entera.
+    version = await db.run(crud.get_data_version, user_id)
+    url = f"{app.version} {request.url.path}?{request.url.query}"
+    etag = f'"{user_id}-{version}-{hashlib.sha1(url.encode()).hexdigest()[:16]}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+
+    tags = _if_none_match(request)
+    if etag in tags or "*" in tags:
+        # antes de la consulta del endpoint: un 304 cuesta un SELECT por id
+        raise HTTPException(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return headers
+
+async def data_etag(
+    request: Request,
+    response: Response,
+    db: Database = Depends(get_database),
+    current_user: models.User = Depends(get_current_user),
+) -> dict:
+    # no-cache: el navegador guarda la respuesta pero revalida cada vez
+    return await _conditional(request, response, db, current_user.id, "private, no-cache")
+
+async def report_etag(
+    request: Request,
+    response: Response,
+    to_date: date = Query(..., alias="to"),
+    db: Database = Depends(get_database),
+    current_user: models.User = Depends(get_current_user),
+) -> dict:
+    # Rangos ya cerrados: el navegador reusa la respuesta sin preguntar
+    try:
+        closed = crud.range_is_closed(to_date, request.query_params.get("tz"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    cache_control = f"private, max-age={settings.REPORTS_CACHE_MAX_AGE}" if closed else "private, no-cache"
+    return await _conditional(request, response, db, current_user.id, cache_control)
+
 @app.get("/health", tags=["health"])
 def health_check():
     return {"status": "ok"}
 
+@app.get("/health/user-cache", tags=["health"])
+def user_cache_stats():
+    return user_cache.stats()
+
+@app.get("/health/password-pool", tags=["health"])
+def password_pool_stats():
+    return password_pool.stats()
+
+@app.get("/metrics", tags=["health"], include_in_schema=False)
+def metrics_endpoint():
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.post("/products", response_model=schemas.ProductOut)
-def create_product(
+async def create_product(
     payload: schemas.ProductCreate,
-    db: Session = Depends(get_db),
+    db: Database = Depends(get_database),
     current_user: models.User = Depends(get_current_user),
 ):
     try:
-        return crud.create_product(db, current_user.id, payload)
+        return await db.run(crud.create_product, current_user.id, payload, out=schemas.ProductOut)
     except ValueError as e:
         msg = str(e)
         if "SKU ya existe" in msg:
             raise HTTPException(status_code=409, detail=msg)
         raise HTTPException(status_code=400, detail=msg)
 
-@app.get("/products", response_model=list[schemas.ProductOut])
-def list_products(
+def _iter_import_rows(file: UploadFile):
+    # (nro de fila, dict) leyendo el archivo como stream; CSV, JSON Lines o
+    # un array JSON
+    name = (file.filename or "").lower()
+    text = io.TextIOWrapper(file.file, encoding="utf-8-sig")
+
+    if name.endswith(".csv") or file.content_type == "text/csv":
+        for n, row in enumerate(csv.DictReader(text), start=1):
+            yield n, {k.strip(): v.strip() for k, v in row.items() if k and v not in (None, "")}
+    elif name.endswith((".jsonl", ".ndjson")) or file.content_type == "application/x-ndjson":
+        for n, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield n, json.loads(line)
+            except json.JSONDecodeError:
+                yield n, line
+    else:
+        try:
+            data = json.load(text)
+        except json.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="Formato no soportado: usar CSV, JSON Lines o un array JSON")
+        if not isinstance(data, list):
+            raise HTTPException(status_code=400, detail="Se esperaba un array JSON de productos")
+        yield from enumerate(data, start=1)
+
+@app.post("/products/import", response_model=schemas.ProductImportOut)
+async def import_products(
+    file: UploadFile = File(...),
+    db: Database = Depends(get_database),
+    current_user: models.User = Depends(get_current_user),
+):
+    return await db.run(crud.import_products, current_user.id, _iter_import_rows(file))
+
+@app.get("/products", response_model=schemas.Page[schemas.ProductOut] | list[schemas.ProductOut])
+async def list_products(
     include_inactive: bool = False,
-    db: Session = Depends(get_db),
+    page: PageParams = Depends(),
+    etag: dict = Depends(data_etag),
+    db: Database = Depends(get_database),
+    current_user: models.User = Depends(get_current_user),
+):
+    rows = await db.run(
+        crud.list_products_rows, current_user.id, include_inactive=include_inactive, **page.crud_kwargs()
+    )
+    # una Response devuelta tal cual no recibe los headers de data_etag
+    return RowsJSONResponse(page.wrap(rows), headers=etag)
+
+# antes de /products/{product_id} para que no se tomen como un id
+@app.get("/products/low-stock", response_model=schemas.LowStockPage)
+async def products_low_stock(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: str | None = None,
+    since: int | None = None,
+    db: Database = Depends(get_database),
     current_user: models.User = Depends(get_current_user),
 ):
-    return crud.list_products(db, current_user.id, include_inactive=include_inactive)
+    try:
+        return await db.run(crud.list_low_stock, current_user.id, limit=limit, cursor=cursor, since=since)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/products/search", response_model=list[schemas.ProductSearchHit])
+async def products_search(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(crud.SEARCH_LIMIT, ge=1, le=100),
+    db: Database = Depends(get_database),
+    current_user: models.User = Depends(get_current_user),
+):
+    try:
+        return await db.run(crud.search_products, current_user.id, q, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/products/stock-as-of")
+async def products_stock_as_of(
+    as_of: date = Query(..., alias="date"),
+    tz: str | None = None,
+    db: Database = Depends(get_database),
+    current_user: models.User = Depends(get_current_user),
+):
+    try:
+        return await db.run(crud.stock_as_of, current_user.id, as_of, tz=tz)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/products/{product_id}", response_model=schemas.ProductOut)
-def get_product(
+async def get_product(
     product_id: int,
-    db: Session = Depends(get_db),
+    db: Database = Depends(get_database),
     current_user: models.User = Depends(get_current_user),
 ):
-    p = crud.get_product(db, current_user.id, product_id)
+    p = await db.run(crud.get_product, current_user.id, product_id, out=schemas.ProductOut)
     if not p:
         raise HTTPException(status_code=404, detail="Product not found")
     return p
 
 @app.patch("/products/{product_id}", response_model=schemas.ProductOut)
-def update_product(
+async def update_product(
     product_id: int,
     payload: schemas.ProductUpdate,
-    db: Session = Depends(get_db),
+    db: Database = Depends(get_database),
     current_user: models.User = Depends(get_current_user),
 ):
     try:
-        p = crud.update_product(db, current_user.id, product_id, payload)
+        p = await db.run(crud.update_product, current_user.id, product_id, payload, out=schemas.ProductOut)
     except ValueError as e:
         msg = str(e)
         if "SKU ya existe" in msg:
@@ -97,102 +352,163 @@ def update_product(
 
 
 @app.delete("/products/{product_id}")
-def delete_product(
+async def delete_product(
     product_id: int,
-    db: Session = Depends(get_db),
+    db: Database = Depends(get_database),
     current_user: models.User = Depends(get_current_user),
 ):
-    ok = crud.delete_product(db, current_user.id, product_id)
+    ok = await db.run(crud.delete_product, current_user.id, product_id)
     if not ok:
         raise HTTPException(status_code=404, detail="Product not found")
     return {"deleted": True}
 
 
 @app.post("/sales", response_model=schemas.SaleOut)
-def create_sale(
+async def create_sale(
     payload: schemas.SaleCreate,
-    db: Session = Depends(get_db),
+    db: Database = Depends(get_database),
     current_user: models.User = Depends(get_current_user),
 ):
     try:
-        return crud.create_sale(db, current_user.id, payload)
+        return await db.run(crud.create_sale, current_user.id, payload)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@app.get("/sales", response_model=list[schemas.SaleOut])
-def list_sales(
-    db: Session = Depends(get_db),
+@app.post("/sales/batch", response_model=schemas.SaleBatchOut)
+async def create_sales_batch(
+    payload: schemas.SaleBatchCreate,
+    db: Database = Depends(get_database),
+    current_user: models.User = Depends(get_current_user),
+):
+    return {"results": await db.run(crud.create_sales_batch, current_user.id, payload.sales)}
+
+
+@app.get("/sales", response_model=schemas.Page[schemas.SaleOut] | list[schemas.SaleOut])
+async def list_sales(
+    page: PageParams = Depends(),
+    etag: dict = Depends(data_etag),
+    db: Database = Depends(get_database),
     current_user: models.User = Depends(get_current_user),
 ):
-    return crud.list_sales(db, current_user.id)
+    rows = await db.run(crud.list_sales_rows, current_user.id, **page.crud_kwargs())
+    return RowsJSONResponse(page.wrap(rows), headers=etag)
 
 
-@app.get("/reports/sales/summary")
-def report_sales_summary(
+@app.get("/reports/sales", dependencies=[Depends(report_etag)])
+async def report_sales(
     from_date: date = Query(..., alias="from"),
     to_date: date = Query(..., alias="to"),
-    db: Session = Depends(get_db),
+    granularity: schemas.ReportGranularity = "day",
+    tz: str | None = None,
+    fill_gaps: bool = False,
+    db: Database = Depends(get_database),
     current_user: models.User = Depends(get_current_user),
 ):
-    return crud.sales_summary(db, current_user.id, from_date, to_date)
+    try:
+        return await db.run(
+            crud.sales_report, current_user.id, from_date, to_date,
+            granularity=granularity, tz=tz, fill_gaps=fill_gaps,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
-@app.get("/reports/sales/export.csv")
-def report_sales_export_csv(
+@app.get("/reports/sales/summary", dependencies=[Depends(report_etag)])
+async def report_sales_summary(
     from_date: date = Query(..., alias="from"),
     to_date: date = Query(..., alias="to"),
-    db: Session = Depends(get_db),
+    tz: str | None = None,
+    db: Database = Depends(get_database),
     current_user: models.User = Depends(get_current_user),
 ):
-    rows = crud.sales_rows_for_csv(db, current_user.id, from_date, to_date)
+    try:
+        return await db.run(crud.sales_summary, current_user.id, from_date, to_date, tz=tz)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    output = io.StringIO()
-    writer = csv.DictWriter(output, fieldnames=[
-        "sale_id",
-        "sale_datetime",
-        "payment_method",
-        "product_id",
-        "product_name",
-        "qty",
-        "unit_price",
-        "line_total",
-        "sale_total",
-    ])
-    writer.writeheader()
-    writer.writerows(rows)
 
-    output.seek(0)
+@app.get("/reports/products", dependencies=[Depends(report_etag)])
+async def report_products(
+    from_date: date = Query(..., alias="from"),
+    to_date: date = Query(..., alias="to"),
+    tz: str | None = None,
+    rank_by: schemas.ProductRanking = "revenue",
+    limit: int = Query(20, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    db: Database = Depends(get_database),
+    current_user: models.User = Depends(get_current_user),
+):
+    try:
+        return await db.run(
+            crud.products_report, current_user.id, from_date, to_date,
+            tz=tz, rank_by=rank_by, limit=limit, offset=offset,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/reports/sales/export.csv")
+async def report_sales_export_csv(
+    from_date: date = Query(..., alias="from"),
+    to_date: date = Query(..., alias="to"),
+    cache: dict = Depends(report_etag),
+    db: Database = Depends(get_database),
+    current_user: models.User = Depends(get_current_user),
+):
+    stmt = crud.sales_csv_stmt(current_user.id, from_date, to_date)
+    rows = db.stream(stmt, chunk_size=crud.CSV_CHUNK_SIZE)
 
     filename = f"ventas_{from_date}_a_{to_date}.csv"
     return StreamingResponse(
-        iter([output.getvalue()]),
+        _iter_csv((crud.sales_csv_row(r) async for r in rows), SALES_CSV_FIELDS),
         media_type="text/csv; charset=utf-8",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        headers={**cache, "Content-Disposition": f'attachment; filename="{filename}"'},
     )
     
-@app.get("/reports/sales/daily")
-def report_sales_daily(
+@app.get("/reports/sales/daily", dependencies=[Depends(report_etag)])
+async def report_sales_daily(
     from_date: date = Query(..., alias="from"),
     to_date: date = Query(..., alias="to"),
-    db: Session = Depends(get_db),
+    granularity: schemas.ReportGranularity = "day",
+    tz: str | None = None,
+    fill_gaps: bool = False,
+    db: Database = Depends(get_database),
     current_user: models.User = Depends(get_current_user),
 ):
+    try:
+        days = await db.run(
+            crud.sales_daily, current_user.id, from_date, to_date,
+            granularity=granularity, tz=tz, fill_gaps=fill_gaps,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     return {
         "from": str(from_date),
         "to": str(to_date),
-        "days": crud.sales_daily(db, current_user.id, from_date, to_date),
+        "days": days,
     }
 
 
 @app.get("/reports/sales/daily/export.csv")
-def report_sales_daily_export_csv(
+async def report_sales_daily_export_csv(
     from_date: date = Query(..., alias="from"),
     to_date: date = Query(..., alias="to"),
-    db: Session = Depends(get_db),
+    granularity: schemas.ReportGranularity = "day",
+    tz: str | None = None,
+    fill_gaps: bool = False,
+    cache: dict = Depends(report_etag),
+    db: Database = Depends(get_database),
     current_user: models.User = Depends(get_current_user),
 ):
-    data = crud.sales_daily(db, current_user.id, from_date, to_date)
+    try:
+        data = await db.run(
+            crud.sales_daily, current_user.id, from_date, to_date,
+            granularity=granularity, tz=tz, fill_gaps=fill_gaps,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     all_methods = sorted({m for d in data for m in d["by_payment_method"].keys()})
 
@@ -217,19 +533,20 @@ def report_sales_daily_export_csv(
     return StreamingResponse(
         iter([output.getvalue()]),
         media_type="text/csv; charset=utf-8",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        headers={**cache, "Content-Disposition": f'attachment; filename="{filename}"'},
     )
     
 @app.post("/products/{product_id}/stock", response_model=schemas.ProductOut)
-def adjust_product_stock(
+async def adjust_product_stock(
     product_id: int,
     payload: schemas.StockAdjust,
-    db: Session = Depends(get_db),
+    db: Database = Depends(get_database),
     current_user: models.User = Depends(get_current_user),
 ):
     try:
-        return crud.adjust_stock(
-            db,
+        return await db.run(
+            crud.adjust_stock,
+            out=schemas.ProductOut,
             user_id=current_user.id,
             product_id=product_id,
             change=payload.change,
@@ -240,31 +557,66 @@ def adjust_product_stock(
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@app.get("/products/{product_id}/stock-movements", response_model=list[schemas.StockMovementOut])
-def get_product_stock_movements(
+@app.get(
+    "/products/{product_id}/stock-movements",
+    response_model=schemas.Page[schemas.StockMovementOut] | list[schemas.StockMovementOut],
+)
+async def get_product_stock_movements(
     product_id: int,
-    db: Session = Depends(get_db),
+    page: PageParams = Depends(),
+    db: Database = Depends(get_database),
     current_user: models.User = Depends(get_current_user),
 ):
-    return crud.list_stock_movements(db, current_user.id, product_id)
+    rows = await db.run(crud.list_stock_movements_rows, current_user.id, product_id, **page.crud_kwargs())
+    return RowsJSONResponse(page.wrap(rows))
+
+
+# bcrypt corre en el pool dedicado de auth.password_pool, asi register/login
+# no ocupan workers ni el event loop mientras hashean.
 
+def _password_pool_busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Demasiados inicios de sesión simultáneos, reintentar",
+        headers={"Retry-After": "1"},
+    )
 
 @app.post("/auth/register", response_model=schemas.UserOut)
-def register(payload: schemas.UserRegister, db: Session = Depends(get_db)):
+async def register(payload: schemas.UserRegister, db: Database = Depends(get_database)):
+    email = payload.email.strip().lower()
+    if await db.run(crud.get_user_snapshot, email):
+        raise HTTPException(status_code=400, detail="Email ya registrado")
+
     try:
-        return crud.create_user(db, payload.email, payload.password)
+        password_hash = await hash_password_async(payload.password)
+    except PasswordPoolBusy:
+        raise _password_pool_busy()
+
+    try:
+        return await db.run(crud.create_user, email, password_hash=password_hash, out=schemas.UserOut)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/auth/login", response_model=schemas.TokenOut)
-def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    u = crud.authenticate_user(db, form.username, form.password)  # username = email
+async def login(form: OAuth2PasswordRequestForm = Depends(), db: Database = Depends(get_database)):
+    u = await db.run(crud.get_user_snapshot, form.username.strip().lower())  # username = email
     if not u:
         raise HTTPException(status_code=401, detail="Credenciales inválidas")
 
+    try:
+        valid, new_hash = await verify_and_update_password_async(form.password, u.password_hash)
+    except PasswordPoolBusy:
+        raise _password_pool_busy()
+    if not valid or not u.is_active:
+        raise HTTPException(status_code=401, detail="Credenciales inválidas")
+
+    # el costo configurado cambio: se guarda el hash nuevo
+    if new_hash:
+        await db.run(crud.update_password_hash, u.id, new_hash)
+
     token = create_access_token(subject=u.email)
     return {"access_token": token, "token_type": "bearer"}
 
 @app.get("/auth/me", response_model=schemas.UserOut)
-def me(current_user: models.User = Depends(get_current_user)):
+async def me(current_user: models.User = Depends(get_current_user)):
     return current_user
@@ -0,0 +1,264 @@
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from functools import wraps
+
+# Metricas en formato de texto de Prometheus, sin dependencias externas.
+# El camino caliente no toma locks: cada thread escribe en su propio shard y
+# el scrape (/metrics) suma todos los shards. Los valores de otro thread se
+# leen sin sincronizar, asi que un scrape puede quedar apenas desactualizado.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _ShardOwner:
+    # Vive en el threading.local de su thread: cuando el thread termina se
+    # libera y su finalize pasa el shard a los retirados
+    __slots__ = ("shard", "__weakref__")
+
+    def __init__(self):
+        self.shard: dict = {}
+
+
+class _Sharded:
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: list[dict] = []
+        # lo acumulado por threads que ya terminaron (los workers del
+        # threadpool mueren por inactividad y se crean otros): asi la lista
+        # de shards, y el costo del scrape, no crece con la vida del proceso
+        self._retired: dict = {}
+        # reentrante: un finalize puede correr en el thread que tiene el lock
+        self._lock = threading.RLock()
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.owner.shard
+        except AttributeError:
+            # una vez por thread
+            owner = self._local.owner = _ShardOwner()
+            with self._lock:
+                self._shards.append(owner.shard)
+            weakref.finalize(owner, self._retire, owner.shard)
+            return owner.shard
+
+    def _retire(self, shard: dict) -> None:
+        # el thread ya no escribe: se puede sumar sin carreras
+        with self._lock:
+            self._shards = [s for s in self._shards if s is not shard]
+            for key, cell in shard.items():
+                acc = self._retired.get(key)
+                if acc is None:
+                    self._retired[key] = list(cell)
+                else:
+                    for i, v in enumerate(cell):
+                        acc[i] += v
+
+    def _snapshot(self) -> list[list]:
+        with self._lock:
+            shards = list(self._shards)
+            retired = [(key, list(cell)) for key, cell in self._retired.items()]
+        # dict.items() copiado en C, sin soltar el GIL
+        return [retired] + [list(s.items()) for s in shards]
+
+
+class Counter(_Sharded):
+    kind = "counter"
+
+    def __init__(self, name: str, doc: str, labelnames: tuple = ()):
+        super().__init__()
+        self.name = name
+        self.doc = doc
+        self.labelnames = labelnames
+
+    def inc(self, *labelvalues, amount: float = 1) -> None:
+        shard = self._shard()
+        cell = shard.get(labelvalues)
+        if cell is None:
+            cell = shard[labelvalues] = [0]
+        cell[0] += amount
+
+    def values(self) -> dict:
+        totals: dict = {}
+        for items in self._snapshot():
+            for key, cell in items:
+                totals[key] = totals.get(key, 0) + cell[0]
+        return totals
+
+    def collect(self) -> list[str]:
+        values = self.values()
+        if not self.labelnames and not values:
+            values = {(): 0}
+        return [
+            f"{self.name}{_labels(self.labelnames, key)} {_fmt(v)}"
+            for key, v in sorted(values.items())
+        ]
+
+
+class Gauge(Counter):
+    # inc/dec pueden caer en shards distintos; la suma sigue siendo correcta
+    kind = "gauge"
+
+    def dec(self, *labelvalues, amount: float = 1) -> None:
+        self.inc(*labelvalues, amount=-amount)
+
+
+class Histogram(_Sharded):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__()
+        self.name = name
+        self.doc = doc
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labelvalues) -> None:
+        shard = self._shard()
+        cell = shard.get(labelvalues)
+        if cell is None:
+            # un contador por bucket (sin acumular) + el de +Inf, suma, cantidad
+            cell = shard[labelvalues] = [0] * (len(self.buckets) + 3)
+        cell[bisect_left(self.buckets, value)] += 1
+        cell[-2] += value
+        cell[-1] += 1
+
+    def values(self) -> dict:
+        totals: dict = {}
+        for items in self._snapshot():
+            for key, cell in items:
+                acc = totals.get(key)
+                if acc is None:
+                    totals[key] = list(cell)
+                else:
+                    for i, v in enumerate(cell):
+                        acc[i] += v
+        return totals
+
+    def collect(self) -> list[str]:
+        lines = []
+        for key, cell in sorted(self.values().items()):
+            cumulative = 0
+            for le, n in zip(self.buckets + (float("inf"),), cell):
+                cumulative += n
+                le_label = 'le="%s"' % _fmt(le)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_fmt(cell[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cell[-1]}")
+        return lines
+
+
+class CallbackGauge:
+    # Valores leidos recien al hacer el scrape (p.ej. estado del pool)
+    kind = "gauge"
+
+    def __init__(self, name: str, doc: str, labelnames: tuple, fn):
+        self.name = name
+        self.doc = doc
+        self.labelnames = labelnames
+        self.fn = fn
+
+    def collect(self) -> list[str]:
+        return [f"{self.name}{_labels(self.labelnames, key)} {_fmt(v)}" for key, v in self.fn()]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        out = []
+        for m in self.metrics:
+            out.append(f"# HELP {m.name} {m.doc}")
+            out.append(f"# TYPE {m.name} {m.kind}")
+            out.extend(m.collect())
+        return "\n".join(out) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "Requests HTTP por ruta y status", ("method", "route", "status"),
+))
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Latencia de requests HTTP por ruta", ("method", "route"),
+))
+http_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "Requests HTTP en curso",
+))
+db_pool_checkout = registry.register(Histogram(
+    "db_pool_checkout_seconds", "Espera para obtener una conexion del pool", ("pool",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+))
+crud_duration = registry.register(Histogram(
+    "crud_duration_seconds", "Duracion de funciones de crud", ("function",),
+))
+
+
+def timed(fn):
+    # Tiempo de cada llamada en crud_duration_seconds{function=...}
+    name = fn.__name__
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            crud_duration.observe(time.perf_counter() - t0, name)
+
+    return wrapper
+
+
+class MetricsMiddleware:
+    # ASGI puro (sin BaseHTTPMiddleware): no agrega tareas ni copia el body.
+    # La ruta se etiqueta con el template (/products/{product_id}), no con la
+    # URL, para acotar la cardinalidad.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - t0
+            http_in_flight.dec()
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            http_requests.inc(scope["method"], path, str(status))
+            http_request_duration.observe(elapsed, scope["method"], path)
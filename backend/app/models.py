@@ -1,8 +1,28 @@
 from datetime import datetime
-from sqlalchemy import String, Integer, Numeric, DateTime, func, ForeignKey
+from datetime import date
+from sqlalchemy import DDL, BigInteger, String, Integer, Numeric, Date, DateTime, event, func, ForeignKey, Index, UniqueConstraint, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from .db import Base
-from sqlalchemy import Boolean
+from sqlalchemy import Boolean, SmallInteger, Text, cast
+
+
+def has_pg_trgm(bind) -> bool:
+    # pg_trgm viene en contrib (esta en la imagen oficial de postgres) pero
+    # no en toda instalacion; sin el, /products/search no hace busqueda
+    # aproximada
+    return bind.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+
+def _pg_trgm_available(ddl, target, bind, **kw) -> bool:
+    return bind.execute(text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")).first() is not None
+
+event.listen(
+    Base.metadata, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(callable_=_pg_trgm_available),
+)
+
+def current_xid():
+    # xid (64 bits, con epoca) de la transaccion actual, como bigint
+    return cast(cast(func.pg_current_xact_id(), Text), BigInteger)
 
 class Product(Base):
     __tablename__ = "products"
@@ -26,10 +46,47 @@ class Product(Base):
         server_default=func.current_timestamp(),
         onupdate=func.current_timestamp(),
     )
+    # xid de la ultima transaccion que lo escribio: feed de cambios de
+    # /products/low-stock (crud._change_watermark). NULL en las filas
+    # anteriores a la columna, que ningun poll necesita.
+    change_xid: Mapped[int | None] = mapped_column(
+        BigInteger,
+        server_default=text("(pg_current_xact_id()::text::bigint)"),
+        onupdate=current_xid(),
+    )
     
     owner_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False, index=True)
     owner: Mapped["User"] = relationship()
 
+    __table_args__ = (
+        Index("ix_products_owner_id_id", "owner_id", "id"),
+        Index("ix_products_owner_id_id_active", "owner_id", "id", postgresql_where=text("is_active")),
+        # /products/low-stock: solo las filas bajo el minimo, por urgencia
+        Index(
+            "ix_products_owner_id_low_stock",
+            "owner_id", text("(stock - stock_min)"), "id",
+            postgresql_where=text("is_active AND stock < stock_min"),
+        ),
+        # feed de cambios de /products/low-stock
+        Index("ix_products_owner_id_change_xid", "owner_id", "change_xid"),
+        # /products/search: prefijo de SKU y de nombre sin mayusculas. Con
+        # COLLATE "C" el btree sirve para LIKE 'abc%' y ya da el orden.
+        Index(
+            "ix_products_owner_id_sku_prefix",
+            "owner_id", text('lower(sku) COLLATE "C"'), postgresql_where=text("is_active"),
+        ),
+        Index(
+            "ix_products_owner_id_name_prefix",
+            "owner_id", text('lower(name) COLLATE "C"'), postgresql_where=text("is_active"),
+        ),
+        # /products/search: nombre aproximado (trigramas), solo con pg_trgm
+        Index(
+            "ix_products_name_trgm",
+            text("lower(name) gin_trgm_ops"), postgresql_using="gin", postgresql_where=text("is_active"),
+        ).ddl_if(callable_=lambda ddl, target, bind, **kw: has_pg_trgm(bind)),
+        UniqueConstraint("owner_id", "sku", name="uq_products_owner_id_sku"),
+    )
+
 class Sale(Base):
     __tablename__ = "sales"
 
@@ -37,15 +94,34 @@ class Sale(Base):
     total: Mapped[float] = mapped_column(Numeric(12, 2), nullable=False, default=0)
     payment_method: Mapped[str] = mapped_column(String(32), nullable=False, default="UNSPECIFIED")
 
+    # id generado por la caja para las ventas sincronizadas offline
+    client_id: Mapped[str | None] = mapped_column(String(64), nullable=True)
+
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now()
     )
 
     items: Mapped[list["SaleItem"]] = relationship(back_populates="sale", cascade="all, delete-orphan")
     
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False, index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     user: Mapped["User"] = relationship()
 
+    __table_args__ = (
+        Index("ix_sales_user_id_id", "user_id", "id"),
+        Index("ix_sales_user_id_created_at", "user_id", "created_at"),
+        Index("ix_sales_created_at_brin", "created_at", postgresql_using="brin"),
+        UniqueConstraint("user_id", "client_id", name="uq_sales_user_id_client_id"),
+    )
+
+class SaleClientId(Base):
+    __tablename__ = "sale_client_ids"
+
+    # client_id ya usado por una venta offline del usuario. Tabla aparte y
+    # sin particionar: con sales particionada su constraint unica incluye
+    # created_at y ya no alcanza para la idempotencia de /sales/batch.
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    client_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+
 class SaleItem(Base):
     __tablename__ = "sale_items"
 
@@ -56,6 +132,11 @@ class SaleItem(Base):
     qty: Mapped[int] = mapped_column(Integer, nullable=False)
     unit_price: Mapped[float] = mapped_column(Numeric(12, 2), nullable=False)
 
+    # copia de sales.created_at: clave de particion y rango de los reportes
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+
     sale: Mapped["Sale"] = relationship(back_populates="items")
     product: Mapped["Product"] = relationship()
     
@@ -64,7 +145,7 @@ class StockMovement(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
 
-    product_id: Mapped[int] = mapped_column(ForeignKey("products.id"), nullable=False, index=True)
+    product_id: Mapped[int] = mapped_column(ForeignKey("products.id"), nullable=False)
 
     change: Mapped[int] = mapped_column(Integer, nullable=False)
 
@@ -80,9 +161,52 @@ class StockMovement(Base):
 
     product: Mapped["Product"] = relationship()
     
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False, index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     user: Mapped["User"] = relationship()
 
+    __table_args__ = (
+        Index("ix_stock_movements_user_id_product_id_id", "user_id", "product_id", "id"),
+        Index("ix_stock_movements_created_at_brin", "created_at", postgresql_using="brin"),
+        # replay de movimientos de un producto entre dos instantes
+        Index("ix_stock_movements_product_id_created_at", "product_id", "created_at"),
+    )
+
+class StockSnapshot(Base):
+    __tablename__ = "stock_snapshots"
+
+    # Stock del producto en taken_at: incluye los movimientos con
+    # created_at < taken_at. Lo escribe crud.take_stock_snapshots.
+    product_id: Mapped[int] = mapped_column(ForeignKey("products.id"), primary_key=True)
+    taken_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+
+    stock: Mapped[int] = mapped_column(Integer, nullable=False)
+
+class SalesDailyRollup(Base):
+    __tablename__ = "sales_daily_rollup"
+
+    # Dia calculado en settings.REPORTS_TZ; si cambia hay que reconstruir.
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    payment_method: Mapped[str] = mapped_column(String(32), primary_key=True)
+    # Cada conexion suma sus ventas en su shard (crud.WRITE_SHARDS): las
+    # ventas concurrentes del dia no esperan por la misma fila. El total del
+    # dia es la suma de sus shards.
+    shard: Mapped[int] = mapped_column(SmallInteger, primary_key=True, default=0, server_default="0")
+
+    count_sales: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    total: Mapped[float] = mapped_column(Numeric(14, 2), nullable=False, default=0)
+
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+
+    # Version de los datos de un usuario, de donde salen los ETag de los
+    # endpoints de lectura: la suma de sus shards. Cada escritura de crud sube
+    # uno solo (el de su conexion), asi las escrituras concurrentes de un
+    # usuario no se encolan detras de una misma fila.
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    shard: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
 class User(Base):
     __tablename__ = "users"
 
@@ -0,0 +1,253 @@
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .config import get_settings
+from .db import Base
+
+# Particionado mensual (opt-in) de las tablas de solo insercion, por rango de
+# created_at. Los meses se cortan en settings.REPORTS_TZ, asi un mes
+# archivado coincide con un mes de los reportes.
+#
+# Con las tablas particionadas la PK y las constraints unicas incluyen
+# created_at, y sale_items referencia a sales por (sale_id, created_at). Los
+# modelos no cambian: `alembic check` va a mostrar esas diferencias.
+
+settings = get_settings()
+
+# sales primero: sale_items la referencia
+TABLES = ("sales", "sale_items", "stock_movements")
+
+SALE_ITEMS_SALE_FK = (
+    "ALTER TABLE sale_items ADD CONSTRAINT sale_items_sale_id_fkey "
+    "FOREIGN KEY (sale_id, created_at) REFERENCES sales (id, created_at)"
+)
+
+# Los BRIN y los indices sueltos por id no se recrean: la poda por mes
+# reemplaza al BRIN y la PK (id, created_at) cubre las busquedas por id.
+PARTITIONED_DDL = {
+    "sales": [
+        "ALTER TABLE sales ADD CONSTRAINT sales_pkey PRIMARY KEY (id, created_at)",
+        "ALTER TABLE sales ADD CONSTRAINT uq_sales_user_id_client_id UNIQUE (user_id, client_id, created_at)",
+        "ALTER TABLE sales ADD CONSTRAINT sales_user_id_fkey FOREIGN KEY (user_id) REFERENCES users (id)",
+        "CREATE INDEX ix_sales_user_id_id ON sales (user_id, id)",
+        "CREATE INDEX ix_sales_user_id_created_at ON sales (user_id, created_at)",
+    ],
+    "sale_items": [
+        "ALTER TABLE sale_items ADD CONSTRAINT sale_items_pkey PRIMARY KEY (id, created_at)",
+        SALE_ITEMS_SALE_FK,
+        "ALTER TABLE sale_items ADD CONSTRAINT sale_items_product_id_fkey FOREIGN KEY (product_id) REFERENCES products (id)",
+        "CREATE INDEX ix_sale_items_sale_id ON sale_items (sale_id)",
+        "CREATE INDEX ix_sale_items_product_id ON sale_items (product_id)",
+    ],
+    "stock_movements": [
+        "ALTER TABLE stock_movements ADD CONSTRAINT stock_movements_pkey PRIMARY KEY (id, created_at)",
+        "ALTER TABLE stock_movements ADD CONSTRAINT stock_movements_product_id_fkey "
+        "FOREIGN KEY (product_id) REFERENCES products (id)",
+        "ALTER TABLE stock_movements ADD CONSTRAINT stock_movements_user_id_fkey FOREIGN KEY (user_id) REFERENCES users (id)",
+        "CREATE INDEX ix_stock_movements_product_id_created_at ON stock_movements (product_id, created_at)",
+        "CREATE INDEX ix_stock_movements_user_id_product_id_id ON stock_movements (user_id, product_id, id)",
+    ],
+}
+
+
+def _month(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+def _add_months(month: date, n: int) -> date:
+    y, m = divmod(month.month - 1 + n, 12)
+    return date(month.year + y, m + 1, 1)
+
+def _bound(month: date) -> str:
+    return datetime(month.year, month.month, 1, tzinfo=ZoneInfo(settings.REPORTS_TZ)).isoformat()
+
+def _today() -> date:
+    return datetime.now(ZoneInfo(settings.REPORTS_TZ)).date()
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+def is_partitioned(db, table: str = "sales") -> bool:
+    return db.execute(
+        text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:t))"),
+        {"t": table},
+    ).scalar()
+
+def list_partitions(db, table: str) -> list[date]:
+    # meses con particion propia (sin contar la default)
+    names = db.execute(
+        text(
+            """
+            SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(:t)
+            """
+        ),
+        {"t": table},
+    ).scalars()
+    prefix = f"{table}_p"
+    return sorted(
+        date(int(n[-6:-2]), int(n[-2:]), 1)
+        for n in names
+        if n.startswith(prefix) and len(n) == len(prefix) + 6 and n[-6:].isdigit()
+    )
+
+def _stranded(db, table: str, month: date) -> bool:
+    # filas de ese mes que cayeron en la default por no tener particion
+    return db.execute(
+        text(f"SELECT EXISTS (SELECT 1 FROM {table}_default WHERE created_at >= :s AND created_at < :e)"),
+        {"s": _bound(month), "e": _bound(_add_months(month, 1))},
+    ).scalar()
+
+def _create_partition(db, table: str, month: date) -> bool:
+    name = partition_name(table, month)
+    if db.execute(text("SELECT to_regclass(:n) IS NOT NULL"), {"n": name}).scalar():
+        return False
+    start, end = _bound(month), _bound(_add_months(month, 1))
+    bounds = f"FOR VALUES FROM ('{start}') TO ('{end}')"
+    if not _stranded(db, table, month):
+        db.execute(text(f"CREATE TABLE {name} PARTITION OF {table} {bounds}"))
+        return True
+    # Con filas de ese mes en la default no se puede crear la particion: se
+    # arma aparte, se mudan las filas y se engancha. ATTACH crea los indices
+    # y las FK del padre.
+    db.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)"))
+    db.execute(
+        text(
+            f"""
+            WITH moved AS (
+                DELETE FROM {table}_default WHERE created_at >= :s AND created_at < :e RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+            """
+        ),
+        {"s": start, "e": end},
+    )
+    db.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {name} {bounds}"))
+    return True
+
+def _months_to_ensure(db, table: str, current: date, months_ahead: int) -> list[date]:
+    # el mes actual y los siguientes, mas los meses pasados que tienen filas
+    # en la default (un mes con particion no puede tenerlas)
+    past = db.execute(
+        text(
+            f"""
+            SELECT DISTINCT date_trunc('month', timezone(:tz, created_at))::date FROM {table}_default
+            WHERE created_at < :current
+            """
+        ),
+        {"tz": settings.REPORTS_TZ, "current": _bound(current)},
+    ).scalars().all()
+    return sorted(past) + [_add_months(current, n) for n in range(months_ahead + 1)]
+
+def ensure_partitions(db, months_ahead: int = 3, today: date | None = None) -> list[str]:
+    # Particiones del mes actual y los months_ahead siguientes. Idempotente;
+    # el lock serializa a varios procesos que arrancan a la vez. Corre al
+    # arrancar la app y con `partitions-ensure`, que hay que programar (cron
+    # mensual) si la app puede quedar arriba mas de PARTITIONS_MONTHS_AHEAD
+    # meses. Si no se corrio a tiempo, las filas que cayeron en la default
+    # (tambien de meses ya pasados) se mudan a su particion.
+    db.execute(text("SELECT pg_advisory_xact_lock(hashtext('ensure_partitions'))"))
+    current = _month(today or _today())
+    tables = [t for t in TABLES if is_partitioned(db, t)]
+    months = {t: _months_to_ensure(db, t, current, months_ahead) for t in tables}
+
+    # mudar ventas rompe la FK de sale_items mientras dura: se suelta y se
+    # vuelve a crear al final (valida toda la tabla; solo en este caso)
+    relink = "sales" in months and any(_stranded(db, "sales", m) for m in months["sales"])
+    if relink:
+        db.execute(text("ALTER TABLE sale_items DROP CONSTRAINT sale_items_sale_id_fkey"))
+
+    created = []
+    for table in tables:
+        for month in months[table]:
+            if _create_partition(db, table, month):
+                created.append(partition_name(table, month))
+
+    if relink:
+        db.execute(text(SALE_ITEMS_SALE_FK))
+    return created
+
+def enable_partitioning(db, months_ahead: int = 3, today: date | None = None) -> None:
+    # Convierte las tablas en particionadas copiando los datos. Toma locks
+    # exclusivos y tarda lo que la copia: correr en una ventana de mantenimiento.
+    current = _month(today or _today())
+    zone = ZoneInfo(settings.REPORTS_TZ)
+
+    db.execute(text("ALTER TABLE sale_items DROP CONSTRAINT IF EXISTS sale_items_sale_id_fkey"))
+    for table in TABLES:
+        old = f"{table}_unpartitioned"
+        db.execute(text(f"ALTER TABLE {table} RENAME TO {old}"))
+        db.execute(text(f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)"))
+        db.execute(text(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id"))
+        db.execute(text(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT"))
+
+        oldest = db.execute(text(f"SELECT min(created_at) FROM {old}")).scalar()
+        month = min(_month(oldest.astimezone(zone).date()), current) if oldest else current
+        while month <= _add_months(current, months_ahead):
+            _create_partition(db, table, month)
+            month = _add_months(month, 1)
+
+        db.execute(text(f"INSERT INTO {table} SELECT * FROM {old}"))
+        db.execute(text(f"DROP TABLE {old}"))
+        # indices despues de la copia: se construyen una vez por particion
+        for ddl in PARTITIONED_DDL[table]:
+            db.execute(text(ddl))
+
+def _drop_constraints(db, table: str, kinds: tuple[str, ...]) -> None:
+    for name in db.execute(
+        text("SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:t) AND contype = ANY(:k)"),
+        {"t": table, "k": list(kinds)},
+    ).scalars().all():
+        db.execute(text(f"ALTER TABLE {table} DROP CONSTRAINT {name}"))
+
+def _drop_keys_and_indexes(db, table: str) -> None:
+    _drop_constraints(db, table, ("p", "u", "f"))
+    for name in db.execute(
+        text("SELECT indexname FROM pg_indexes WHERE tablename = :t"), {"t": table}
+    ).scalars().all():
+        db.execute(text(f"DROP INDEX {name}"))
+
+def disable_partitioning(db) -> None:
+    # Vuelve a tablas comunes con el esquema de los modelos. Las particiones
+    # ya archivadas no se tocan.
+    conn = db.connection() if isinstance(db, Session) else db
+    db.execute(text("ALTER TABLE sale_items DROP CONSTRAINT IF EXISTS sale_items_sale_id_fkey"))
+    for table in TABLES:
+        old = f"{table}_partitioned"
+        db.execute(text(f"ALTER TABLE {table} RENAME TO {old}"))
+        db.execute(text(f"ALTER SEQUENCE {table}_id_seq RENAME TO {table}_id_seq_partitioned"))
+        _drop_keys_and_indexes(db, old)
+
+        model_table = Base.metadata.tables[table]
+        model_table.create(conn)
+        cols = ", ".join(c.name for c in model_table.columns)
+        db.execute(text(f"INSERT INTO {table} ({cols}) SELECT {cols} FROM {old}"))
+        db.execute(text(
+            f"SELECT setval('{table}_id_seq', last_value, is_called) FROM {table}_id_seq_partitioned"
+        ))
+        db.execute(text(f"DROP TABLE {old}"))
+
+def archive_partitions(db, before: date, schema: str = "archive") -> list[str]:
+    # Desengancha las particiones de meses terminados antes de `before` y las
+    # mueve a otro esquema: dos cambios de catalogo por particion, sin DELETE.
+    # Despues se pueden volcar con pg_dump y borrar. Los reportes de esos
+    # dias siguen saliendo de sales_daily_rollup.
+    db.execute(text(f"CREATE SCHEMA IF NOT EXISTS {schema}"))
+    limit = _month(before)
+    moved = []
+    # sale_items antes que sales: la FK impide soltar ventas referenciadas
+    for table in ("sale_items", "stock_movements", "sales"):
+        for month in list_partitions(db, table):
+            if _add_months(month, 1) > limit:
+                continue
+            name = partition_name(table, month)
+            db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+            # la particion suelta conserva las FK y el default de id (la
+            # secuencia) del padre; archivada no necesita ninguno
+            _drop_constraints(db, name, ("f",))
+            db.execute(text(f"ALTER TABLE {name} ALTER COLUMN id DROP DEFAULT"))
+            db.execute(text(f"ALTER TABLE {name} SET SCHEMA {schema}"))
+            moved.append(f"{schema}.{name}")
+    return moved
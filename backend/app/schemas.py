@@ -1,9 +1,17 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional
+from typing import Generic, Optional, TypeVar
 from typing import Literal
 from datetime import datetime
 
 StockReason = Literal["SALE", "RESTOCK", "ADJUSTMENT"]
+ReportGranularity = Literal["hour", "day", "week", "month"]
+ProductRanking = Literal["revenue", "units"]
+
+T = TypeVar("T")
+
+class Page(BaseModel, Generic[T]):
+    items: list[T]
+    next_cursor: Optional[int] = None
 
 class ProductCreate(BaseModel):
     name: str = Field(min_length=1, max_length=200)
@@ -22,6 +30,15 @@ class ProductUpdate(BaseModel):
     stock_min: Optional[int] = Field(default=None, ge=0)
     is_active: Optional[bool] = None
 
+class ProductImportError(BaseModel):
+    row: int
+    error: str
+
+class ProductImportOut(BaseModel):
+    inserted: int
+    updated: int
+    errors: list[ProductImportError]
+
 class ProductOut(BaseModel):
     id: int
     name: str
@@ -36,6 +53,35 @@ class ProductOut(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+class LowStockItem(BaseModel):
+    id: int
+    name: str
+    sku: Optional[str]
+    stock: int
+    stock_min: int
+    deficit: int
+    # en el feed de cambios: False si el producto salio de stock bajo
+    low: bool
+
+class LowStockPage(BaseModel):
+    items: list[LowStockItem]
+    next_cursor: Optional[str] = None
+    total: int
+    # pasar como ?since= en el proximo poll (un xid, no una fecha)
+    since: int
+    # el feed tenia demasiados cambios: volver a pedir la lista
+    resync: bool = False
+
+class ProductSearchHit(BaseModel):
+    id: int
+    name: str
+    sku: Optional[str]
+    price: float
+    stock: int
+    stock_min: int
+    # por que coincidio, en orden de relevancia
+    match: Literal["sku", "sku_prefix", "name_prefix", "name"]
+
 class SaleItemCreate(BaseModel):
     product_id: int
     qty: int = Field(gt=0)
@@ -44,6 +90,22 @@ class SaleCreate(BaseModel):
     payment_method: str = Field(default="UNSPECIFIED", max_length=32)
     items: list[SaleItemCreate]
 
+class SaleBatchItem(SaleCreate):
+    client_id: str = Field(min_length=1, max_length=64)
+    created_at: Optional[datetime] = None
+
+class SaleBatchCreate(BaseModel):
+    sales: list[SaleBatchItem] = Field(max_length=500)
+
+class SaleBatchResult(BaseModel):
+    client_id: str
+    status: Literal["created", "duplicate", "error"]
+    sale_id: Optional[int] = None
+    error: Optional[str] = None
+
+class SaleBatchOut(BaseModel):
+    results: list[SaleBatchResult]
+
 class SaleItemOut(BaseModel):
     product_id: int
     qty: int
@@ -0,0 +1,148 @@
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+
+from app.config import get_settings
+
+# Profiler de SQL por request (opt-in con SQL_PROFILER_ENABLED). Los listeners
+# van sobre la clase Engine, asi cubren el engine sync, el async (su
+# sync_engine) y los de los tests. Fuera de un request muestreado el costo es
+# un ContextVar.get() por sentencia.
+
+logger = logging.getLogger("app.sql_profiler")
+settings = get_settings()
+
+
+class RequestProfile:
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.count = 0
+        self.db_time = 0.0
+        # sentencias iguales (el SQL ya viene con placeholders, no con valores)
+        self.shapes: Counter = Counter()
+        self.explaining = False
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        return [(s, n) for s, n in self.shapes.most_common() if n >= threshold]
+
+    def server_timing(self, threshold: int) -> str:
+        parts = [f'db;dur={self.db_time * 1000:.2f};desc="{self.count} queries"']
+        repeated = self.repeated(threshold)
+        if repeated:
+            parts.append(f'db-repeated;desc="{len(repeated)} shapes, max {repeated[0][1]}x"')
+        return ", ".join(parts)
+
+
+_current: ContextVar[RequestProfile | None] = ContextVar("sql_profile", default=None)
+
+
+@contextmanager
+def profile(label: str = ""):
+    p = RequestProfile(label)
+    token = _current.set(p)
+    try:
+        yield p
+    finally:
+        _current.reset(token)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    p = _current.get()
+    if p is None or p.explaining:
+        return
+    conn.info.setdefault("sql_profiler_t0", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    p = _current.get()
+    if p is None or p.explaining:
+        return
+    stack = conn.info.get("sql_profiler_t0")
+    if not stack:
+        return
+    elapsed = time.perf_counter() - stack.pop()
+
+    p.count += 1
+    p.db_time += elapsed
+    if not executemany:
+        p.shapes[statement] += 1
+
+    if elapsed * 1000 >= settings.SQL_PROFILER_SLOW_MS:
+        plan = None
+        if settings.SQL_PROFILER_EXPLAIN and not executemany:
+            plan = _explain(conn, p, statement, parameters)
+        logger.warning(
+            "SQL lenta %.1f ms [%s]: %s | params=%s%s",
+            elapsed * 1000, p.label, statement, _params_for_log(parameters, executemany),
+            f"\n{plan}" if plan else "",
+        )
+
+
+def _params_for_log(parameters, executemany: bool) -> str:
+    # Por defecto solo los nombres de los parametros: los valores pueden ser
+    # datos personales o secretos (SQL_PROFILER_LOG_PARAMS=1 para verlos)
+    if settings.SQL_PROFILER_LOG_PARAMS:
+        return repr(parameters)
+    rows = len(parameters) if executemany else None
+    if executemany:
+        parameters = parameters[0] if parameters else {}
+    if isinstance(parameters, dict):
+        shown = "[" + ", ".join(sorted(parameters)) + "]"
+    else:
+        shown = f"<{len(parameters or ())} posicionales>"
+    return f"{shown} x{rows}" if rows is not None else shown
+
+
+def _explain(conn, p: RequestProfile, statement: str, parameters) -> str | None:
+    # EXPLAIN ANALYZE vuelve a ejecutar la sentencia: solo para SELECT, y en
+    # un savepoint para que un error no aborte la transaccion del request
+    if not statement.lstrip().upper().startswith("SELECT"):
+        return None
+    p.explaining = True
+    try:
+        with conn.begin_nested():
+            rows = conn.exec_driver_sql("EXPLAIN (ANALYZE, BUFFERS) " + statement, parameters).all()
+        return "\n".join(r[0] for r in rows)
+    except Exception:
+        logger.exception("no se pudo obtener el plan de una sentencia lenta")
+        return None
+    finally:
+        p.explaining = False
+
+
+class SqlProfilerMiddleware:
+    # Cuenta sentencias y tiempo de base de los requests muestreados
+    # (SQL_PROFILER_SAMPLE_RATE) y los devuelve en Server-Timing. Las filas
+    # que un StreamingResponse lee despues de enviar los headers no entran.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not settings.SQL_PROFILER_ENABLED
+            or random.random() >= settings.SQL_PROFILER_SAMPLE_RATE
+        ):
+            return await self.app(scope, receive, send)
+
+        threshold = settings.SQL_PROFILER_REPEAT_THRESHOLD
+        with profile(f"{scope['method']} {scope['path']}") as p:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    MutableHeaders(scope=message).append("Server-Timing", p.server_timing(threshold))
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                for statement, n in p.repeated(threshold):
+                    logger.warning("Sentencia repetida %dx en [%s] (posible N+1): %s", n, p.label, statement)
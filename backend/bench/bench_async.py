@@ -0,0 +1,125 @@
+"""Compara el modo sync (Session + threadpool) contra DB_ASYNC (AsyncSession).
+
+Levanta uvicorn una vez por modo contra la misma base y le tira carga
+concurrente a GET /products y POST /sales.
+
+Uso (desde backend/, con DATABASE_URL apuntando a una base descartable con
+las tablas ya creadas):
+
+    python -m bench.bench_async --concurrency 10 50 200 --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+
+
+async def _wait_ready(base_url: str, timeout: float = 20) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as c:
+        while time.monotonic() < deadline:
+            try:
+                if (await c.get("/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("uvicorn no respondio a /health")
+
+
+async def _setup(c: httpx.AsyncClient) -> list[int]:
+    email = f"bench-{uuid.uuid4().hex}@bench.local"
+    await c.post("/auth/register", json={"email": email, "password": "123456"})
+    r = await c.post("/auth/login", data={"username": email, "password": "123456"})
+    c.headers["Authorization"] = f"Bearer {r.json()['access_token']}"
+
+    ids = []
+    for i in range(20):
+        r = await c.post("/products", json={"name": f"Bench {i}", "price": 10, "stock": 10_000_000})
+        ids.append(r.json()["id"])
+    return ids
+
+
+async def _load(c: httpx.AsyncClient, ids: list[int], concurrency: int, total: int) -> dict:
+    timings: list[float] = []
+    errors = 0
+    queue = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for n in queue:
+            t0 = time.perf_counter()
+            try:
+                if n % 2:
+                    r = await c.get("/products", params={"limit": 50})
+                else:
+                    items = [{"product_id": ids[(n + k) % len(ids)], "qty": 1} for k in range(3)]
+                    r = await c.post("/sales", json={"items": items, "payment_method": "cash"})
+                ok = r.status_code == 200
+            except httpx.TimeoutException:
+                ok = False
+            timings.append((time.perf_counter() - t0) * 1000)
+            if not ok:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+
+    timings.sort()
+    return {
+        "concurrency": concurrency,
+        "req_s": round(total / elapsed, 1),
+        "p50_ms": round(statistics.median(timings), 2),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 2),
+        "errors": errors,
+    }
+
+
+async def _run_mode(base_url: str, concurrencies: list[int], total: int) -> list[dict]:
+    await _wait_ready(base_url)
+    limits = httpx.Limits(max_connections=max(concurrencies))
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as c:
+        ids = await _setup(c)
+        await _load(c, ids, 10, 200)  # calentamiento
+        return [await _load(c, ids, n, total) for n in concurrencies]
+
+
+def run(mode: str, concurrencies: list[int], total: int, port: int) -> list[dict]:
+    env = {**os.environ, "DB_ASYNC": "1" if mode == "async" else "0"}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        return asyncio.run(_run_mode(f"http://127.0.0.1:{port}", concurrencies, total))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--modes", nargs="+", choices=["sync", "async"], default=["sync", "async"])
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    print(f"{'modo':>6} {'conc':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'errores':>8}")
+    for mode in args.modes:
+        for r in run(mode, args.concurrency, args.requests, args.port):
+            print(
+                f"{mode:>6} {r['concurrency']:>6} {r['req_s']:>9} "
+                f"{r['p50_ms']:>9} {r['p95_ms']:>9} {r['errors']:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Latencia de crud.create_sale segun el tamaño del carrito.
+
+Uso (desde backend/, con DATABASE_URL apuntando a una base descartable):
+
+    python -m bench.bench_create_sale --sizes 1 5 10 20 40 80 --repeat 30
+
+Todo corre dentro de una transaccion que se descarta al final.
+"""
+import argparse
+import statistics
+import time
+import uuid
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import crud
+from app.db import engine
+from app.models import Product, User
+from app.schemas import SaleCreate, SaleItemCreate
+
+
+def run(sizes: list[int], repeat: int) -> list[dict]:
+    results = []
+    connection = engine.connect()
+    transaction = connection.begin()
+    db = Session(bind=connection, join_transaction_mode="create_savepoint")
+
+    statements = 0
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        nonlocal statements
+        statements += 1
+
+    try:
+        user = User(email=f"bench-{uuid.uuid4().hex}@bench.local", password_hash="x")
+        db.add(user)
+        db.flush()
+
+        products = [
+            Product(owner_id=user.id, name=f"Bench {i}", sku=f"B{i}", price=10, stock=10_000_000)
+            for i in range(max(sizes))
+        ]
+        db.add_all(products)
+        db.commit()
+
+        event.listen(connection, "before_cursor_execute", on_execute)
+        for size in sizes:
+            payload = SaleCreate(
+                payment_method="CASH",
+                items=[SaleItemCreate(product_id=p.id, qty=1) for p in products[:size]],
+            )
+            crud.create_sale(db, user.id, payload)  # calentamiento
+
+            timings = []
+            statements = 0
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                crud.create_sale(db, user.id, payload)
+                timings.append((time.perf_counter() - t0) * 1000)
+
+            results.append({
+                "basket_size": size,
+                "p50_ms": round(statistics.median(timings), 3),
+                "p95_ms": round(sorted(timings)[int(len(timings) * 0.95) - 1], 3),
+                "statements_per_sale": statements / repeat,
+            })
+        event.remove(connection, "before_cursor_execute", on_execute)
+    finally:
+        db.close()
+        transaction.rollback()
+        connection.close()
+
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 5, 10, 20, 40, 80])
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    print(f"{'carrito':>8} {'p50 ms':>10} {'p95 ms':>10} {'sentencias':>11}")
+    for r in run(args.sizes, args.repeat):
+        print(f"{r['basket_size']:>8} {r['p50_ms']:>10} {r['p95_ms']:>10} {r['statements_per_sale']:>11}")
+
+
+if __name__ == "__main__":
+    main()
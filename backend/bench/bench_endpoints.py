@@ -0,0 +1,283 @@
+"""Latencia de cada endpoint de app.main segun el volumen de datos.
+
+Para cada escala (cantidad de ventas) vacia la base, la carga con
+bench.datagen y mide todos los endpoints con el tenant mas grande, dentro del
+proceso (TestClient). Los resultados van a un JSON que se puede comparar con
+el de otra corrida.
+
+Uso (desde backend/, con DATABASE_URL apuntando a una base descartable con
+las tablas ya creadas; se vacia en cada escala):
+
+    python -m bench.bench_endpoints run --scales 10000 100000 1000000 --out base.json
+    python -m bench.bench_endpoints compare base.json nuevo.json --threshold 0.2
+
+compare sale con codigo 1 si algun endpoint empeoro mas que --threshold
+(relativo) y mas que --min-ms (absoluto, para no fallar por ruido en
+endpoints de menos de un milisegundo).
+"""
+import argparse
+import io
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app.db import SessionLocal
+from app.main import app
+from bench.datagen import BENCH_PASSWORD, generate
+
+# los que pasan por bcrypt miden el costo del hash, no el de los datos
+SLOW = {"POST /auth/login", "POST /auth/register"}
+SLOW_REPEAT = 5
+
+
+def _month_before(day: date) -> tuple[str, str]:
+    return str(day - timedelta(days=30)), str(day)
+
+def _new_product(ctx: dict) -> int:
+    r = ctx["client"].post("/products", json={"name": "Bench tmp", "price": 10, "stock": 100}, headers=ctx["auth"])
+    return r.json()["id"]
+
+
+# "METODO /ruta" -> fn(ctx) que prepara la request (sin medir) y devuelve
+# los kwargs de client.request. ctx: client, auth, product_id, products, from, to
+CASES = {
+    "GET /health": lambda ctx: {},
+    "GET /health/user-cache": lambda ctx: {},
+    "GET /health/password-pool": lambda ctx: {},
+    "GET /metrics": lambda ctx: {},
+    "POST /auth/register": lambda ctx: {
+        "json": {"email": f"bench-{uuid.uuid4().hex}@bench.local", "password": BENCH_PASSWORD},
+    },
+    "POST /auth/login": lambda ctx: {
+        "data": {"username": ctx["email"], "password": BENCH_PASSWORD},
+    },
+    "GET /auth/me": lambda ctx: {},
+    "POST /products": lambda ctx: {
+        "json": {"name": "Bench nuevo", "price": 10, "stock": 5},
+    },
+    "POST /products/import": lambda ctx: {
+        "files": {"file": ("bench.csv", io.BytesIO(
+            b"name,price,stock\n" + b"".join(b"Importado %d,10,5\n" % n for n in range(100))
+        ), "text/csv")},
+    },
+    "GET /products": lambda ctx: {"params": {"limit": 50}},
+    "GET /products/low-stock": lambda ctx: {"params": {"limit": 50}},
+    "GET /products/search": lambda ctx: {"params": {"q": "producto 1"}},
+    "GET /products/stock-as-of": lambda ctx: {"params": {"date": ctx["from"]}},
+    "GET /products/{product_id}": lambda ctx: {"path": {"product_id": ctx["product_id"]}},
+    "PATCH /products/{product_id}": lambda ctx: {
+        "path": {"product_id": ctx["product_id"]}, "json": {"price": 1234.5},
+    },
+    "DELETE /products/{product_id}": lambda ctx: {"path": {"product_id": _new_product(ctx)}},
+    "POST /products/{product_id}/stock": lambda ctx: {
+        "path": {"product_id": ctx["product_id"]}, "json": {"change": 1, "reason": "RESTOCK"},
+    },
+    "GET /products/{product_id}/stock-movements": lambda ctx: {
+        "path": {"product_id": ctx["product_id"]}, "params": {"limit": 50},
+    },
+    "POST /sales": lambda ctx: {
+        "json": {"payment_method": "CASH", "items": [{"product_id": p, "qty": 1} for p in ctx["products"][:3]]},
+    },
+    "POST /sales/batch": lambda ctx: {
+        "json": {"sales": [
+            {
+                "client_id": uuid.uuid4().hex,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "payment_method": "CASH",
+                "items": [{"product_id": p, "qty": 1} for p in ctx["products"][:3]],
+            }
+            for _ in range(10)
+        ]},
+    },
+    "GET /sales": lambda ctx: {"params": {"limit": 50}},
+    "GET /reports/sales": lambda ctx: {"params": {"from": ctx["from"], "to": ctx["to"]}},
+    "GET /reports/sales/summary": lambda ctx: {"params": {"from": ctx["from"], "to": ctx["to"]}},
+    "GET /reports/sales/daily": lambda ctx: {"params": {"from": ctx["from"], "to": ctx["to"]}},
+    "GET /reports/products": lambda ctx: {"params": {"from": ctx["from"], "to": ctx["to"], "limit": 20}},
+    "GET /reports/sales/daily/export.csv": lambda ctx: {"params": {"from": ctx["from"], "to": ctx["to"]}},
+    # el CSV lista cada item: un mes alcanza
+    "GET /reports/sales/export.csv": lambda ctx: {
+        "params": dict(zip(("from", "to"), _month_before(date.fromisoformat(ctx["to"])))),
+    },
+}
+
+
+def _routes() -> set[str]:
+    return {
+        f"{method} {route.path}"
+        for route in app.routes
+        if isinstance(route, APIRoute)
+        for method in route.methods
+    }
+
+def _percentile(timings: list[float], p: float) -> float:
+    timings = sorted(timings)
+    return timings[max(0, int(round(len(timings) * p)) - 1)]
+
+def _measure(ctx: dict, key: str, repeat: int) -> dict:
+    method, path = key.split(" ", 1)
+    timings = []
+    for n in range(repeat + 1):
+        kwargs = CASES[key](ctx)
+        url = path.format(**kwargs.pop("path", {}))
+        t0 = time.perf_counter()
+        r = ctx["client"].request(method, url, headers=ctx["auth"], **kwargs)
+        elapsed = (time.perf_counter() - t0) * 1000
+        if r.status_code >= 400:
+            raise RuntimeError(f"{key}: {r.status_code} {r.text[:200]}")
+        if n:  # la primera es de calentamiento
+            timings.append(elapsed)
+
+    return {
+        "n": len(timings),
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(_percentile(timings, 0.95), 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "min_ms": round(min(timings), 3),
+    }
+
+def run_scale(sales: int, users: int, products: int, repeat: int, seed: int) -> dict:
+    t0 = time.perf_counter()
+    with SessionLocal() as db:
+        data = generate(db, users, products, sales, seed=seed, reset=True)
+        product_ids = db.execute(
+            text("SELECT id FROM products WHERE owner_id = :u AND is_active ORDER BY id LIMIT 3"),
+            {"u": data["tenant_id"]},
+        ).scalars().all()
+    load_s = time.perf_counter() - t0
+
+    endpoints = {}
+    with TestClient(app) as client:
+        r = client.post("/auth/login", data={"username": data["tenant_email"], "password": BENCH_PASSWORD})
+        ctx = {
+            "client": client,
+            "auth": {"Authorization": f"Bearer {r.json()['access_token']}"},
+            "email": data["tenant_email"],
+            "product_id": product_ids[0],
+            "products": product_ids,
+            "from": data["from"],
+            "to": data["to"],
+        }
+        for key in sorted(CASES):
+            endpoints[key] = _measure(ctx, key, SLOW_REPEAT if key in SLOW else repeat)
+            print(f"{sales:>10} {key:<45} {endpoints[key]['p50_ms']:>10} {endpoints[key]['p95_ms']:>10}")
+
+    rows = {k: data[k] for k in ("users", "products", "sales", "sale_items", "stock_movements")}
+    return {"sales": sales, "rows": rows, "load_s": round(load_s, 1), "endpoints": endpoints}
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(args) -> int:
+    missing = _routes() - set(CASES)
+    if missing:
+        print(f"endpoints sin caso en bench_endpoints.CASES: {', '.join(sorted(missing))}")
+        return 1
+
+    with SessionLocal() as db:
+        server = db.execute(text("SHOW server_version")).scalar()
+
+    result = {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "postgres": server,
+            "users": args.users,
+            "products": args.products,
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "scales": [],
+    }
+    print(f"{'ventas':>10} {'endpoint':<45} {'p50 ms':>10} {'p95 ms':>10}")
+    for sales in args.scales:
+        result["scales"].append(run_scale(sales, args.users, args.products, args.repeat, args.seed))
+        # se escribe despues de cada escala: una corrida cortada no pierde todo
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+    print(f"resultados en {args.out}")
+    return 0
+
+
+def compare_results(old: dict, new: dict, metric: str, threshold: float, min_ms: float) -> list[dict]:
+    # Una fila por (escala, endpoint) presente en las dos corridas
+    old_scales = {s["sales"]: s["endpoints"] for s in old["scales"]}
+    rows = []
+    for scale in new["scales"]:
+        before = old_scales.get(scale["sales"], {})
+        for key, stats in sorted(scale["endpoints"].items()):
+            if key not in before:
+                continue
+            a, b = before[key][metric], stats[metric]
+            rows.append({
+                "sales": scale["sales"],
+                "endpoint": key,
+                "old": a,
+                "new": b,
+                "ratio": round(b / a, 3) if a else None,
+                "regression": b > a * (1 + threshold) and b - a > min_ms,
+            })
+    return rows
+
+def compare(args) -> int:
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    rows = compare_results(old, new, args.metric, args.threshold, args.min_ms)
+    print(f"{'ventas':>10} {'endpoint':<45} {'antes':>10} {'ahora':>10} {'ratio':>7}")
+    for r in rows:
+        mark = "  <-- regresion" if r["regression"] else ""
+        print(f"{r['sales']:>10} {r['endpoint']:<45} {r['old']:>10} {r['new']:>10} {r['ratio']!s:>7}{mark}")
+
+    regressions = sum(r["regression"] for r in rows)
+    if regressions:
+        print(f"{regressions} endpoints empeoraron mas de {args.threshold:.0%} en {args.metric}")
+        return 1
+    print(f"sin regresiones en {args.metric} (umbral {args.threshold:.0%}, {args.min_ms} ms)")
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench.bench_endpoints")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="carga cada escala y mide todos los endpoints")
+    p.add_argument("--scales", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="cantidad de ventas")
+    p.add_argument("--users", type=int, default=20)
+    p.add_argument("--products", type=int, default=200, help="productos por usuario")
+    p.add_argument("--repeat", type=int, default=30)
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--out", default=f"bench-endpoints-{date.today()}.json")
+    p.set_defaults(func=run)
+
+    p = sub.add_parser("compare", help="compara dos corridas; sale con 1 si hay regresiones")
+    p.add_argument("old")
+    p.add_argument("new")
+    p.add_argument("--metric", default="p50_ms", choices=["p50_ms", "p95_ms", "mean_ms", "min_ms"])
+    p.add_argument("--threshold", type=float, default=0.2, help="empeoramiento relativo tolerado")
+    p.add_argument("--min-ms", type=float, default=1.0, help="diferencia absoluta minima para contar")
+    p.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""Filas por segundo de los listados: camino ORM + Pydantic contra Core + orjson.
+
+Para cada listado (productos, ventas, movimientos de un producto) y cada
+tamaño de pagina mide, desde la consulta hasta los bytes de la respuesta:
+
+- orm: crud.list_* (instancias del ORM), model_validate con from_attributes
+  y lo que hace FastAPI con response_model (validar, serializar a tipos
+  JSON y json.dumps);
+- core: crud.list_*_rows (tuplas de Core como dicts) y orjson, como
+  responden ahora los endpoints.
+
+Uso (desde backend/, con DATABASE_URL apuntando a una base cargada con
+bench.datagen; usa el primer usuario, el mas grande):
+
+    python -m bench.bench_list_rows --limits 50 500 5000 --repeat 10
+"""
+import argparse
+import json
+import statistics
+import time
+
+from pydantic import TypeAdapter
+from sqlalchemy import func, select
+
+from app import crud, schemas
+from app.db import SessionLocal
+from app.main import RowsJSONResponse
+from app.models import StockMovement, User
+
+
+def _orm_path(fn, out):
+    adapter = TypeAdapter(list[out])
+
+    def run(db, *args, **kwargs):
+        rows = [out.model_validate(r) for r in fn(db, *args, **kwargs)]
+        content = adapter.dump_python(adapter.validate_python(rows), mode="json")
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode(), len(rows)
+
+    return run
+
+
+def _core_path(fn):
+    def run(db, *args, **kwargs):
+        rows = fn(db, *args, **kwargs)
+        return RowsJSONResponse(rows).body, len(rows)
+
+    return run
+
+
+def _listings(db, user_id: int) -> dict:
+    product_id = db.execute(
+        select(StockMovement.product_id)
+        .where(StockMovement.user_id == user_id)
+        .group_by(StockMovement.product_id)
+        .order_by(func.count().desc())
+        .limit(1)
+    ).scalar()
+    return {
+        "products": ((user_id,), crud.list_products, crud.list_products_rows, schemas.ProductOut),
+        "sales": ((user_id,), crud.list_sales, crud.list_sales_rows, schemas.SaleOut),
+        "movements": (
+            (user_id, product_id), crud.list_stock_movements, crud.list_stock_movements_rows, schemas.StockMovementOut,
+        ),
+    }
+
+
+def run(limits: list[int], repeat: int) -> list[dict]:
+    results = []
+    with SessionLocal() as db:
+        user_id = db.execute(select(func.min(User.id))).scalar()
+        for name, (args, orm_fn, core_fn, out) in _listings(db, user_id).items():
+            paths = {"orm": _orm_path(orm_fn, out), "core": _core_path(core_fn)}
+            for limit in limits:
+                r = {"listing": name, "limit": limit}
+                for label, path in paths.items():
+                    path(db, *args, limit=limit)  # calentamiento
+                    timings = []
+                    for _ in range(repeat):
+                        t0 = time.perf_counter()
+                        _, n = path(db, *args, limit=limit)
+                        timings.append(time.perf_counter() - t0)
+                        # sin identity map acumulado entre corridas
+                        db.expunge_all()
+                    p50 = statistics.median(timings)
+                    r["rows"] = n
+                    r[f"{label}_ms"] = round(p50 * 1000, 2)
+                    r[f"{label}_rows_s"] = round(n / p50) if n else 0
+                r["speedup"] = round(r["orm_ms"] / r["core_ms"], 2)
+                results.append(r)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--limits", type=int, nargs="+", default=[50, 500, 5000])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'listado':>10} {'limite':>7} {'filas':>6} {'orm filas/s':>12} {'core filas/s':>13} {'x':>6}")
+    for r in run(args.limits, args.repeat):
+        print(
+            f"{r['listing']:>10} {r['limit']:>7} {r['rows']:>6} "
+            f"{r['orm_rows_s']:>12} {r['core_rows_s']:>13} {r['speedup']:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Ventas concurrentes sobre pocos SKUs con stock limitado, a nivel de crud.
+
+Cada hilo tiene su Session y vende carritos (1 a --basket productos, qty 1)
+con crud.create_sale hasta agotar el stock o cumplir --duration segundos.
+Compara dos estrategias:
+
+- atomic: la de crud (UPDATE condicional del stock, filas bloqueadas en
+  orden de id solo al final de la transaccion);
+- for_update: el arreglo ingenuo, SELECT ... FOR UPDATE de los productos al
+  leerlos: cada venta tiene bloqueados sus productos durante toda la
+  transaccion.
+
+Con --rtt-ms cada sentencia espera ese tiempo antes de ejecutarse, como la
+ida y vuelta a una base en otro host: es lo que separa a las dos
+estrategias (con la base local y una sola CPU las dos quedan limitadas por
+CPU y el tiempo con las filas bloqueadas casi no pesa).
+
+Al final verifica que no haya sobreventa: stock final = inicial - vendido y
+ningun stock negativo. Sale con codigo 1 si algo no cierra.
+
+Uso (desde backend/, con DATABASE_URL apuntando a una base descartable con
+las tablas ya creadas):
+
+    python -m bench.bench_stock_contention --threads 16 --skus 5 --stock 2000 --rtt-ms 1
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from unittest import mock
+
+from sqlalchemy import event, select
+
+from app import crud
+from app.db import SessionLocal, engine
+from app.models import Product, User
+from app.schemas import SaleCreate, SaleItemCreate
+
+STRATEGIES = ("atomic", "for_update")
+
+
+def _load_for_update(db, user_id, product_ids):
+    return {
+        p.id: p
+        for p in db.query(Product)
+        .filter(Product.id.in_(list(product_ids)), Product.owner_id == user_id, Product.is_active == True)
+        .order_by(Product.id)
+        .with_for_update()
+    }
+
+
+@contextmanager
+def _strategy(name: str):
+    if name == "for_update":
+        with mock.patch.object(crud, "_load_sale_products", _load_for_update):
+            yield
+    else:
+        yield
+
+
+@contextmanager
+def _round_trip(rtt_ms: float):
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        time.sleep(rtt_ms / 1000)
+
+    if rtt_ms:
+        event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        yield
+    finally:
+        if rtt_ms:
+            event.remove(engine, "before_cursor_execute", on_execute)
+
+
+def _setup(skus: int, stock: int) -> tuple[int, list[int]]:
+    with SessionLocal() as db:
+        user = User(email=f"contention-{uuid.uuid4().hex}@bench.local", password_hash="x")
+        db.add(user)
+        db.flush()
+        products = [
+            Product(owner_id=user.id, name=f"Hot {n}", sku=f"HOT{n:04d}", price=10, stock=stock)
+            for n in range(skus)
+        ]
+        db.add_all(products)
+        db.commit()
+        return user.id, [p.id for p in products]
+
+
+def run(
+    strategy: str, threads: int, skus: int, stock: int, basket: int, duration: float, seed: int, rtt_ms: float = 0,
+) -> dict:
+    user_id, ids = _setup(skus, stock)
+    sold = Counter()
+    outcomes = Counter()
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def till(n: int) -> None:
+        rng = random.Random(seed * 1_000_003 + n)
+        local_sold, local_outcomes = Counter(), Counter()
+        with SessionLocal() as db:
+            while time.monotonic() < deadline and local_outcomes["rejected"] < 50:
+                lines = rng.sample(ids, rng.randint(1, min(basket, len(ids))))
+                payload = SaleCreate(
+                    payment_method="CASH", items=[SaleItemCreate(product_id=p, qty=1) for p in lines],
+                )
+                try:
+                    crud.create_sale(db, user_id, payload)
+                except ValueError:
+                    db.rollback()
+                    local_outcomes["rejected"] += 1
+                except crud.TransactionConflict:
+                    local_outcomes["conflict"] += 1
+                else:
+                    local_sold.update(lines)
+                    local_outcomes["ok"] += 1
+        with lock:
+            sold.update(local_sold)
+            outcomes.update(local_outcomes)
+
+    with _strategy(strategy), _round_trip(rtt_ms):
+        workers = [threading.Thread(target=till, args=(n,)) for n in range(threads)]
+        t0 = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - t0
+
+    with SessionLocal() as db:
+        final = dict(db.execute(select(Product.id, Product.stock).where(Product.owner_id == user_id)).all())
+    problems = [
+        f"producto {pid}: stock {final[pid]}, esperado {stock - sold[pid]} ({sold[pid]} vendidos)"
+        for pid in ids
+        if final[pid] != stock - sold[pid] or final[pid] < 0
+    ]
+    return {
+        "strategy": strategy,
+        "elapsed_s": round(elapsed, 2),
+        "sales_s": round(outcomes["ok"] / elapsed, 1),
+        "units_sold": sum(sold.values()),
+        "outcomes": dict(outcomes),
+        "problems": problems,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench.bench_stock_contention")
+    parser.add_argument("--strategies", nargs="+", choices=STRATEGIES, default=list(STRATEGIES))
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--skus", type=int, default=5)
+    parser.add_argument("--stock", type=int, default=2000, help="stock inicial de cada SKU")
+    parser.add_argument("--basket", type=int, default=3, help="productos por carrito (maximo)")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--rtt-ms", type=float, default=1, help="ida y vuelta simulada por sentencia")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    ok = True
+    print(f"{'estrategia':>11} {'ventas/s':>9} {'unidades':>9}  resultados")
+    for strategy in args.strategies:
+        r = run(strategy, args.threads, args.skus, args.stock, args.basket, args.duration, args.seed, args.rtt_ms)
+        outcomes = " ".join(f"{k}={v}" for k, v in sorted(r["outcomes"].items()))
+        print(f"{r['strategy']:>11} {r['sales_s']:>9} {r['units_sold']:>9}  {outcomes}")
+        for p in r["problems"]:
+            print(f"  {p}")
+        ok = ok and not r["problems"]
+    print("sin sobreventa" if ok else "stock inconsistente")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
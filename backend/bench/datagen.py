@@ -0,0 +1,278 @@
+"""Generador de datos sinteticos reproducible.
+
+Carga usuarios, productos, ventas, items y movimientos de stock con COPY,
+con distribuciones parecidas a las de produccion:
+
+- tamaño de los tenants y popularidad de los productos con sesgo Zipf (el
+  primer usuario es el mas grande: es el que usan los benchmarks);
+- ventas concentradas en horario comercial, menos los domingos, con una
+  tendencia creciente a lo largo de la ventana;
+- carritos de 1 a 20 productos (la mayoria chicos), precios log-normales;
+- stock consistente: stock = suma de movimientos. Se repone (RESTOCK) antes
+  de una venta que lo dejaria negativo, asi que ninguna venta falla.
+
+Misma semilla y mismos argumentos => mismos datos (--end tiene un valor fijo
+por defecto para que dos corridas en dias distintos sean comparables).
+
+Uso (desde backend/, con DATABASE_URL apuntando a una base descartable con
+las tablas ya creadas):
+
+    python -m bench.datagen --users 50 --products 200 --sales 1000000 --reset
+"""
+import argparse
+import bisect
+import itertools
+import math
+import random
+import time
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import crud
+from app.auth import hash_password
+from app.config import get_settings
+
+settings = get_settings()
+
+BENCH_PASSWORD = "bench1234"
+DEFAULT_END = date(2026, 1, 1)
+
+PAYMENT_METHODS = ["CASH", "DEBIT", "CREDIT", "TRANSFER"]
+PAYMENT_WEIGHTS = [45, 25, 20, 10]
+
+# peso relativo de cada hora del dia (picos al mediodia y a la tarde)
+HOUR_WEIGHTS = [0, 0, 0, 0, 0, 0, 0, 1, 3, 6, 8, 10, 10, 8, 6, 6, 7, 9, 10, 8, 5, 2, 1, 0]
+# lunes..domingo
+WEEKDAY_WEIGHTS = [1.0, 1.0, 1.0, 1.05, 1.2, 1.3, 0.5]
+
+# se escriben las ventas de a este bloque (con sus items y movimientos)
+CHUNK_SALES = 20_000
+
+TRUNCATE = "TRUNCATE sales_daily_rollup, stock_snapshots, stock_movements, sale_items, sales, products, users RESTART IDENTITY CASCADE"
+
+
+def _zipf_cum_weights(n: int, s: float) -> list[float]:
+    return list(itertools.accumulate(1 / (rank ** s) for rank in range(1, n + 1)))
+
+def _pick(rng: random.Random, cum_weights: list[float]) -> int:
+    return bisect.bisect(cum_weights, rng.random() * cum_weights[-1])
+
+def _sales_per_day(total: int, start: date, days: int) -> list[int]:
+    # reparte total en dias segun el dia de semana y una tendencia creciente
+    weights = [
+        WEEKDAY_WEIGHTS[(start + timedelta(d)).weekday()] * (1 + d / days)
+        for d in range(days)
+    ]
+    scale = total / sum(weights)
+    counts = [int(w * scale) for w in weights]
+    counts[-1] += total - sum(counts)
+    return counts
+
+def _next_id(db: Session, table: str) -> int:
+    return db.execute(text(f"SELECT coalesce(max(id), 0) + 1 FROM {table}")).scalar()
+
+def _sync_sequence(db: Session, table: str) -> None:
+    db.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))"
+    ))
+
+
+def generate(
+    db: Session,
+    users: int,
+    products: int,
+    sales: int,
+    days: int = 365,
+    end: date = DEFAULT_END,
+    seed: int = 1,
+    prefix: str = "bench",
+    reset: bool = False,
+) -> dict:
+    # Carga los datos en la transaccion de db y hace commit al final.
+    # Devuelve cantidades y la ventana de fechas generada.
+    rng = random.Random(seed)
+    zone = ZoneInfo(settings.REPORTS_TZ)
+    start = end - timedelta(days=days)
+    start_at = datetime(start.year, start.month, start.day, tzinfo=zone)
+
+    if reset:
+        db.execute(text(TRUNCATE))
+
+    cursor = db.connection().connection.driver_connection.cursor()
+    ids = {t: _next_id(db, t) for t in ("users", "products", "sales", "sale_items", "stock_movements")}
+
+    # usuarios: mismo hash para todos (bcrypt es caro)
+    password_hash = hash_password(BENCH_PASSWORD)
+    user_ids = list(range(ids["users"], ids["users"] + users))
+    with cursor.copy("COPY users (id, email, password_hash, is_active, created_at) FROM STDIN") as copy:
+        for n, user_id in enumerate(user_ids):
+            copy.write_row((user_id, f"{prefix}{n}@bench.local", password_hash, True, start_at))
+
+    # productos: stock en 0, se fija al final con los movimientos
+    catalog, owned = {}, {}
+    product_id = ids["products"]
+    with cursor.copy(
+        "COPY products (id, owner_id, name, sku, price, cost, stock, stock_min, is_active, created_at, updated_at) "
+        "FROM STDIN"
+    ) as copy:
+        for user_id in user_ids:
+            own = []
+            for n in range(products):
+                price = round(math.exp(rng.gauss(math.log(1500), 0.8)), 2)
+                cost = round(price * rng.uniform(0.5, 0.8), 2)
+                sku = None if rng.random() < 0.1 else f"SKU{n:06d}"
+                stock_min = rng.choice((0, 5, 10, 20))
+                active = rng.random() >= 0.05
+                copy.write_row((
+                    product_id, user_id, f"Producto {n}", sku, price, cost, 0, stock_min, active, start_at, start_at,
+                ))
+                own.append(product_id)
+                catalog[product_id] = {"price": price, "stock": 0}
+                product_id += 1
+            # la popularidad no sigue al orden de alta
+            rng.shuffle(own)
+            owned[user_id] = own
+
+    user_cum = _zipf_cum_weights(users, 1.1)
+    product_cum = _zipf_cum_weights(products, 1.0)
+    hour_cum = list(itertools.accumulate(HOUR_WEIGHTS))
+
+    sale_id, item_id, movement_id = ids["sales"], ids["sale_items"], ids["stock_movements"]
+    sale_rows, item_rows, movement_rows = [], [], []
+
+    def movement(user_id, product_id, change, reason, reference, at):
+        nonlocal movement_id
+        movement_rows.append((movement_id, user_id, product_id, change, reason, reference, None, at))
+        movement_id += 1
+        catalog[product_id]["stock"] += change
+
+    # stock inicial de cada producto
+    for user_id in user_ids:
+        for product_id in owned[user_id]:
+            movement(user_id, product_id, rng.randint(20, 200), "RESTOCK", "seed", start_at)
+
+    def flush():
+        with cursor.copy(
+            "COPY sales (id, user_id, total, payment_method, client_id, created_at) FROM STDIN"
+        ) as copy:
+            for row in sale_rows:
+                copy.write_row(row)
+        with cursor.copy(
+            "COPY sale_items (id, sale_id, product_id, qty, unit_price, created_at) FROM STDIN"
+        ) as copy:
+            for row in item_rows:
+                copy.write_row(row)
+        with cursor.copy(
+            "COPY stock_movements (id, user_id, product_id, change, reason, reference, note, created_at) FROM STDIN"
+        ) as copy:
+            for row in movement_rows:
+                copy.write_row(row)
+        sale_rows.clear()
+        item_rows.clear()
+        movement_rows.clear()
+
+    for day, count in enumerate(_sales_per_day(sales, start, days)):
+        day_start = start_at + timedelta(days=day)
+        offsets = sorted(
+            _pick(rng, hour_cum) * 3600 + rng.randrange(3600)
+            for _ in range(count)
+        )
+        for offset in offsets:
+            at = day_start + timedelta(seconds=offset)
+            user_id = user_ids[_pick(rng, user_cum)]
+            own = owned[user_id]
+
+            basket = min(1 + int(math.log(1 - rng.random()) / math.log(0.55)), 20, products)
+            lines = {}
+            while len(lines) < basket:
+                product_id = own[_pick(rng, product_cum)]
+                lines[product_id] = 1 if rng.random() < 0.8 else rng.randint(2, 5)
+
+            total = 0
+            for product_id, qty in lines.items():
+                info = catalog[product_id]
+                if info["stock"] < qty:
+                    movement(user_id, product_id, qty + rng.randint(20, 200), "RESTOCK", "proveedor", at)
+                unit_price = info["price"]
+                total += qty * unit_price
+                item_rows.append((item_id, sale_id, product_id, qty, unit_price, at))
+                item_id += 1
+                movement(user_id, product_id, -qty, "SALE", f"sale:{sale_id}", at)
+
+            # ~10% llega sincronizado desde una caja offline
+            client_id = f"{rng.getrandbits(64):016x}" if rng.random() < 0.1 else None
+            payment_method = rng.choices(PAYMENT_METHODS, PAYMENT_WEIGHTS)[0]
+            sale_rows.append((sale_id, user_id, round(total, 2), payment_method, client_id, at))
+            sale_id += 1
+
+            if len(sale_rows) >= CHUNK_SALES:
+                flush()
+    flush()
+
+    # stock final = suma de los movimientos
+    db.execute(text("CREATE TEMP TABLE datagen_stock (id int PRIMARY KEY, stock int)"))
+    with cursor.copy("COPY datagen_stock (id, stock) FROM STDIN") as copy:
+        for product_id, info in catalog.items():
+            copy.write_row((product_id, info["stock"]))
+    db.execute(text("UPDATE products p SET stock = s.stock FROM datagen_stock s WHERE p.id = s.id"))
+    db.execute(text("DROP TABLE datagen_stock"))
+
+    for table in ("users", "products", "sales", "sale_items", "stock_movements"):
+        _sync_sequence(db, table)
+
+    db.commit()
+    # el rollup se reconstruye desde sales (hace commit)
+    if reset:
+        crud.rebuild_sales_rollup(db)
+    else:
+        for user_id in user_ids:
+            crud.rebuild_sales_rollup(db, user_id=user_id)
+    db.execute(text("ANALYZE users, products, sales, sale_items, stock_movements, sales_daily_rollup"))
+    db.commit()
+
+    return {
+        "users": users,
+        "products": users * products,
+        "sales": sale_id - ids["sales"],
+        "sale_items": item_id - ids["sale_items"],
+        "stock_movements": movement_id - ids["stock_movements"],
+        "from": str(start),
+        "to": str(end - timedelta(days=1)),
+        "tenant_email": f"{prefix}0@bench.local",
+        "tenant_id": user_ids[0],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--products", type=int, default=200, help="productos por usuario")
+    parser.add_argument("--sales", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--end", type=date.fromisoformat, default=DEFAULT_END, help="dia siguiente al ultimo generado")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--prefix", default="bench", help="prefijo de los emails")
+    parser.add_argument("--reset", action="store_true", help="vacia las tablas antes de cargar")
+    args = parser.parse_args()
+
+    from app.db import SessionLocal
+
+    t0 = time.perf_counter()
+    with SessionLocal() as db:
+        stats = generate(
+            db, args.users, args.products, args.sales,
+            days=args.days, end=args.end, seed=args.seed, prefix=args.prefix, reset=args.reset,
+        )
+    elapsed = time.perf_counter() - t0
+
+    for key, value in stats.items():
+        print(f"{key:>16}: {value}")
+    print(f"{'segundos':>16}: {elapsed:.1f}")
+    print(f"login: {stats['tenant_email']} / {BENCH_PASSWORD}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""Carga concurrente de ventas sobre pocos SKUs (muchas cajas vendiendo lo mismo).
+
+Registra un usuario, crea --skus productos con --stock unidades cada uno y
+lanza --concurrency cajas que, hasta cumplir --duration segundos, miran el
+listado de productos (con probabilidad --browse) y venden un carrito. El
+tamaño del carrito sale de --basket (tamaño:peso) y los SKUs de una
+distribucion Zipf con exponente --zipf (0 = uniforme): con exponente alto
+casi todas las ventas pelean por los mismos productos.
+
+Al final compara la base contra lo vendido: stock = inicial - vendido, un
+movimiento SALE por unidad vendida, ninguna venta perdida y ningun stock
+negativo. Sale con codigo 1 si algo no cierra.
+
+Uso (desde backend/, con DATABASE_URL apuntando a una base descartable con
+las tablas ya creadas):
+
+    python -m bench.load_sales --concurrency 50 --duration 30 --skus 20 --zipf 1.2
+    python -m bench.load_sales --url http://127.0.0.1:8000   # app ya levantada
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter
+
+import httpx
+from sqlalchemy import text
+
+from bench.bench_async import _wait_ready
+from bench.datagen import _pick, _zipf_cum_weights
+
+PASSWORD = "load1234"
+
+
+def _parse_basket(spec: str) -> tuple[list[int], list[int]]:
+    # "1:50,2:30,5:20" -> tamaños y pesos
+    sizes, weights = [], []
+    for part in spec.split(","):
+        size, _, weight = part.partition(":")
+        sizes.append(int(size))
+        weights.append(int(weight or 1))
+    return sizes, weights
+
+def _classify(r: httpx.Response | None) -> str:
+    if r is None:
+        return "error"
+    if r.status_code < 400:
+        return "ok"
+    if r.status_code == 400 and "Stock insuficiente" in r.text:
+        return "rejected"
+    # lock o serializacion: la app pide reintentar
+    if r.status_code in (409, 503):
+        return "conflict"
+    return "error"
+
+def _latency(timings: list[float]) -> dict:
+    if not timings:
+        return {}
+    timings = sorted(timings)
+
+    def pct(p):
+        return round(timings[max(0, int(round(len(timings) * p)) - 1)], 2)
+
+    return {"p50_ms": round(statistics.median(timings), 2), "p95_ms": pct(0.95), "p99_ms": pct(0.99)}
+
+
+class Load:
+    def __init__(self, args):
+        self.args = args
+        self.timings: dict[str, list[float]] = {"login": [], "products": [], "sale": []}
+        self.outcomes: dict[str, Counter] = {op: Counter() for op in self.timings}
+        self.sold: Counter = Counter()
+
+    async def request(self, op: str, send) -> httpx.Response | None:
+        t0 = time.perf_counter()
+        try:
+            r = await send
+        except httpx.TransportError:
+            r = None
+        self.timings[op].append((time.perf_counter() - t0) * 1000)
+        self.outcomes[op][_classify(r)] += 1
+        return r
+
+    async def setup(self, c: httpx.AsyncClient) -> tuple[str, list[int], list[dict]]:
+        email = f"load-{uuid.uuid4().hex}@bench.local"
+        await c.post("/auth/register", json={"email": email, "password": PASSWORD})
+        r = await c.post("/auth/login", data={"username": email, "password": PASSWORD})
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+        ids = []
+        for n in range(self.args.skus):
+            r = await c.post(
+                "/products",
+                json={"name": f"Hot {n}", "sku": f"HOT{n:04d}", "price": 100, "stock": self.args.stock},
+                headers=headers,
+            )
+            r.raise_for_status()
+            ids.append(r.json()["id"])
+
+        # una sesion por caja (login con bcrypt: se mide aparte)
+        async def login():
+            r = await self.request("login", c.post("/auth/login", data={"username": email, "password": PASSWORD}))
+            return {"Authorization": f"Bearer {r.json()['access_token']}"} if r is not None and r.is_success else headers
+
+        tills = await asyncio.gather(*(login() for _ in range(self.args.tills)))
+        return email, ids, tills
+
+    async def till(self, c: httpx.AsyncClient, n: int, ids: list[int], headers: dict, deadline: float) -> None:
+        rng = random.Random(self.args.seed * 1_000_003 + n)
+        sizes, weights = _parse_basket(self.args.basket)
+        sku_cum = _zipf_cum_weights(len(ids), self.args.zipf) if self.args.zipf else None
+
+        while time.monotonic() < deadline:
+            if rng.random() < self.args.browse:
+                await self.request("products", c.get("/products", params={"limit": 50}, headers=headers))
+
+            size = min(rng.choices(sizes, weights)[0], len(ids))
+            lines = set()
+            while len(lines) < size:
+                lines.add(ids[_pick(rng, sku_cum)] if sku_cum else rng.choice(ids))
+            items = [{"product_id": p, "qty": 1} for p in lines]
+
+            r = await self.request("sale", c.post("/sales", json={"payment_method": "CASH", "items": items}, headers=headers))
+            if r is not None and r.is_success:
+                self.sold.update(lines)
+
+    async def run(self, base_url: str) -> dict:
+        await _wait_ready(base_url)
+        limits = httpx.Limits(max_connections=self.args.concurrency + self.args.tills)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=self.args.timeout) as c:
+            email, ids, tills = await self.setup(c)
+
+            deadline = time.monotonic() + self.args.duration
+            t0 = time.perf_counter()
+            await asyncio.gather(*(
+                self.till(c, n, ids, tills[n % len(tills)], deadline)
+                for n in range(self.args.concurrency)
+            ))
+            elapsed = time.perf_counter() - t0
+
+        sales = self.outcomes["sale"]
+        requests = sum(sum(o.values()) for op, o in self.outcomes.items() if op != "login")
+        return {
+            "email": email,
+            "elapsed_s": round(elapsed, 2),
+            "req_s": round(requests / elapsed, 1),
+            "sales_s": round(sales["ok"] / elapsed, 1),
+            "latency": {op: _latency(t) for op, t in self.timings.items()},
+            "outcomes": {op: dict(o) for op, o in self.outcomes.items()},
+            "error_rate": round(sales["error"] / max(1, sum(sales.values())), 4),
+            "conflict_rate": round(sales["conflict"] / max(1, sum(sales.values())), 4),
+            "consistency": check_consistency(email, self.args.stock, self.sold, sales["ok"]),
+        }
+
+
+def check_consistency(email: str, initial: int, sold: Counter, ok_sales: int) -> dict:
+    # Compara la base con lo que la carga sabe que vendio
+    from app.db import engine
+
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            """
+            SELECT p.id, p.stock,
+                   coalesce((SELECT sum(i.qty) FROM sale_items i WHERE i.product_id = p.id), 0) AS items,
+                   coalesce((SELECT sum(m.change) FROM stock_movements m WHERE m.product_id = p.id), 0) AS moved
+            FROM products p JOIN users u ON u.id = p.owner_id
+            WHERE u.email = :email
+            """
+        ), {"email": email}).all()
+        sales = conn.execute(text(
+            "SELECT count(*) FROM sales s JOIN users u ON u.id = s.user_id WHERE u.email = :email"
+        ), {"email": email}).scalar()
+
+    problems = []
+    for product_id, stock, items, moved in rows:
+        expected = initial - sold[product_id]
+        if stock != expected:
+            problems.append(f"producto {product_id}: stock {stock}, esperado {expected} ({sold[product_id]} vendidos)")
+        if items != sold[product_id] or moved != -sold[product_id]:
+            problems.append(f"producto {product_id}: items {items}, movimientos {moved}, vendidos {sold[product_id]}")
+        if stock < 0:
+            problems.append(f"producto {product_id}: stock negativo ({stock})")
+    if sales != ok_sales:
+        problems.append(f"ventas en la base: {sales}, confirmadas al cliente: {ok_sales}")
+
+    lost = sum(abs(stock - (initial - sold[pid])) for pid, stock, _, _ in rows)
+    return {"consistent": not problems, "units_off": lost, "problems": problems}
+
+
+def _print(result: dict) -> None:
+    print(f"duracion {result['elapsed_s']} s  {result['req_s']} req/s  {result['sales_s']} ventas/s")
+    print(f"{'op':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  resultados")
+    for op, lat in result["latency"].items():
+        outcomes = " ".join(f"{k}={v}" for k, v in sorted(result["outcomes"][op].items()))
+        print(f"{op:>9} {lat.get('p50_ms', '-'):>9} {lat.get('p95_ms', '-'):>9} {lat.get('p99_ms', '-'):>9}  {outcomes}")
+    print(f"errores {result['error_rate']:.2%}  conflictos {result['conflict_rate']:.2%}")
+
+    consistency = result["consistency"]
+    if consistency["consistent"]:
+        print("stock consistente")
+    else:
+        for p in consistency["problems"][:20]:
+            print(f"  {p}")
+        print(f"stock inconsistente: {consistency['units_off']} unidades de diferencia")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench.load_sales")
+    parser.add_argument("--url", help="app ya levantada; si falta se levanta uvicorn")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--db-async", action="store_true", help="levanta la app con DB_ASYNC=1")
+    parser.add_argument("--concurrency", type=int, default=50, help="cajas vendiendo a la vez")
+    parser.add_argument("--tills", type=int, default=10, help="sesiones (logins) que comparten las cajas")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--skus", type=int, default=20)
+    parser.add_argument("--zipf", type=float, default=1.2, help="sesgo de los SKUs (0 = uniforme)")
+    parser.add_argument("--basket", default="1:50,2:25,3:15,5:10", help="tamaño:peso del carrito")
+    parser.add_argument("--browse", type=float, default=0.3, help="probabilidad de GET /products antes de vender")
+    parser.add_argument("--stock", type=int, default=1_000_000, help="stock inicial de cada SKU")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="guarda el resultado en JSON")
+    args = parser.parse_args()
+
+    load = Load(args)
+    if args.url:
+        result = asyncio.run(load.run(args.url))
+    else:
+        env = {**os.environ, "DB_ASYNC": "1" if args.db_async else "0"}
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port), "--log-level", "warning"],
+            env=env,
+        )
+        try:
+            result = asyncio.run(load.run(f"http://127.0.0.1:{args.port}"))
+        finally:
+            server.terminate()
+            server.wait()
+
+    result["args"] = vars(args)
+    _print(result)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+    return 0 if result["consistency"]["consistent"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
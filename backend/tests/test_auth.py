@@ -1,3 +1,7 @@
+from app import crud
+from app.auth import make_pwd_context, password_pool, settings, verify_password
+from app.cache import user_cache
+
 def test_register_and_login(client):
     # register
     response = client.post("/auth/register", json={
@@ -14,4 +18,84 @@ def test_register_and_login(client):
     assert response.status_code == 200
 
     data = response.json()
-    assert "access_token" in data
\ No newline at end of file
+    assert "access_token" in data
+
+def test_user_cache_hits_and_invalidation(client, auth_headers, db_session, monkeypatch):
+    monkeypatch.setattr(user_cache, "enabled", True)
+    user_cache.clear()
+    hits, misses = user_cache.hits, user_cache.misses
+
+    for _ in range(3):
+        r = client.get("/auth/me", headers=auth_headers)
+        assert r.status_code == 200
+    assert user_cache.misses - misses == 1
+    assert user_cache.hits - hits == 2
+
+    # desactivar invalida la entrada y el siguiente request lo ve
+    crud.set_user_active(db_session, "user@test.com", False)
+    r = client.get("/auth/me", headers=auth_headers)
+    assert r.status_code == 403
+
+    user_cache.clear()
+
+def test_user_cache_is_invalidated_on_commit_not_flush(db_session, monkeypatch):
+    monkeypatch.setattr(user_cache, "enabled", True)
+    user_cache.clear()
+    db = db_session
+    user = crud.create_user(db, "flush@test.com", password_hash="x")
+    user_cache.set(user.email, "fila vieja")
+
+    # hasta el commit la fila vieja es la vigente: sigue en el cache
+    user.is_active = False
+    db.flush()
+    assert user_cache.get(user.email) == "fila vieja"
+    db.commit()
+    assert user_cache.get(user.email) is None
+
+    # un cambio que se descarta no invalida nada
+    user_cache.set("flush@test.com", "fila vigente")
+    user.is_active = True
+    db.flush()
+    db.rollback()
+    assert user_cache.get("flush@test.com") == "fila vigente"
+    user_cache.clear()
+
+def test_login_rehashes_when_cost_changes(client, db_session):
+    client.post("/auth/register", json={
+        "email": "rehash@test.com",
+        "password": "123456"
+    })
+    user = crud.get_user_by_email(db_session, "rehash@test.com")
+    user.password_hash = make_pwd_context(4).hash("123456")
+    db_session.commit()
+
+    response = client.post("/auth/login", data={
+        "username": "rehash@test.com",
+        "password": "123456"
+    })
+    assert response.status_code == 200
+
+    db_session.refresh(user)
+    assert f"r={settings.PASSWORD_HASH_ROUNDS}$" in user.password_hash
+    assert verify_password("123456", user.password_hash)
+
+def test_login_rejected_when_password_pool_is_full(client, monkeypatch):
+    client.post("/auth/register", json={
+        "email": "busy@test.com",
+        "password": "123456"
+    })
+
+    class FullSemaphore:
+        def acquire(self, blocking=True):
+            return False
+
+    monkeypatch.setattr(password_pool, "_slots", FullSemaphore())
+    rejected = password_pool.rejected
+
+    response = client.post("/auth/login", data={
+        "username": "busy@test.com",
+        "password": "123456"
+    })
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert password_pool.rejected == rejected + 1
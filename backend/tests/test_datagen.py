@@ -0,0 +1,92 @@
+from sqlalchemy import func, select, text
+
+from app import crud
+from app.models import Product, Sale, SaleItem
+from bench.bench_endpoints import CASES, _routes, compare_results
+from bench.datagen import generate
+
+
+def test_generated_data_is_consistent(db_session):
+    db = db_session
+    stats = generate(db, users=3, products=20, sales=500, days=30, seed=7, prefix="gen")
+    assert stats["sales"] == 500
+    assert stats["sale_items"] >= 500
+
+    user_ids = select(Product.owner_id).where(Product.name.like("Producto %")).distinct()
+    # stock = suma de los movimientos, nunca negativo
+    mismatched = db.execute(text(
+        """
+        SELECT count(*) FROM products p
+        JOIN (SELECT product_id, sum(change) AS total FROM stock_movements GROUP BY product_id) m
+          ON m.product_id = p.id
+        WHERE p.owner_id = ANY(:users) AND (p.stock <> m.total OR p.stock < 0)
+        """
+    ), {"users": db.execute(user_ids).scalars().all()}).scalar()
+    assert mismatched == 0
+
+    # total de cada venta = suma de sus items, con la misma fecha
+    bad_totals = db.execute(
+        select(func.count()).select_from(
+            select(Sale.id)
+            .join(SaleItem, SaleItem.sale_id == Sale.id)
+            .where(Sale.user_id == stats["tenant_id"])
+            .group_by(Sale.id, Sale.total)
+            .having(func.sum(SaleItem.qty * SaleItem.unit_price) != Sale.total)
+            .subquery()
+        )
+    ).scalar()
+    assert bad_totals == 0
+    assert db.execute(
+        select(func.count()).select_from(SaleItem).join(Sale, Sale.id == SaleItem.sale_id)
+        .where(SaleItem.created_at != Sale.created_at)
+    ).scalar() == 0
+
+    assert crud.check_sales_rollup(db, user_id=stats["tenant_id"]) == []
+
+    # el primer usuario es el tenant mas grande
+    counts = db.execute(
+        select(Sale.user_id, func.count()).where(Sale.user_id >= stats["tenant_id"]).group_by(Sale.user_id)
+    ).all()
+    assert max(counts, key=lambda c: c[1])[0] == stats["tenant_id"]
+
+    # misma semilla, mismos datos
+    first = db.execute(
+        select(Sale.total, Sale.payment_method, Sale.created_at)
+        .where(Sale.user_id == stats["tenant_id"]).order_by(Sale.id)
+    ).all()
+    again = generate(db, users=3, products=20, sales=500, days=30, seed=7, prefix="gen2")
+    second = db.execute(
+        select(Sale.total, Sale.payment_method, Sale.created_at)
+        .where(Sale.user_id == again["tenant_id"]).order_by(Sale.id)
+    ).all()
+    assert first == second
+
+    # las secuencias siguen despues de los ids generados
+    product_id = db.scalar(
+        select(func.min(Product.id)).where(Product.owner_id == stats["tenant_id"], Product.is_active)
+    )
+    max_sale = db.scalar(select(func.max(Sale.id)))
+    sale = crud.create_sale(db, stats["tenant_id"], crud.SaleCreate(
+        payment_method="cash", items=[{"product_id": product_id, "qty": 1}],
+    ))
+    assert sale.id > max_sale
+
+
+def test_every_endpoint_has_a_benchmark_case():
+    assert _routes() - set(CASES) == set()
+
+
+def test_compare_flags_regressions_over_threshold():
+    def run(**p50):
+        return {"scales": [{"sales": 1000, "endpoints": {k: {"p50_ms": v} for k, v in p50.items()}}]}
+
+    old = run(a=10.0, b=10.0, c=0.2, d=10.0)
+    new = run(a=11.0, b=13.0, c=0.6, e=50.0)
+    rows = {r["endpoint"]: r for r in compare_results(old, new, "p50_ms", threshold=0.2, min_ms=1.0)}
+
+    assert not rows["a"]["regression"]
+    assert rows["b"]["regression"]
+    # +200% pero menos de 1 ms: ruido
+    assert not rows["c"]["regression"]
+    # los que faltan en alguna de las dos corridas no se comparan
+    assert set(rows) == {"a", "b", "c"}
@@ -0,0 +1,94 @@
+from datetime import date, timedelta
+
+from sqlalchemy import func, select
+
+from app import crud
+from app.models import DataVersion
+from app.schemas import ProductCreate
+
+
+def test_products_etag_and_not_modified(client, auth_headers, monkeypatch):
+    client.post("/products", json={"name": "Yerba", "price": 10, "stock": 5}, headers=auth_headers)
+
+    r = client.get("/products", headers=auth_headers)
+    assert r.status_code == 200
+    etag = r.headers["etag"]
+    assert etag.startswith('"') and not etag.startswith("W/")
+    assert r.headers["cache-control"] == "private, no-cache"
+
+    # otra URL, otro ETag
+    assert client.get("/products", params={"limit": 10}, headers=auth_headers).headers["etag"] != etag
+
+    # sin cambios: 304 sin correr la consulta del listado
+    def fail(*args, **kwargs):
+        raise AssertionError("no deberia consultar")
+
+    monkeypatch.setattr(crud, "list_products_rows", fail)
+    r = client.get("/products", headers={**auth_headers, "If-None-Match": f'"x", W/{etag}'})
+    assert r.status_code == 304
+    assert r.content == b""
+    assert r.headers["etag"] == etag
+    monkeypatch.undo()
+
+    # cualquier escritura cambia la version
+    client.post("/products", json={"name": "Azucar", "price": 5, "stock": 1}, headers=auth_headers)
+    r = client.get("/products", headers={**auth_headers, "If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["etag"] != etag
+    assert len(r.json()["items"]) == 2
+
+def test_sales_etag_changes_with_each_write(client, auth_headers):
+    p = client.post("/products", json={"name": "Yerba", "price": 10, "stock": 50}, headers=auth_headers).json()["id"]
+
+    etags = [client.get("/sales", headers=auth_headers).headers["etag"]]
+    client.post("/sales", json={"payment_method": "cash", "items": [{"product_id": p, "qty": 1}]}, headers=auth_headers)
+    etags.append(client.get("/sales", headers=auth_headers).headers["etag"])
+    client.post(f"/products/{p}/stock", json={"change": 5, "reason": "RESTOCK"}, headers=auth_headers)
+    etags.append(client.get("/sales", headers=auth_headers).headers["etag"])
+    client.post("/sales/batch", json={"sales": [{
+        "client_id": "caja1-1", "payment_method": "cash", "items": [{"product_id": p, "qty": 1}],
+    }]}, headers=auth_headers)
+    etags.append(client.get("/sales", headers=auth_headers).headers["etag"])
+    assert len(set(etags)) == 4
+
+def test_data_version_is_the_sum_of_its_shards(db_session):
+    db = db_session
+    a = crud.create_user(db, "version-a@test.com", password_hash="x")
+    b = crud.create_user(db, "version-b@test.com", password_hash="x")
+    assert crud.get_data_version(db, a.id) == 0
+
+    # lo que subieron escrituras desde otras conexiones queda en otros shards
+    own = db.scalar(select(func.pg_backend_pid() % crud.WRITE_SHARDS))
+    db.add(DataVersion(user_id=a.id, shard=(own + 1) % crud.WRITE_SHARDS, version=3))
+    db.commit()
+    crud.create_product(db, a.id, ProductCreate(name="Yerba", price=10, stock=5))
+    crud.create_product(db, a.id, ProductCreate(name="Azucar", price=10, stock=5))
+    assert crud.get_data_version(db, a.id) == 5
+    assert db.scalar(select(func.count()).where(DataVersion.user_id == a.id)) == 2
+
+    # las reconstrucciones globales suben la de todos
+    crud.rebuild_sales_rollup(db)
+    assert crud.get_data_version(db, a.id) == 6
+    assert crud.get_data_version(db, b.id) == 1
+
+def test_closed_report_ranges_get_long_cache(client, auth_headers):
+    today = date.today()
+    past = {"from": str(today - timedelta(days=60)), "to": str(today - timedelta(days=30))}
+    recent = {"from": str(today - timedelta(days=7)), "to": str(today)}
+
+    for path in ("/reports/sales", "/reports/sales/summary", "/reports/sales/daily", "/reports/sales/daily/export.csv"):
+        r = client.get(path, params=past, headers=auth_headers)
+        assert r.status_code == 200
+        assert r.headers["cache-control"].startswith("private, max-age=")
+        r = client.get(path, params=past, headers={**auth_headers, "If-None-Match": r.headers["etag"]})
+        assert r.status_code == 304
+
+        r = client.get(path, params=recent, headers=auth_headers)
+        assert r.headers["cache-control"] == "private, no-cache"
+
+    r = client.get("/reports/sales/export.csv", params=past, headers=auth_headers)
+    assert r.headers["cache-control"].startswith("private, max-age=")
+    assert "attachment" in r.headers["content-disposition"]
+
+    r = client.get("/reports/sales", params={**past, "tz": "Marte/Olimpo"}, headers=auth_headers)
+    assert r.status_code == 400
@@ -0,0 +1,153 @@
+import json
+from datetime import date, datetime, timezone
+
+from sqlalchemy import event, func, select, text
+
+from app import crud
+from app.models import Sale
+
+USERS = 500
+PRODUCTS_PER_USER = 100
+SALES = 200_000
+MOVEMENTS = 200_000
+
+
+def _load_synthetic(db):
+    # Datos generados en el servidor, con created_at creciente como en
+    # produccion (tablas de solo insercion)
+    first_user = db.execute(text(
+        """
+        INSERT INTO users (email, password_hash, is_active)
+        SELECT 'plan' || g || '@test.com', 'x', true FROM generate_series(1, :n) g
+        RETURNING id
+        """
+    ), {"n": USERS}).scalars().all()[0]
+    db.execute(text(
+        """
+        INSERT INTO products (owner_id, name, price, cost, stock, stock_min, is_active)
+        SELECT :u0 + (g % :users), 'P' || g, 10, 5, 100, 0, g % 10 <> 0
+        FROM generate_series(1, :n) g
+        """
+    ), {"u0": first_user, "users": USERS, "n": USERS * PRODUCTS_PER_USER})
+    db.execute(text(
+        """
+        INSERT INTO sales (user_id, total, payment_method, created_at)
+        SELECT :u0 + (g % :users), 10, 'cash',
+               timestamptz '2025-01-01 00:00+00' + g * interval '2 minutes'
+        FROM generate_series(1, :n) g
+        """
+    ), {"u0": first_user, "users": USERS, "n": SALES})
+    # un item por venta: con sale_items vacia el plan del reporte arranca
+    # por ahi y no dice nada de los indices de sales
+    db.execute(text(
+        """
+        INSERT INTO sale_items (sale_id, product_id, qty, unit_price, created_at)
+        SELECT s.id, (SELECT min(p.id) FROM products p WHERE p.owner_id = s.user_id), 1, 10, s.created_at
+        FROM sales s
+        """
+    ))
+    db.execute(text(
+        """
+        INSERT INTO stock_movements (user_id, product_id, change, reason, created_at)
+        SELECT p.owner_id, p.id, -1, 'SALE',
+               timestamptz '2025-01-01 00:00+00' + g * interval '2 minutes'
+        FROM generate_series(1, :n) g
+        JOIN products p ON p.id = (SELECT min(id) FROM products) + (g % :products)
+        """
+    ), {"n": MOVEMENTS, "products": USERS * PRODUCTS_PER_USER})
+    # muestra = tabla entera: estadisticas (y planes) iguales en cada corrida
+    db.execute(text("SET LOCAL default_statistics_target = 1000"))
+    db.execute(text("ANALYZE users, products, sales, sale_items, stock_movements"))
+    return first_user
+
+
+def _plan_indexes(db, statement: str, params) -> set[str]:
+    plan = db.connection().exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    names = set()
+
+    def walk(node):
+        if "Index Name" in node:
+            names.add(node["Index Name"])
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan[0]["Plan"])
+    return names
+
+
+def _captured_select(db, fn, contains: str = "") -> tuple[str, dict]:
+    # La primera sentencia SELECT (que contenga `contains`) que ejecuta la
+    # funcion de crud, con sus parametros
+    captured = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    engine = db.get_bind().engine
+    event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", on_execute)
+
+    return next(c for c in captured if c[0].lstrip().startswith("SELECT") and contains in c[0])
+
+
+def test_tenant_range_queries_use_composite_indexes(db_session):
+    user_id = _load_synthetic(db_session)
+    product_id = db_session.execute(
+        select(func.min(text("id"))).select_from(text("products")).where(text(f"owner_id = {user_id}"))
+    ).scalar()
+
+    # reportes: ventas de un usuario en un rango de fechas
+    stmt, params = _captured_select(
+        db_session,
+        lambda: db_session.execute(crud.sales_csv_stmt(user_id, date(2025, 3, 1), date(2025, 3, 7))).all(),
+    )
+    assert "ix_sales_user_id_created_at" in _plan_indexes(db_session, stmt, params)
+
+    # movimientos de un producto, paginados por id
+    stmt, params = _captured_select(
+        db_session,
+        lambda: crud.list_stock_movements(db_session, user_id, product_id, limit=51),
+    )
+    assert "ix_stock_movements_user_id_product_id_id" in _plan_indexes(db_session, stmt, params)
+
+    # productos activos, paginados por id
+    stmt, params = _captured_select(
+        db_session,
+        lambda: crud.list_products(db_session, user_id, limit=51),
+    )
+    assert "ix_products_owner_id_id_active" in _plan_indexes(db_session, stmt, params)
+
+    # busqueda por prefijo de nombre
+    stmt, params = _captured_select(
+        db_session,
+        lambda: crud.search_products(db_session, user_id, "p1"),
+        contains='(lower(products.name) COLLATE "C") LIKE',
+    )
+    assert "ix_products_owner_id_name_prefix" in _plan_indexes(db_session, stmt, params)
+
+    # stock bajo: pagina por urgencia desde el indice parcial
+    db_session.execute(text("UPDATE products SET stock_min = 100 + id % 50 WHERE id % 20 = 0"))
+    db_session.execute(text("ANALYZE products"))
+    stmt, params = _captured_select(
+        db_session,
+        lambda: crud.list_low_stock(db_session, user_id, limit=50, cursor="-10:0"),
+        contains="ORDER BY",
+    )
+    assert "ix_products_owner_id_low_stock" in _plan_indexes(db_session, stmt, params)
+
+
+def test_created_at_range_scan_uses_brin(db_session):
+    _load_synthetic(db_session)
+
+    stmt = select(func.count()).select_from(Sale).where(
+        Sale.created_at >= datetime(2025, 2, 1, tzinfo=timezone.utc),
+        Sale.created_at < datetime(2025, 2, 2, tzinfo=timezone.utc),
+    )
+    compiled = stmt.compile(db_session.get_bind())
+    assert "ix_sales_created_at_brin" in _plan_indexes(db_session, str(compiled), compiled.params)
@@ -0,0 +1,40 @@
+import json
+
+from app import crud, schemas
+from app.main import RowsJSONResponse
+from app.schemas import ProductCreate, SaleCreate, SaleItemCreate
+
+
+def _fast(rows):
+    return json.loads(RowsJSONResponse(rows).body)
+
+def _orm(rows, out):
+    return [out.model_validate(r).model_dump(mode="json") for r in rows]
+
+def test_row_listings_match_orm_path(db_session):
+    db = db_session
+    user = crud.create_user(db, "filas@test.com", password_hash="x")
+    a = crud.create_product(db, user.id, ProductCreate(name="Yerba", sku="Y1", price=1325.85, cost=0.1, stock=40))
+    b = crud.create_product(db, user.id, ProductCreate(name="Azucar", price=10, stock=5, stock_min=8))
+    for qty in (1, 3):
+        crud.create_sale(db, user.id, SaleCreate(payment_method="cash", items=[
+            SaleItemCreate(product_id=a.id, qty=qty), SaleItemCreate(product_id=b.id, qty=1),
+        ]))
+    crud.adjust_stock(db, user.id, a.id, 7, reason="RESTOCK", note="proveedor")
+    crud.update_product(db, user.id, b.id, schemas.ProductUpdate(is_active=False))
+
+    for include_inactive in (False, True):
+        for limit in (None, 2):
+            kwargs = {"include_inactive": include_inactive, "limit": limit}
+            assert _fast(crud.list_products_rows(db, user.id, **kwargs)) == _orm(
+                crud.list_products(db, user.id, **kwargs), schemas.ProductOut
+            )
+
+    sales = crud.list_sales(db, user.id)
+    assert _fast(crud.list_sales_rows(db, user.id)) == _orm(sales, schemas.SaleOut)
+    assert _fast(crud.list_sales_rows(db, user.id, limit=1, cursor=sales[0].id)) == _orm(sales[1:], schemas.SaleOut)
+    assert crud.list_sales_rows(db, user.id, cursor=sales[-1].id) == []
+
+    assert _fast(crud.list_stock_movements_rows(db, user.id, a.id)) == _orm(
+        crud.list_stock_movements(db, user.id, a.id), schemas.StockMovementOut
+    )
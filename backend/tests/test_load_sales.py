@@ -0,0 +1,27 @@
+import httpx
+
+from bench.load_sales import _classify, _latency, _parse_basket
+
+
+def test_basket_spec():
+    assert _parse_basket("1:50,2:30,5") == ([1, 2, 5], [50, 30, 1])
+
+
+def test_outcome_classification():
+    def response(status, detail=""):
+        return httpx.Response(status, json={"detail": detail})
+
+    assert _classify(response(200)) == "ok"
+    assert _classify(response(400, "Stock insuficiente para 'x'. Disponible: 0, pedido: 1")) == "rejected"
+    assert _classify(response(409, "conflicto")) == "conflict"
+    assert _classify(response(503)) == "conflict"
+    assert _classify(response(400, "Producto 1 no existe")) == "error"
+    assert _classify(response(500)) == "error"
+    # timeout o conexion caida
+    assert _classify(None) == "error"
+
+
+def test_latency_percentiles():
+    lat = _latency([float(n) for n in range(1, 101)])
+    assert lat == {"p50_ms": 50.5, "p95_ms": 95.0, "p99_ms": 99.0}
+    assert _latency([]) == {}
@@ -0,0 +1,84 @@
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import crud
+
+
+def _product(client, auth_headers, name, stock, stock_min):
+    r = client.post(
+        "/products", json={"name": name, "price": 1, "stock": stock, "stock_min": stock_min}, headers=auth_headers,
+    )
+    return r.json()["id"]
+
+def test_low_stock_sorted_by_urgency_and_paginated(client, auth_headers):
+    ok = _product(client, auth_headers, "Sobra", 50, 10)
+    a = _product(client, auth_headers, "Falta 1", 9, 10)
+    b = _product(client, auth_headers, "Falta 8", 2, 10)
+    c = _product(client, auth_headers, "Falta 5", 0, 5)
+    d = _product(client, auth_headers, "Archivado", 0, 10)
+    client.delete(f"/products/{d}", headers=auth_headers)
+
+    r = client.get("/products/low-stock", headers=auth_headers)
+    assert r.status_code == 200
+    data = r.json()
+    assert data["total"] == 3
+    assert [(i["id"], i["deficit"]) for i in data["items"]] == [(b, 8), (c, 5), (a, 1)]
+    assert all(i["low"] for i in data["items"])
+    assert ok not in [i["id"] for i in data["items"]]
+
+    r = client.get("/products/low-stock", params={"limit": 2}, headers=auth_headers)
+    first = r.json()
+    assert [i["id"] for i in first["items"]] == [b, c]
+    r = client.get("/products/low-stock", params={"limit": 2, "cursor": first["next_cursor"]}, headers=auth_headers)
+    assert [i["id"] for i in r.json()["items"]] == [a]
+    assert r.json()["next_cursor"] is None
+
+    r = client.get("/products/low-stock", params={"cursor": "x"}, headers=auth_headers)
+    assert r.status_code == 400
+
+def test_low_stock_change_feed(client, auth_headers):
+    a = _product(client, auth_headers, "Casi", 6, 5)
+    b = _product(client, auth_headers, "Bajo", 1, 5)
+    since = client.get("/products/low-stock", headers=auth_headers).json()["since"]
+
+    # a entra en stock bajo por una venta, b sale por una reposicion
+    client.post("/sales", json={"items": [{"product_id": a, "qty": 2}], "payment_method": "cash"}, headers=auth_headers)
+    client.post(f"/products/{b}/stock", json={"change": 10, "reason": "RESTOCK"}, headers=auth_headers)
+
+    r = client.get("/products/low-stock", params={"since": since}, headers=auth_headers)
+    data = r.json()
+    changes = {i["id"]: (i["stock"], i["low"]) for i in data["items"]}
+    assert changes[a] == (4, True)
+    assert changes[b] == (11, False)
+    assert data["total"] == 1
+    assert data["since"] >= since
+
+    # mas cambios que el limite: el cliente vuelve a pedir la lista
+    r = client.get("/products/low-stock", params={"since": since, "limit": 1}, headers=auth_headers)
+    assert r.json()["resync"] is True
+    assert r.json()["items"] == []
+
+def test_change_watermark_is_held_only_by_writing_transactions(db_session):
+    engine = db_session.get_bind().engine
+
+    def watermark():
+        with Session(engine) as db:
+            return crud._change_watermark(db)
+
+    def committed_xid():
+        with engine.begin() as conn:
+            return conn.execute(text("SELECT pg_current_xact_id()::text::bigint")).scalar()
+
+    # una lectura larga (un export CSV) no tiene xid: no frena el feed
+    with engine.connect() as export:
+        export.execute(text("SELECT count(*) FROM products")).scalar()
+        done = committed_xid()
+        assert watermark() > done
+
+        # una que escribe y sigue abierta si: su cambio puede aparecer despues
+        with engine.connect() as writer:
+            xid = writer.execute(text("SELECT pg_current_xact_id()::text::bigint")).scalar()
+            committed_xid()
+            assert watermark() == xid
+            writer.rollback()
+        assert watermark() > xid
@@ -0,0 +1,85 @@
+import gc
+import re
+import threading
+
+from app.metrics import Counter, Histogram
+
+
+def _sample(text: str, name: str, **labels) -> float:
+    for line in text.splitlines():
+        if line.startswith(name + "{") or line.startswith(name + " "):
+            if all(f'{k}="{v}"' in line for k, v in labels.items()):
+                return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{name} {labels} no esta en /metrics")
+
+def test_metrics_exposes_routes_pool_and_crud(client, auth_headers):
+    r = client.post("/products", json={"name": "Metrica", "price": 10, "stock": 5}, headers=auth_headers)
+    pid = r.json()["id"]
+    client.get(f"/products/{pid}", headers=auth_headers)
+    client.post("/sales", json={"items": [{"product_id": pid, "qty": 1}], "payment_method": "cash"}, headers=auth_headers)
+    client.get("/reports/sales", params={"from": "2026-01-01", "to": "2026-01-31"}, headers=auth_headers)
+    client.get("/reports/products", params={"from": "2026-01-01", "to": "2026-01-31"}, headers=auth_headers)
+
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = r.text
+
+    # la ruta va con su template, no con el id
+    assert _sample(text, "http_requests_total", method="GET", route="/products/{product_id}", status="200") >= 1
+    assert f"/products/{pid}" not in text
+    assert _sample(text, "http_request_duration_seconds_count", method="POST", route="/sales") >= 1
+    assert _sample(text, "http_request_duration_seconds_bucket", method="POST", route="/sales", le="+Inf") >= 1
+    # el propio scrape esta en curso
+    assert _sample(text, "http_requests_in_flight") >= 1
+
+    assert _sample(text, "crud_duration_seconds_count", function="create_sale") >= 1
+    assert _sample(text, "crud_duration_seconds_count", function="sales_report") >= 1
+    assert _sample(text, "crud_duration_seconds_count", function="products_report") >= 1
+    assert _sample(text, "db_pool_connections", pool="sync", state="size") >= 1
+    assert re.search(r"^# TYPE db_pool_checkout_seconds histogram$", text, re.M)
+
+def test_histogram_aggregates_shards_across_threads():
+    h = Histogram("t_seconds", "test", ("k",), buckets=(0.1, 1.0))
+
+    def work():
+        for _ in range(1000):
+            h.observe(0.05, "a")
+            h.observe(0.5, "a")
+            h.observe(5, "a")
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    lines = h.collect()
+    assert 't_seconds_bucket{k="a",le="0.1"} 4000' in lines
+    assert 't_seconds_bucket{k="a",le="1.0"} 8000' in lines
+    assert 't_seconds_bucket{k="a",le="+Inf"} 12000' in lines
+    assert 't_seconds_count{k="a"} 12000' in lines
+
+def test_shards_of_finished_threads_are_retired():
+    c = Counter("t_total", "test", ("k",))
+    h = Histogram("t2_seconds", "test", buckets=(1.0,))
+
+    def work():
+        c.inc("a")
+        c.inc("b", amount=2)
+        h.observe(0.5)
+
+    # como los workers del threadpool: mueren y se crean otros
+    for _ in range(50):
+        t = threading.Thread(target=work)
+        t.start()
+        t.join()
+    gc.collect()
+
+    assert len(c._shards) <= 1 and len(h._shards) <= 1
+    assert c.values() == {("a",): 50, ("b",): 100}
+    assert 't2_seconds_count 50' in h.collect()
+
+    # y un thread vivo se sigue sumando aparte
+    c.inc("a")
+    assert c.values()[("a",)] == 51
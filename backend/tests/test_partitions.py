@@ -0,0 +1,134 @@
+import json
+from datetime import date, datetime, timezone
+
+from sqlalchemy import func, select, text
+
+from app import crud, partitions
+from app.models import Product, Sale, SaleItem, StockMovement
+from app.schemas import SaleBatchItem
+
+
+def _batch(db, user_id, product_id, client_id, created_at):
+    return crud.create_sales_batch(db, user_id, [SaleBatchItem(
+        client_id=client_id,
+        created_at=created_at,
+        payment_method="cash",
+        items=[{"product_id": product_id, "qty": 1}],
+    )])[0]
+
+def _relations(db, stmt) -> set[str]:
+    compiled = stmt.compile(db.get_bind())
+    plan = db.connection().exec_driver_sql("EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    names = set()
+
+    def walk(node):
+        if "Relation Name" in node:
+            names.add(node["Relation Name"])
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan[0]["Plan"])
+    return names
+
+def _count(db, model) -> int:
+    return db.execute(select(func.count()).select_from(model)).scalar()
+
+def test_monthly_partitioning_lifecycle(db_session):
+    db = db_session
+    user = crud.create_user(db, "particiones@test.com", password_hash="x")
+    product = Product(owner_id=user.id, name="Particionado", price=10, stock=100)
+    db.add(product)
+    db.commit()
+
+    for i, day in enumerate([datetime(2026, 1, 15, 12), datetime(2026, 1, 20, 12), datetime(2026, 2, 10, 12)]):
+        assert _batch(db, user.id, product.id, f"c{i}", day.replace(tzinfo=timezone.utc))["status"] == "created"
+
+    partitions.enable_partitioning(db, months_ahead=2, today=date(2026, 3, 10))
+
+    assert partitions.is_partitioned(db, "sale_items")
+    months = [date(2026, m, 1) for m in range(1, 6)]
+    assert partitions.list_partitions(db, "sales") == months
+    assert partitions.list_partitions(db, "sale_items") == months
+    # los movimientos llevan la fecha real de insercion: fuera del rango
+    # creado caen en la particion default
+    assert partitions.list_partitions(db, "stock_movements") == months[2:]
+    assert _count(db, Sale) == 3 and _count(db, SaleItem) == 3 and _count(db, StockMovement) == 3
+
+    # las escrituras siguen funcionando, incluida la idempotencia por client_id
+    assert _batch(db, user.id, product.id, "c3", datetime(2026, 2, 11, 9, tzinfo=timezone.utc))["status"] == "created"
+    assert _batch(db, user.id, product.id, "c3", datetime(2026, 2, 11, 9, tzinfo=timezone.utc))["status"] == "duplicate"
+    crud.create_sale(db, user.id, crud.SaleCreate(payment_method="cash", items=[{"product_id": product.id, "qty": 1}]))
+
+    # un reporte de febrero solo lee las particiones de febrero
+    relations = _relations(db, crud.sales_csv_stmt(user.id, date(2026, 2, 1), date(2026, 2, 28)))
+    assert {"sales_p202602", "sale_items_p202602"} <= relations
+    assert not any(r.startswith(("sales_p", "sale_items_p")) and not r.endswith("202602") for r in relations)
+    rows = db.execute(crud.sales_csv_stmt(user.id, date(2026, 2, 1), date(2026, 2, 28))).all()
+    assert len(rows) == 2
+
+    created = partitions.ensure_partitions(db, months_ahead=2, today=date(2026, 5, 3))
+    assert sorted(created) == sorted(
+        partitions.partition_name(t, date(2026, m, 1)) for t in partitions.TABLES for m in (6, 7)
+    )
+    assert partitions.ensure_partitions(db, months_ahead=2, today=date(2026, 5, 3)) == []
+
+    # archivar enero: se desengancha, no se borra fila por fila
+    moved = partitions.archive_partitions(db, before=date(2026, 2, 1), schema="archive_test")
+    assert sorted(moved) == ["archive_test.sale_items_p202601", "archive_test.sales_p202601"]
+    assert db.execute(text("SELECT count(*) FROM archive_test.sales_p202601")).scalar() == 2
+    assert _count(db, Sale) == 3
+
+    partitions.disable_partitioning(db)
+    assert not partitions.is_partitioned(db, "sales")
+    assert _count(db, Sale) == 3 and _count(db, SaleItem) == 3
+    # la secuencia sigue desde donde estaba
+    sale = crud.create_sale(db, user.id, crud.SaleCreate(payment_method="cash", items=[{"product_id": product.id, "qty": 1}]))
+    assert sale.id > db.execute(text("SELECT max(id) FROM archive_test.sales_p202601")).scalar()
+
+def test_batch_replay_without_created_at_is_duplicate_when_partitioned(db_session, monkeypatch):
+    db = db_session
+    user = crud.create_user(db, "reintento@test.com", password_hash="x")
+    product = Product(owner_id=user.id, name="Reintento", price=10, stock=10)
+    db.add(product)
+    db.commit()
+    partitions.enable_partitioning(db, months_ahead=1)
+
+    assert _batch(db, user.id, product.id, "offline-1", None)["status"] == "created"
+    assert _batch(db, user.id, product.id, "offline-1", None)["status"] == "duplicate"
+
+    # un reintento simultaneo: el chequeo previo todavia no ve la venta del otro
+    monkeypatch.setattr(crud, "_existing_client_ids", lambda *args: {})
+    assert _batch(db, user.id, product.id, "offline-1", None)["status"] == "duplicate"
+
+    assert _count(db, Sale) == 1
+    db.refresh(product)
+    assert product.stock == 9
+
+def test_ensure_partitions_moves_rows_out_of_default(db_session):
+    db = db_session
+    user = crud.create_user(db, "default@test.com", password_hash="x")
+    product = Product(owner_id=user.id, name="Olvidado", price=10, stock=10)
+    db.add(product)
+    db.commit()
+    partitions.enable_partitioning(db, months_ahead=0, today=date(2026, 1, 10))
+
+    # nadie corrio partitions-ensure: las ventas de febrero y marzo caen en la default
+    for i, day in enumerate([datetime(2026, 2, 10, 12), datetime(2026, 3, 5, 12)]):
+        assert _batch(db, user.id, product.id, f"d{i}", day.replace(tzinfo=timezone.utc))["status"] == "created"
+    assert db.execute(text("SELECT count(*) FROM sales_default")).scalar() == 2
+
+    created = partitions.ensure_partitions(db, months_ahead=1, today=date(2026, 3, 20))
+    assert {"sales_p202602", "sales_p202603", "sale_items_p202602", "sale_items_p202603"} <= set(created)
+    assert "sales_p202604" in created
+    for table in ("sales", "sale_items"):
+        assert db.execute(text(f"SELECT count(*) FROM {table}_default")).scalar() == 0
+        assert db.execute(text(f"SELECT count(*) FROM {table}_p202603")).scalar() == 1
+    assert _count(db, Sale) == 2 and _count(db, SaleItem) == 2
+    # la FK de sale_items volvio
+    assert db.execute(text(
+        "SELECT count(*) FROM pg_constraint WHERE conname = 'sale_items_sale_id_fkey' AND conrelid = 'sale_items'::regclass"
+    )).scalar() == 1
+    assert partitions.ensure_partitions(db, months_ahead=1, today=date(2026, 3, 20)) == []
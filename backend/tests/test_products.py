@@ -70,4 +70,69 @@ def test_users_cannot_see_other_users_products(client):
     # Usuario 2 intenta acceder
     r = client.get(f"/products/{product_id}", headers=headers2)
 
-    assert r.status_code == 404
\ No newline at end of file
+    assert r.status_code == 404
+
+def test_update_product_to_existing_sku(client, auth_headers):
+    for sku in ("UPD1", "UPD2"):
+        r = client.post(
+            "/products",
+            json={"name": f"Producto {sku}", "price": 10, "stock": 1, "sku": sku},
+            headers=auth_headers
+        )
+        assert r.status_code == 200
+    product_id = r.json()["id"]
+
+    r = client.patch(f"/products/{product_id}", json={"sku": "UPD1"}, headers=auth_headers)
+    assert r.status_code == 409
+
+    r = client.patch(f"/products/{product_id}", json={"name": "Renombrado"}, headers=auth_headers)
+    assert r.status_code == 200
+    assert r.json()["sku"] == "UPD2"
+
+def test_import_products_csv_upserts_by_sku(client, auth_headers):
+    r = client.post(
+        "/products",
+        json={"name": "Viejo", "price": 1, "stock": 7, "sku": "IMP1"},
+        headers=auth_headers
+    )
+    existing_id = r.json()["id"]
+
+    content = (
+        "name,sku,price,cost,stock,stock_min\n"
+        "Nuevo nombre,IMP1,15.5,10,99,2\n"
+        "Yerba,IMP2,3200,2500,40,5\n"
+        "Sin precio,IMP3,abc,,,\n"
+        "Yerba 1kg,IMP2,3300,2500,40,5\n"
+    )
+    r = client.post(
+        "/products/import",
+        files={"file": ("catalogo.csv", content, "text/csv")},
+        headers=auth_headers
+    )
+    assert r.status_code == 200
+    data = r.json()
+    assert data["inserted"] == 1
+    assert data["updated"] == 1
+    assert [e["row"] for e in data["errors"]] == [3]
+
+    r = client.get(f"/products/{existing_id}", headers=auth_headers)
+    p = r.json()
+    assert p["name"] == "Nuevo nombre"
+    assert p["price"] == 15.5
+    assert p["stock"] == 7
+
+    r = client.get("/products", params={"all": True}, headers=auth_headers)
+    by_sku = {p["sku"]: p for p in r.json()}
+    assert by_sku["IMP2"]["name"] == "Yerba 1kg"
+
+def test_import_products_jsonl(client, auth_headers):
+    content = '{"name": "A", "sku": "J1", "price": 1}\n{"name": "", "sku": "J2"}\n'
+    r = client.post(
+        "/products/import",
+        files={"file": ("catalogo.jsonl", content, "application/x-ndjson")},
+        headers=auth_headers
+    )
+    assert r.status_code == 200
+    data = r.json()
+    assert data["inserted"] == 1
+    assert [e["row"] for e in data["errors"]] == [2]
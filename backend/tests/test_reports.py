@@ -0,0 +1,282 @@
+from datetime import date, datetime, timedelta, timezone
+from app import crud
+from app.models import Sale, SalesDailyRollup
+
+
+def _create_product(client, headers, sku, price=100, stock=50):
+    r = client.post(
+        "/products",
+        json={
+            "name": f"Producto {sku}",
+            "price": price,
+            "stock": stock,
+            "sku": sku
+        },
+        headers=headers
+    )
+    assert r.status_code == 200
+    return r.json()["id"]
+
+def _sell(client, headers, product_id, qty, payment_method):
+    r = client.post(
+        "/sales",
+        json={
+            "items": [
+                {"product_id": product_id, "qty": qty}
+            ],
+            "payment_method": payment_method
+        },
+        headers=headers
+    )
+    assert r.status_code == 200
+
+def test_sales_summary_and_daily(client, auth_headers):
+    product_id = _create_product(client, auth_headers, "REP1", price=10.5)
+    _sell(client, auth_headers, product_id, 2, "cash")
+    _sell(client, auth_headers, product_id, 1, "CASH")
+    _sell(client, auth_headers, product_id, 3, "card")
+
+    today = date.today().isoformat()
+    params = {"from": today, "to": today}
+
+    r = client.get("/reports/sales/summary", params=params, headers=auth_headers)
+    assert r.status_code == 200
+    summary = r.json()
+    assert summary["count_sales"] == 3
+    assert summary["total"] == 63.0
+    assert summary["by_payment_method"] == {"cash": 21.0, "CASH": 10.5, "card": 31.5}
+
+    r = client.get("/reports/sales/daily", params=params, headers=auth_headers)
+    assert r.status_code == 200
+    days = r.json()["days"]
+    assert len(days) == 1
+    assert days[0]["count_sales"] == 3
+    assert days[0]["total"] == 63.0
+    assert days[0]["by_payment_method"] == {"CASH": 31.5, "CARD": 31.5}
+
+def test_combined_report_matches_separate_endpoints(client, auth_headers):
+    product_id = _create_product(client, auth_headers, "REP2", price=7)
+    _sell(client, auth_headers, product_id, 4, "cash")
+    _sell(client, auth_headers, product_id, 1, "transfer")
+
+    today = date.today().isoformat()
+    params = {"from": today, "to": today}
+
+    summary = client.get("/reports/sales/summary", params=params, headers=auth_headers).json()
+    daily = client.get("/reports/sales/daily", params=params, headers=auth_headers).json()
+
+    r = client.get("/reports/sales", params=params, headers=auth_headers)
+    assert r.status_code == 200
+    assert r.json() == {"summary": summary, "daily": daily}
+
+def test_report_empty_range(client, auth_headers):
+    params = {"from": "2000-01-01", "to": "2000-01-31"}
+
+    r = client.get("/reports/sales", params=params, headers=auth_headers)
+    assert r.status_code == 200
+    data = r.json()
+    assert data["summary"]["count_sales"] == 0
+    assert data["summary"]["total"] == 0
+    assert data["summary"]["by_payment_method"] == {}
+    assert data["daily"]["days"] == []
+
+def test_daily_fill_gaps(client, auth_headers):
+    product_id = _create_product(client, auth_headers, "REP3", price=5)
+    _sell(client, auth_headers, product_id, 2, "cash")
+
+    today = date.today()
+    from_date = today.replace(day=1)
+    params = {"from": from_date.isoformat(), "to": today.isoformat(), "fill_gaps": True}
+
+    r = client.get("/reports/sales/daily", params=params, headers=auth_headers)
+    assert r.status_code == 200
+    days = r.json()["days"]
+    assert len(days) == today.day
+    assert days[0]["date"] == from_date.isoformat()
+    assert days[-1]["date"] == today.isoformat()
+    assert days[-1]["count_sales"] == 1
+    assert days[-1]["total"] == 10.0
+    assert sum(d["count_sales"] for d in days) == 1
+
+def test_daily_month_and_hour_granularity(client, auth_headers):
+    product_id = _create_product(client, auth_headers, "REP4", price=3)
+    _sell(client, auth_headers, product_id, 1, "cash")
+    _sell(client, auth_headers, product_id, 1, "card")
+
+    today = date.today()
+    params = {"from": today.isoformat(), "to": today.isoformat(), "tz": "UTC"}
+
+    r = client.get("/reports/sales/daily", params={**params, "granularity": "month"}, headers=auth_headers)
+    assert r.status_code == 200
+    days = r.json()["days"]
+    assert days == [{
+        "date": today.replace(day=1).isoformat(),
+        "count_sales": 2,
+        "total": 6.0,
+        "by_payment_method": {"CASH": 3.0, "CARD": 3.0},
+    }]
+
+    r = client.get(
+        "/reports/sales/daily",
+        params={**params, "granularity": "hour", "fill_gaps": True},
+        headers=auth_headers,
+    )
+    assert r.status_code == 200
+    hours = r.json()["days"]
+    assert len(hours) == 24
+    assert sum(h["count_sales"] for h in hours) == 2
+
+def test_report_rejects_invalid_tz(client, auth_headers):
+    today = date.today().isoformat()
+    params = {"from": today, "to": today, "tz": "Marte/Olympus"}
+
+    r = client.get("/reports/sales", params=params, headers=auth_headers)
+    assert r.status_code == 400
+
+    r = client.get("/reports/sales/daily", params={"from": today, "to": today, "granularity": "year"}, headers=auth_headers)
+    assert r.status_code == 422
+
+def test_create_sale_updates_rollup(client, auth_headers, db_session):
+    product_id = _create_product(client, auth_headers, "ROLL1", price=4)
+    _sell(client, auth_headers, product_id, 2, "cash")
+    _sell(client, auth_headers, product_id, 1, "cash")
+
+    user = crud.get_user_by_email(db_session, "user@test.com")
+    rows = db_session.query(SalesDailyRollup).filter(SalesDailyRollup.user_id == user.id).all()
+    assert [(r.payment_method, r.count_sales, float(r.total)) for r in rows] == [("cash", 2, 12.0)]
+    assert crud.check_sales_rollup(db_session, user_id=user.id) == []
+
+def test_closed_days_read_from_rollup(client, auth_headers, db_session):
+    product_id = _create_product(client, auth_headers, "ROLL2", price=10)
+    _sell(client, auth_headers, product_id, 1, "cash")
+    _sell(client, auth_headers, product_id, 1, "card")
+
+    user = crud.get_user_by_email(db_session, "user@test.com")
+    past = datetime.now(timezone.utc) - timedelta(days=3)
+    db_session.query(Sale).filter(Sale.user_id == user.id, Sale.payment_method == "cash").update(
+        {Sale.created_at: past}
+    )
+    db_session.flush()
+
+    diffs = crud.check_sales_rollup(db_session, user_id=user.id)
+    assert len(diffs) == 2
+
+    crud.rebuild_sales_rollup(db_session, user_id=user.id)
+    assert crud.check_sales_rollup(db_session, user_id=user.id) == []
+
+    params = {"from": past.date().isoformat(), "to": date.today().isoformat()}
+    r = client.get("/reports/sales", params=params, headers=auth_headers)
+    assert r.status_code == 200
+    data = r.json()
+    assert data["summary"]["count_sales"] == 2
+    assert data["summary"]["by_payment_method"] == {"cash": 10.0, "card": 10.0}
+    days = data["daily"]["days"]
+    assert [(d["date"], d["count_sales"]) for d in days] == [
+        (past.date().isoformat(), 1),
+        (date.today().isoformat(), 1),
+    ]
+
+def test_empty_sales_are_counted_in_rollup(client, auth_headers, db_session):
+    r = client.post("/sales", json={"items": [], "payment_method": "cash"}, headers=auth_headers)
+    assert r.status_code == 200
+    r = client.post("/sales/batch", json={"sales": [
+        {"client_id": "vacia-1", "items": [], "payment_method": "cash"},
+    ]}, headers=auth_headers)
+    assert r.json()["results"][0]["status"] == "created"
+
+    user = crud.get_user_by_email(db_session, "user@test.com")
+    assert crud.check_sales_rollup(db_session, user_id=user.id) == []
+    row = db_session.query(SalesDailyRollup).filter(SalesDailyRollup.user_id == user.id).one()
+    assert row.count_sales == 2
+
+def test_rollup_shards_add_up(client, auth_headers, db_session):
+    product_id = _create_product(client, auth_headers, "ROLL3", price=10)
+    _sell(client, auth_headers, product_id, 1, "cash")
+    _sell(client, auth_headers, product_id, 2, "cash")
+
+    user = crud.get_user_by_email(db_session, "user@test.com")
+    past = datetime.now(timezone.utc) - timedelta(days=3)
+    db_session.query(Sale).filter(Sale.user_id == user.id).update({Sale.created_at: past})
+    crud.rebuild_sales_rollup(db_session, user_id=user.id)
+
+    # como si la segunda venta la hubiera sumado otra conexion
+    row = db_session.query(SalesDailyRollup).filter(SalesDailyRollup.user_id == user.id).one()
+    row.count_sales, row.total = 1, 10
+    db_session.add(SalesDailyRollup(user_id=user.id, day=row.day, payment_method="cash", shard=5, count_sales=1, total=20))
+    db_session.flush()
+    assert crud.check_sales_rollup(db_session, user_id=user.id) == []
+
+    params = {"from": past.date().isoformat(), "to": past.date().isoformat()}
+    data = client.get("/reports/sales", params=params, headers=auth_headers).json()
+    assert data["summary"]["count_sales"] == 2
+    assert data["summary"]["by_payment_method"] == {"cash": 30.0}
+
+def test_sales_csv_export_streams_all_rows(client, auth_headers, db_session):
+    product_id = _create_product(client, auth_headers, "CSV1", price=2.5, stock=100)
+    for _ in range(5):
+        _sell(client, auth_headers, product_id, 3, "cash")
+
+    user = crud.get_user_by_email(db_session, "user@test.com")
+    today = date.today()
+    rows = list(crud.sales_rows_for_csv(db_session, user.id, today, today, chunk_size=2))
+    assert len(rows) == 5
+    assert rows[0]["line_total"] == 7.5
+
+    params = {"from": today.isoformat(), "to": today.isoformat()}
+    r = client.get("/reports/sales/export.csv", params=params, headers=auth_headers)
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/csv")
+    lines = r.text.strip().splitlines()
+    assert lines[0].startswith("sale_id,sale_datetime,payment_method")
+    assert len(lines) == 6
+
+def test_products_report_ranks_and_shares(client, auth_headers):
+    a = _create_product(client, auth_headers, "TOPA", price=10)
+    b = _create_product(client, auth_headers, "TOPB", price=100)
+    c = _create_product(client, auth_headers, "TOPC", price=25)
+    _create_product(client, auth_headers, "TOPD", price=1)
+    _sell(client, auth_headers, a, 3, "cash")
+    _sell(client, auth_headers, b, 1, "card")
+    r = client.post("/sales", json={
+        "items": [{"product_id": a, "qty": 2}, {"product_id": c, "qty": 2}], "payment_method": "cash",
+    }, headers=auth_headers)
+    assert r.status_code == 200
+
+    today = date.today().isoformat()
+    params = {"from": today, "to": today}
+    r = client.get("/reports/products", params=params, headers=auth_headers)
+    assert r.status_code == 200
+    data = r.json()
+    assert (data["products"], data["total_units"], data["total_revenue"]) == (3, 8, 200.0)
+    # A y C empatan en facturacion: mismo puesto, desempata el id
+    assert [(i["product_id"], i["rank"], i["units"], i["revenue"], i["share"], i["sales"]) for i in data["items"]] == [
+        (b, 1, 1, 100.0, 0.5, 1),
+        (a, 2, 5, 50.0, 0.25, 2),
+        (c, 2, 2, 50.0, 0.25, 1),
+    ]
+    assert data["items"][0]["sku"] == "TOPB"
+    assert data["next_offset"] is None
+
+    r = client.get("/reports/products", params={**params, "rank_by": "units"}, headers=auth_headers)
+    assert [(i["product_id"], i["rank"]) for i in r.json()["items"]] == [(a, 1), (c, 2), (b, 3)]
+
+    r = client.get("/reports/products", params={**params, "limit": 2}, headers=auth_headers)
+    first = r.json()
+    assert [i["product_id"] for i in first["items"]] == [b, a]
+    r = client.get("/reports/products", params={**params, "limit": 2, "offset": first["next_offset"]}, headers=auth_headers)
+    assert [i["product_id"] for i in r.json()["items"]] == [c]
+    assert r.json()["next_offset"] is None
+
+    # pagina fuera de rango: sin items, con los totales
+    r = client.get("/reports/products", params={**params, "offset": 10}, headers=auth_headers)
+    assert r.json()["items"] == []
+    assert r.json()["total_revenue"] == 200.0
+
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+    r = client.get("/reports/products", params={"from": yesterday, "to": yesterday}, headers=auth_headers)
+    assert (r.json()["products"], r.json()["items"]) == (0, [])
+
+    r = client.get("/reports/products", params={**params, "rank_by": "margin"}, headers=auth_headers)
+    assert r.status_code == 422
+    r = client.get("/reports/products", params={**params, "tz": "Marte/Olympus"}, headers=auth_headers)
+    assert r.status_code == 400
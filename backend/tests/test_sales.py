@@ -1,3 +1,12 @@
+import pytest
+from sqlalchemy import event, func, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app import crud
+from app.models import Product, Sale
+from app.schemas import SaleCreate, SaleItemCreate
+
 def test_sale_reduces_stock(client, auth_headers):
     r = client.post(
         "/products",
@@ -53,4 +62,325 @@ def test_cannot_sell_more_than_stock(client, auth_headers):
         headers=auth_headers
     )
 
-    assert r.status_code == 400
\ No newline at end of file
+    assert r.status_code == 400
+
+def test_list_sales_keyset_pagination(client, auth_headers):
+    r = client.post(
+        "/products",
+        json={
+            "name": "Producto Paginado",
+            "price": 10,
+            "stock": 10,
+            "sku": "PAGE1"
+        },
+        headers=auth_headers
+    )
+    product_id = r.json()["id"]
+
+    for _ in range(5):
+        r = client.post(
+            "/sales",
+            json={"items": [{"product_id": product_id, "qty": 1}], "payment_method": "cash"},
+            headers=auth_headers
+        )
+        assert r.status_code == 200
+
+    r = client.get("/sales", params={"limit": 2}, headers=auth_headers)
+    assert r.status_code == 200
+    page1 = r.json()
+    assert len(page1["items"]) == 2
+    assert page1["next_cursor"] == page1["items"][-1]["id"]
+
+    seen = [s["id"] for s in page1["items"]]
+    cursor = page1["next_cursor"]
+    while cursor is not None:
+        r = client.get("/sales", params={"limit": 2, "cursor": cursor}, headers=auth_headers)
+        page = r.json()
+        seen += [s["id"] for s in page["items"]]
+        cursor = page["next_cursor"]
+
+    assert len(seen) == 5
+    assert seen == sorted(seen, reverse=True)
+
+    r = client.get("/sales", params={"all": True}, headers=auth_headers)
+    assert r.status_code == 200
+    assert [s["id"] for s in r.json()] == seen
+
+def test_list_sales_query_count_is_constant(client, auth_headers, db_engine):
+    r = client.post(
+        "/products",
+        json={
+            "name": "Producto N+1",
+            "price": 10,
+            "stock": 50,
+            "sku": "NPLUS1"
+        },
+        headers=auth_headers
+    )
+    product_id = r.json()["id"]
+
+    def sell(n):
+        for _ in range(n):
+            client.post(
+                "/sales",
+                json={"items": [{"product_id": product_id, "qty": 1}], "payment_method": "cash"},
+                headers=auth_headers
+            )
+
+    def count_queries():
+        statements = []
+
+        def on_execute(conn, cursor, statement, parameters, context, executemany):
+            # los savepoints son del fixture en modo async, no de la app
+            if not statement.startswith(("SAVEPOINT", "RELEASE SAVEPOINT")):
+                statements.append(statement)
+
+        event.listen(db_engine, "before_cursor_execute", on_execute)
+        try:
+            r = client.get("/sales", params={"all": True}, headers=auth_headers)
+            assert r.status_code == 200
+        finally:
+            event.remove(db_engine, "before_cursor_execute", on_execute)
+        return len(statements), len(r.json())
+
+    sell(2)
+    few_queries, few_sales = count_queries()
+    sell(8)
+    many_queries, many_sales = count_queries()
+
+    assert (few_sales, many_sales) == (2, 10)
+    assert many_queries == few_queries
+
+def test_create_sale_merges_duplicate_lines(client, auth_headers):
+    r = client.post(
+        "/products",
+        json={
+            "name": "Producto Duplicado",
+            "price": 2.5,
+            "stock": 10,
+            "sku": "DUP1"
+        },
+        headers=auth_headers
+    )
+    product_id = r.json()["id"]
+
+    r = client.post(
+        "/sales",
+        json={
+            "items": [
+                {"product_id": product_id, "qty": 2},
+                {"product_id": product_id, "qty": 3}
+            ],
+            "payment_method": "cash"
+        },
+        headers=auth_headers
+    )
+    assert r.status_code == 200
+    sale = r.json()
+    assert sale["total"] == 12.5
+    assert sale["items"] == [{"product_id": product_id, "qty": 5, "unit_price": 2.5}]
+
+    r = client.get(f"/products/{product_id}", headers=auth_headers)
+    assert r.json()["stock"] == 5
+
+    r = client.get(f"/products/{product_id}/stock-movements", headers=auth_headers)
+    movements = r.json()["items"]
+    assert [(m["change"], m["reference"]) for m in movements] == [(-5, f"sale:{sale['id']}")]
+
+def test_create_sale_query_count_is_constant(client, auth_headers, db_engine):
+    product_ids = []
+    for i in range(8):
+        r = client.post(
+            "/products",
+            json={
+                "name": f"Producto Carrito {i}",
+                "price": 1,
+                "stock": 10,
+                "sku": f"CART{i}"
+            },
+            headers=auth_headers
+        )
+        product_ids.append(r.json()["id"])
+
+    def count_queries(ids):
+        statements = []
+
+        def on_execute(conn, cursor, statement, parameters, context, executemany):
+            # los savepoints son del fixture en modo async, no de la app
+            if not statement.startswith(("SAVEPOINT", "RELEASE SAVEPOINT")):
+                statements.append(statement)
+
+        event.listen(db_engine, "before_cursor_execute", on_execute)
+        try:
+            r = client.post(
+                "/sales",
+                json={"items": [{"product_id": pid, "qty": 1} for pid in ids], "payment_method": "cash"},
+                headers=auth_headers
+            )
+            assert r.status_code == 200
+        finally:
+            event.remove(db_engine, "before_cursor_execute", on_execute)
+        return len(statements)
+
+    assert count_queries(product_ids[:1]) == count_queries(product_ids)
+
+def test_sales_batch_is_idempotent(client, auth_headers):
+    r = client.post(
+        "/products",
+        json={
+            "name": "Producto Offline",
+            "price": 10,
+            "stock": 5,
+            "sku": "OFF1"
+        },
+        headers=auth_headers
+    )
+    product_id = r.json()["id"]
+
+    payload = {
+        "sales": [
+            {
+                "client_id": "caja1-0001",
+                "created_at": "2026-01-10T09:30:00Z",
+                "payment_method": "cash",
+                "items": [{"product_id": product_id, "qty": 2}]
+            },
+            {
+                "client_id": "caja1-0002",
+                "payment_method": "card",
+                "items": [{"product_id": product_id, "qty": 2}]
+            },
+            {
+                "client_id": "caja1-0003",
+                "payment_method": "cash",
+                "items": [{"product_id": product_id, "qty": 2}]
+            },
+            {
+                "client_id": "caja1-0004",
+                "payment_method": "cash",
+                "items": [{"product_id": 999999, "qty": 1}]
+            }
+        ]
+    }
+
+    r = client.post("/sales/batch", json=payload, headers=auth_headers)
+    assert r.status_code == 200
+    results = r.json()["results"]
+    assert [x["status"] for x in results] == ["created", "created", "error", "error"]
+    assert "Stock insuficiente" in results[2]["error"]
+
+    r = client.get(f"/products/{product_id}", headers=auth_headers)
+    assert r.json()["stock"] == 1
+
+    # reintento del mismo lote: nada se cuenta dos veces
+    r = client.post("/sales/batch", json=payload, headers=auth_headers)
+    replay = r.json()["results"]
+    assert [x["status"] for x in replay[:2]] == ["duplicate", "duplicate"]
+    assert [x["sale_id"] for x in replay[:2]] == [x["sale_id"] for x in results[:2]]
+
+    r = client.get(f"/products/{product_id}", headers=auth_headers)
+    assert r.json()["stock"] == 1
+
+    r = client.get(
+        "/reports/sales/summary",
+        params={"from": "2026-01-10", "to": "2026-01-10"},
+        headers=auth_headers
+    )
+    assert r.json()["count_sales"] == 1
+
+def test_create_sale_rechecks_stock_changed_after_reading(db_session, monkeypatch):
+    # otra caja vendio la ultima unidad entre la lectura y el UPDATE: el
+    # chequeo previo pasa con el stock viejo, el UPDATE condicional no
+    # escribe y el reintento lo rechaza con el stock real
+    db = db_session
+    user = crud.create_user(db, "ultima@test.com", password_hash="x")
+    product = Product(owner_id=user.id, name="Ultima", price=10, stock=0)
+    db.add(product)
+    db.commit()
+
+    load = crud._load_sale_products
+    calls = []
+
+    def stale_load(db, user_id, product_ids):
+        products = load(db, user_id, product_ids)
+        if not calls:
+            set_committed_value(products[product.id], "stock", 1)
+        calls.append(product_ids)
+        return products
+
+    monkeypatch.setattr(crud, "_load_sale_products", stale_load)
+    with pytest.raises(ValueError, match="Stock insuficiente.*Disponible: 0"):
+        crud.create_sale(db, user.id, SaleCreate(items=[SaleItemCreate(product_id=product.id, qty=1)]))
+
+    assert len(calls) == 2
+    assert db.scalar(select(Product.stock).where(Product.id == product.id)) == 0
+    assert db.scalar(select(func.count()).select_from(Sale).where(Sale.user_id == user.id)) == 0
+
+def test_stock_writes_retry_on_deadlock_then_give_up(db_session, client, auth_headers, monkeypatch):
+    db = db_session
+    user = crud.create_user(db, "deadlock@test.com", password_hash="x")
+    product = Product(owner_id=user.id, name="Disputado", price=10, stock=5)
+    db.add(product)
+    db.commit()
+
+    class Deadlock(Exception):
+        sqlstate = "40P01"
+
+    apply = crud._apply_stock_changes
+    calls = []
+
+    def deadlock_once(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise OperationalError("UPDATE products", {}, Deadlock())
+        return apply(*args)
+
+    monkeypatch.setattr(crud, "_apply_stock_changes", deadlock_once)
+    p = crud.adjust_stock(db, user.id, product.id, -2)
+    assert p.stock == 3
+    assert len(calls) == 2
+
+    def always_changed(*args):
+        raise crud._StockChanged()
+
+    monkeypatch.setattr(crud, "_apply_stock_changes", always_changed)
+    with pytest.raises(crud.TransactionConflict):
+        crud.adjust_stock(db, user.id, product.id, -1)
+    assert db.scalar(select(Product.stock).where(Product.id == product.id)) == 3
+
+    # agotados los reintentos, la API pide volver a intentar
+    def conflict(*args, **kwargs):
+        raise crud.TransactionConflict("conflicto")
+
+    monkeypatch.setattr(crud, "create_sale", conflict)
+    r = client.post("/sales", json={"items": [{"product_id": 1, "qty": 1}]}, headers=auth_headers)
+    assert r.status_code == 503
+    assert r.headers["retry-after"] == "1"
+
+def test_sales_batch_repeated_client_id_is_duplicate(client, auth_headers):
+    r = client.post("/products", json={"name": "Repetido", "price": 10, "stock": 10}, headers=auth_headers)
+    product_id = r.json()["id"]
+    sale = {"client_id": "caja2-0001", "payment_method": "cash", "items": [{"product_id": product_id, "qty": 2}]}
+
+    r = client.post("/sales/batch", json={"sales": [sale, sale, {**sale, "client_id": "caja2-0002"}, sale]}, headers=auth_headers)
+    assert r.status_code == 200
+    results = r.json()["results"]
+    assert [x["status"] for x in results] == ["created", "duplicate", "created", "duplicate"]
+    assert results[1]["sale_id"] == results[3]["sale_id"] == results[0]["sale_id"]
+    assert results[2]["sale_id"] != results[0]["sale_id"]
+
+    r = client.get(f"/products/{product_id}", headers=auth_headers)
+    assert r.json()["stock"] == 6
+
+def test_sales_batch_repeat_of_rejected_sale_is_not_duplicate(client, auth_headers):
+    r = client.post("/products", json={"name": "Rechazado", "price": 10, "stock": 5}, headers=auth_headers)
+    product_id = r.json()["id"]
+    sale = {"client_id": "caja3-0001", "payment_method": "cash", "items": [{"product_id": product_id, "qty": 8}]}
+
+    r = client.post("/sales/batch", json={"sales": [sale, sale]}, headers=auth_headers)
+    results = r.json()["results"]
+    assert [x["status"] for x in results] == ["error", "error"]
+    assert all(x["sale_id"] is None for x in results)
+
+    r = client.get(f"/products/{product_id}", headers=auth_headers)
+    assert r.json()["stock"] == 5
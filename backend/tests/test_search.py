@@ -0,0 +1,51 @@
+import pytest
+
+from app import crud
+
+
+def _product(client, auth_headers, name, sku=None):
+    r = client.post("/products", json={"name": name, "sku": sku, "price": 1, "stock": 5}, headers=auth_headers)
+    return r.json()["id"]
+
+def test_search_ranks_sku_then_prefix_then_name(client, auth_headers):
+    exact = _product(client, auth_headers, "Galletitas", "ABC")
+    sku_prefix = _product(client, auth_headers, "Fideos", "ABC-2")
+    name_prefix = _product(client, auth_headers, "Abc de yerba")
+    contains = _product(client, auth_headers, "Caja abc")
+    _product(client, auth_headers, "Otra cosa", "XYZ")
+    gone = _product(client, auth_headers, "Abc borrado")
+    client.delete(f"/products/{gone}", headers=auth_headers)
+
+    r = client.get("/products/search", params={"q": " abc "}, headers=auth_headers)
+    assert r.status_code == 200
+    hits = [(h["id"], h["match"]) for h in r.json()]
+    assert hits[:3] == [(exact, "sku"), (sku_prefix, "sku_prefix"), (name_prefix, "name_prefix")]
+    # aproximado: con pg_trgm por palabra parecida, sin pg_trgm por LIKE
+    assert (contains, "name") in hits
+    assert gone not in [h[0] for h in hits]
+
+    r = client.get("/products/search", params={"q": "abc", "limit": 2}, headers=auth_headers)
+    assert [h["id"] for h in r.json()] == [exact, sku_prefix]
+
+    r = client.get("/products/search", params={"q": "   "}, headers=auth_headers)
+    assert r.status_code == 400
+
+def test_search_is_per_user_and_escapes_like(client, auth_headers):
+    pct = _product(client, auth_headers, "50% off")
+    _product(client, auth_headers, "500 gramos")
+
+    r = client.get("/products/search", params={"q": "50%"}, headers=auth_headers)
+    assert [h["id"] for h in r.json()] == [pct]
+
+    client.post("/auth/register", json={"email": "other@test.com", "password": "123456"})
+    token = client.post("/auth/login", data={"username": "other@test.com", "password": "123456"}).json()["access_token"]
+    r = client.get("/products/search", params={"q": "50"}, headers={"Authorization": f"Bearer {token}"})
+    assert r.json() == []
+
+def test_search_fuzzy_with_pg_trgm(db_session, client, auth_headers):
+    if not crud._has_pg_trgm(db_session):
+        pytest.skip("la base no tiene pg_trgm")
+    typo = _product(client, auth_headers, "Chocolate amargo")
+
+    r = client.get("/products/search", params={"q": "chocolat amargo"}, headers=auth_headers)
+    assert [(h["id"], h["match"]) for h in r.json()] == [(typo, "name")]
@@ -0,0 +1,64 @@
+import logging
+
+from sqlalchemy import select
+
+from app.models import Product
+from app.sql_profiler import profile, settings
+
+
+def test_server_timing_reports_queries(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(settings, "SQL_PROFILER_ENABLED", True)
+    monkeypatch.setattr(settings, "SQL_PROFILER_SAMPLE_RATE", 1.0)
+
+    r = client.get("/sales", headers=auth_headers)
+    assert r.status_code == 200
+    timing = r.headers["server-timing"]
+    assert timing.startswith("db;dur=")
+    # usuario + version de datos (ETag) + ventas (sin ventas no hay SELECT de items)
+    assert 'desc="3 queries"' in timing
+
+def test_profiler_respects_sample_rate(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(settings, "SQL_PROFILER_ENABLED", True)
+    monkeypatch.setattr(settings, "SQL_PROFILER_SAMPLE_RATE", 0.0)
+
+    r = client.get("/sales", headers=auth_headers)
+    assert "server-timing" not in r.headers
+
+def test_profiler_flags_repeated_statements_and_slow_plans(db_session, monkeypatch, caplog):
+    monkeypatch.setattr(settings, "SQL_PROFILER_SLOW_MS", 0)
+    monkeypatch.setattr(settings, "SQL_PROFILER_EXPLAIN", True)
+    # el SAVEPOINT de la sesion del test fuera de lo medido
+    db_session.connection()
+
+    with caplog.at_level(logging.WARNING, logger="app.sql_profiler"):
+        with profile("test") as p:
+            for i in range(6):
+                db_session.execute(select(Product).where(Product.id == i)).all()
+
+    assert p.count == 6
+    (statement, n), = p.repeated(5)
+    assert n == 6 and statement.startswith("SELECT products.id")
+    assert 'db-repeated;desc="1 shapes, max 6x"' in p.server_timing(5)
+
+    # sentencia lenta logueada con el nombre de sus parametros (no los
+    # valores) y el plan de EXPLAIN ANALYZE
+    assert "SQL lenta" in caplog.text
+    assert "Execution Time" in caplog.text
+    assert "params=[id_1]" in caplog.text
+
+def test_slow_statement_log_hides_parameter_values(db_session, monkeypatch, caplog):
+    monkeypatch.setattr(settings, "SQL_PROFILER_SLOW_MS", 0)
+    secret = "hash-secreto-$2b$12$"
+
+    with caplog.at_level(logging.WARNING, logger="app.sql_profiler"):
+        with profile("test"):
+            db_session.execute(select(Product).where(Product.name == secret)).all()
+    assert "SQL lenta" in caplog.text
+    assert secret not in caplog.text
+
+    caplog.clear()
+    monkeypatch.setattr(settings, "SQL_PROFILER_LOG_PARAMS", True)
+    with caplog.at_level(logging.WARNING, logger="app.sql_profiler"):
+        with profile("test"):
+            db_session.execute(select(Product).where(Product.name == secret)).all()
+    assert secret in caplog.text
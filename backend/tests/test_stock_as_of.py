@@ -0,0 +1,66 @@
+from datetime import date, datetime, timezone
+
+from app import crud
+from app.models import Product, StockMovement, StockSnapshot
+
+
+def _at(month, day):
+    return datetime(2026, month, day, tzinfo=timezone.utc)
+
+def _stock(db, user_id, day):
+    return {i["product_id"]: i["stock"] for i in crud.stock_as_of(db, user_id, day)["items"]}
+
+def test_stock_as_of_replays_from_nearest_snapshot(db_session):
+    db = db_session
+    user = crud.create_user(db, "historico@test.com", password_hash="x")
+    product = Product(owner_id=user.id, name="Historico", price=1, stock=10, created_at=_at(1, 1))
+    later = Product(owner_id=user.id, name="Nuevo", price=1, stock=4, created_at=_at(2, 1))
+    db.add_all([product, later])
+    db.flush()
+    for day, change in [(_at(1, 5), 10), (_at(1, 10), -3), (_at(1, 20), 5), (_at(2, 2), -2)]:
+        db.add(StockMovement(
+            user_id=user.id, product_id=product.id, change=change, reason="ADJUSTMENT", created_at=day,
+        ))
+    db.commit()
+
+    # sin fotos: hacia atras desde el stock actual
+    assert _stock(db, user.id, date(2026, 1, 9)) == {product.id: 10}
+    assert _stock(db, user.id, date(2026, 1, 31)) == {product.id: 12}
+
+    assert crud.take_stock_snapshots(db, at=_at(1, 12)) == 1
+    assert crud.take_stock_snapshots(db, at=_at(1, 12)) == 0
+    assert db.get(StockSnapshot, (product.id, _at(1, 12))).stock == 7
+
+    # desde la foto: hacia adelante despues, hacia atras antes
+    assert _stock(db, user.id, date(2026, 1, 15)) == {product.id: 7}
+    assert _stock(db, user.id, date(2026, 1, 31)) == {product.id: 12}
+    assert _stock(db, user.id, date(2026, 1, 9)) == {product.id: 10}
+    assert _stock(db, user.id, date(2026, 1, 4)) == {product.id: 0}
+    # los productos aparecen desde su alta
+    assert _stock(db, user.id, date(2026, 2, 5)) == {product.id: 10, later.id: 4}
+
+    # solo se fotografian los productos sin foto o con movimientos nuevos,
+    # contados desde la ultima foto de cada uno
+    assert crud.take_stock_snapshots(db, at=_at(1, 25), min_movements=2) == 0
+    assert crud.take_stock_snapshots(db, at=_at(2, 2), min_movements=2) == 1
+    assert crud.take_stock_snapshots(db, at=_at(2, 10), min_movements=2) == 1
+    assert db.get(StockSnapshot, (product.id, _at(2, 10))).stock == 10
+    assert _stock(db, user.id, date(2026, 1, 31)) == {product.id: 12}
+    assert _stock(db, user.id, date(2026, 2, 1)) == {product.id: 12, later.id: 4}
+
+
+def test_stock_as_of_endpoint(client, auth_headers):
+    r = client.post("/products", json={"name": "Hoy", "price": 1, "stock": 5}, headers=auth_headers)
+    product_id = r.json()["id"]
+    # editar el stock deja un movimiento, asi el historico lo ve
+    client.patch(f"/products/{product_id}", json={"stock": 8}, headers=auth_headers)
+    r = client.get(f"/products/{product_id}/stock-movements", headers=auth_headers)
+    assert [(m["change"], m["reference"]) for m in r.json()["items"]] == [(3, "edit")]
+
+    today = datetime.now(timezone.utc).date()
+    r = client.get("/products/stock-as-of", params={"date": str(today)}, headers=auth_headers)
+    assert r.status_code == 200
+    assert [(i["product_id"], i["stock"]) for i in r.json()["items"]] == [(product_id, 8)]
+
+    r = client.get("/products/stock-as-of", params={"date": str(today), "tz": "Mars/Base"}, headers=auth_headers)
+    assert r.status_code == 400
@@ -39,7 +39,8 @@ export function getMe() {
 
 // ---------- Products ----------
 export function getProducts() {
-  return apiFetch("/products");
+  // el catalogo completo se usa para armar el carrito
+  return apiFetch("/products?all=true");
 }
 
 export function createProduct(payload) {
@@ -54,13 +55,35 @@ export function deleteProduct(id) {
   return apiFetch(`/products/${id}`, { method: "DELETE" });
 }
 
+// Busqueda de la caja: SKU exacto, prefijo de SKU/nombre y nombre aproximado,
+// ya ordenados por relevancia (match dice por que coincidio cada uno)
+export function searchProducts(q, limit = 5) {
+  const params = new URLSearchParams({ q, limit: String(limit) });
+  return apiFetch(`/products/search?${params}`);
+}
+
+// ---------- Stock bajo ----------
+// Sin since: productos bajo el minimo por urgencia. Con since: solo los
+// productos que cambiaron desde el poll anterior (low indica si siguen bajos).
+export function getLowStock({ limit = 200, cursor, since } = {}) {
+  const params = new URLSearchParams({ limit: String(limit) });
+  if (cursor) params.set("cursor", cursor);
+  if (since) params.set("since", since);
+  return apiFetch(`/products/low-stock?${params}`);
+}
+
 // ---------- Sales ----------
 export function createSale(payload) {
   return apiFetch("/sales", { method: "POST", body: JSON.stringify(payload) });
 }
 
-export function getSales() {
-  return apiFetch("/sales");
+export async function getSales(limit = 100) {
+  const page = await apiFetch(`/sales?limit=${limit}`);
+  return page.items;
+}
+
+export function getSalesReport(from, to) {
+  return apiFetch(`/reports/sales?from=${from}&to=${to}`);
 }
 
 export function getSalesSummary(from, to) {
@@ -87,6 +110,7 @@ export function adjustStock(productId, payload) {
   });
 }
 
-export function getStockMovements(productId) {
-  return apiFetch(`/products/${productId}/stock-movements`);
+export async function getStockMovements(productId, limit = 100) {
+  const page = await apiFetch(`/products/${productId}/stock-movements?limit=${limit}`);
+  return page.items;
 }
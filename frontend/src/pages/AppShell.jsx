@@ -1,5 +1,5 @@
 import { useEffect, useMemo, useState } from "react";
-import { getProducts, createProduct, createSale, getSales, getSalesSummary, getSalesDaily } from "../api";
+import { getProducts, createProduct, createSale, getSales, getSalesReport, getSalesDaily } from "../api";
 import DashboardLayout from "../components/DashboardLayout";
 import SalesPage from "../pages/SalesPage";
 import ProductsPage from "../pages/ProductsPage";
@@ -44,13 +44,17 @@ export default function App() {
   async function loadSummary() {
     setErr("");
     setSummaryLoading(true);
+    setDailyLoading(true);
     try {
-      const data = await getSalesSummary(reportFrom, reportTo);
-      setSummary(data);
+      // resumen + diario en una sola consulta
+      const data = await getSalesReport(reportFrom, reportTo);
+      setSummary(data.summary);
+      setDaily(data.daily);
     } catch (e) {
       setErr(e.message);
     } finally {
       setSummaryLoading(false);
+      setDailyLoading(false);
     }
   }
 
@@ -114,8 +118,9 @@ export default function App() {
     return cart.reduce((acc, it) => acc + it.qty * it.unit_price, 0);
   }, [cart]);
 
-  function addToCart(productId) {
-    const p = productsById.get(Number(productId));
+  // acepta un id o un producto ya cargado (p. ej. un resultado de la busqueda)
+  function addToCart(product) {
+    const p = typeof product === "object" ? product : productsById.get(Number(product));
     if (!p) return;
 
     setCart((prev) => {
@@ -1,7 +1,25 @@
-import { useMemo, useState } from "react";
+import { useCallback, useEffect, useMemo, useRef, useState } from "react";
 import Card from "../ui/Card";
 import Button from "../ui/Button";
-import { updateProduct, adjustStock, getStockMovements } from "../api";
+import { updateProduct, adjustStock, getStockMovements, getLowStock } from "../api";
+
+const LOW_STOCK_LIMIT = 200;
+const LOW_STOCK_POLL_MS = 15000;
+
+function deficit(p) {
+  return Number(p.stock_min || 0) - Number(p.stock || 0);
+}
+
+// aplica el feed de cambios a la lista de stock bajo
+function mergeLowStock(prev, page) {
+  const byId = new Map(prev.items.map((i) => [i.id, i]));
+  for (const item of page.items) {
+    if (item.low) byId.set(item.id, item);
+    else byId.delete(item.id);
+  }
+  const items = [...byId.values()].sort((a, b) => b.deficit - a.deficit || a.id - b.id);
+  return { items, total: page.total };
+}
 
 export default function ProductsPage({
   products,
@@ -23,6 +41,49 @@ export default function ProductsPage({
   const [draft, setDraft] = useState(null);
   const [saving, setSaving] = useState(false);
 
+  // ----------------- Stock bajo (servidor) -----------------
+  // la lista sale de /products/low-stock y despues se mantiene con el feed
+  // de cambios, sin volver a bajar el catalogo
+  const [lowStock, setLowStock] = useState({ items: [], total: 0 });
+  const lowSince = useRef(null);
+
+  // carga completa (al inicio y en cada resync): sigue next_cursor hasta el
+  // final para que la lista coincida con el total. El since es el de la
+  // primera pagina: lo que cambie mientras se pagina lo trae el feed.
+  const loadLowStock = useCallback(async () => {
+    let page = await getLowStock({ limit: LOW_STOCK_LIMIT });
+    const since = page.since;
+    const items = [...page.items];
+    while (page.next_cursor) {
+      page = await getLowStock({ limit: LOW_STOCK_LIMIT, cursor: page.next_cursor });
+      items.push(...page.items);
+    }
+    lowSince.current = since;
+    setLowStock({ items, total: page.total });
+  }, []);
+
+  useEffect(() => {
+    loadLowStock().catch((e) => setErr?.(e.message));
+  }, [products, loadLowStock, setErr]);
+
+  useEffect(() => {
+    const timer = setInterval(async () => {
+      if (!lowSince.current) return;
+      try {
+        const page = await getLowStock({ limit: LOW_STOCK_LIMIT, since: lowSince.current });
+        if (page.resync) {
+          await loadLowStock();
+          return;
+        }
+        lowSince.current = page.since;
+        setLowStock((prev) => mergeLowStock(prev, page));
+      } catch {
+        // se reintenta en el proximo poll
+      }
+    }, LOW_STOCK_POLL_MS);
+    return () => clearInterval(timer);
+  }, [loadLowStock]);
+
   // ----------------- Movimientos (modal) -----------------
   const [movOpen, setMovOpen] = useState(false);
   const [movProduct, setMovProduct] = useState(null);
@@ -34,6 +95,14 @@ export default function ProductsPage({
 
     let list = products;
 
+    // Solo stock bajo: la lista del servidor, con el stock mas reciente
+    if (onlyLow) {
+      const byId = new Map(products.map((p) => [p.id, p]));
+      list = lowStock.items
+        .filter((i) => byId.has(i.id))
+        .map((i) => ({ ...byId.get(i.id), stock: i.stock, stock_min: i.stock_min }));
+    }
+
     // Search por nombre o sku
     if (query) {
       list = list.filter((p) => {
@@ -43,11 +112,6 @@ export default function ProductsPage({
       });
     }
 
-    // Solo stock bajo
-    if (onlyLow) {
-      list = list.filter((p) => Number(p.stock) < Number(p.stock_min));
-    }
-
     // Sort
     const sorted = [...list].sort((a, b) => {
       const an = String(a.name || "");
@@ -60,6 +124,8 @@ export default function ProductsPage({
       const bPrice = Number(b.price || 0);
 
       switch (sortBy) {
+        case "urgency":
+          return deficit(b) - deficit(a) || a.id - b.id;
         case "stock_asc":
           return aStock - bStock;
         case "stock_desc":
@@ -75,11 +141,9 @@ export default function ProductsPage({
     });
 
     return sorted;
-  }, [products, q, onlyLow, sortBy]);
+  }, [products, q, onlyLow, sortBy, lowStock]);
 
-  const lowCount = useMemo(() => {
-    return products.filter((p) => Number(p.stock) < Number(p.stock_min)).length;
-  }, [products]);
+  const lowCount = lowStock.total;
 
   function clearFilters() {
     setQ("");
@@ -294,6 +358,7 @@ export default function ProductsPage({
                   className="mt-1 w-full rounded-xl border border-white/10 bg-white/5 px-3 py-2 text-white outline-none focus:border-white/20"
                 >
                   <option className="bg-neutral-900 text-white" value="name_asc">Nombre (A-Z)</option>
+                  <option className="bg-neutral-900 text-white" value="urgency">Urgencia (mayor faltante)</option>
                   <option className="bg-neutral-900 text-white" value="stock_asc">Stock (menor → mayor)</option>
                   <option className="bg-neutral-900 text-white" value="stock_desc">Stock (mayor → menor)</option>
                   <option className="bg-neutral-900 text-white" value="price_asc">Precio (menor → mayor)</option>
@@ -306,7 +371,10 @@ export default function ProductsPage({
                   <input
                     type="checkbox"
                     checked={onlyLow}
-                    onChange={(e) => setOnlyLow(e.target.checked)}
+                    onChange={(e) => {
+                      setOnlyLow(e.target.checked);
+                      if (e.target.checked) setSortBy("urgency");
+                    }}
                     className="h-4 w-4 accent-amber-400"
                   />
                   Solo stock bajo
@@ -2,6 +2,7 @@ import { useMemo, useState, useRef, useEffect } from "react";
 import Card from "../ui/Card";
 import Button from "../ui/Button";
 import KPI from "../ui/KPI";
+import { searchProducts } from "../api";
 
 export default function SalesPage({
   // data
@@ -68,35 +69,20 @@ export default function SalesPage({
     inputRef.current?.focus();
   }, []);
 
-  function handleQuickAdd() {
-    const term = quickSearch.trim().toLowerCase();
+  async function handleQuickAdd() {
+    const term = quickSearch.trim();
     if (!term) return;
 
-    // 1️⃣ Buscar SKU exacto
-    const skuMatch = products.find(
-      (p) => p.sku?.toLowerCase() === term
-    );
-
-    if (skuMatch) {
-      if (skuMatch.stock <= 0) {
-        alert("Producto sin stock");
-        setQuickSearch("");
-        return;
-      }
-
-      addToCart(skuMatch.id);
-      setQuickSearch("");
-      setSuggestions([]);
-      setActiveIndex(0);
+    // el servidor busca SKU exacto, prefijo y nombre aproximado, en ese orden
+    let matches;
+    try {
+      matches = await searchProducts(term, 5);
+    } catch (e) {
+      alert(e.message || "Error buscando el producto");
       return;
     }
 
-    // Buscar por nombre parcial
-    const nameMatches = products.filter((p) =>
-      p.name.toLowerCase().includes(term)
-    );
-
-    if (nameMatches.length === 0) {
+    if (matches.length === 0) {
       alert("Producto no encontrado");
       setQuickSearch("");
       setSuggestions([]);
@@ -104,14 +90,15 @@ export default function SalesPage({
       return;
     }
 
-    if (nameMatches.length === 1) {
-      if (nameMatches[0].stock <= 0) {
+    // SKU exacto (escaneado) o un unico resultado: directo al carrito
+    if (matches[0].match === "sku" || matches.length === 1) {
+      if (matches[0].stock <= 0) {
         alert("Producto sin stock");
         setQuickSearch("");
         return;
       }
 
-      addToCart(nameMatches[0].id);
+      addToCart(matches[0]);
       setQuickSearch("");
       setSuggestions([]);
       setActiveIndex(-1);
@@ -119,7 +106,7 @@ export default function SalesPage({
     }
 
     // Si hay varios → mostrar lista
-    setSuggestions(nameMatches.slice(0, 5));
+    setSuggestions(matches);
     setActiveIndex(0);
   }
 
@@ -294,7 +281,7 @@ export default function SalesPage({
                         return;
                       }
 
-                      addToCart(selected.id);
+                      addToCart(selected);
                       setQuickSearch("");
                       setSuggestions([]);
                       setActiveIndex(-1);
@@ -325,7 +312,7 @@ export default function SalesPage({
                           return;
                         }
 
-                        addToCart(p.id);
+                        addToCart(p);
                         setQuickSearch("");
                         setSuggestions([]);
                       }}